@@ -87,7 +87,7 @@ export async function POST() {
           const res = await fetch(`${scraperUrl}/api/scrape/sync`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ url: item.url }),
+            body: JSON.stringify({ url: item.url, user_id: user.id }),
             signal: AbortSignal.timeout(8000),
           });
           if (!res.ok) continue;
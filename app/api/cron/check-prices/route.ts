@@ -8,6 +8,8 @@ import {
   queueBackInStockNotification,
   queuePriceIncreaseNotification,
 } from '@/lib/notifications/queue-helpers';
+// Shared with the scraper service's own refresh scheduler (scraper-service/price_refresh.py)
+import priceCheckCooldowns from '@/scraper-service/price_check_cooldowns.json';
 
 function getTierCheckInterval(tier: string): number {
   const config = TIERS[tier as SubscriptionTier];
@@ -40,6 +42,12 @@ export async function GET(req: Request) {
       return NextResponse.json({ error: 'Unauthorized' }, { status: 401 });
     }
     
+    // The scraper service refreshes prices itself - two schedulers would check every item twice
+    if (process.env.PRICE_REFRESH_ENABLED === 'true') {
+      console.log("⏭️ PRICE_REFRESH_ENABLED: the scraper service runs price checks, skipping the cron");
+      return NextResponse.json({ success: true, skipped: true, reason: 'PRICE_REFRESH_ENABLED' });
+    }
+    
     console.log("\n--- ⏰ STARTING PRICE CHECK (ADMIN MODE) ---");
     
     // Track scraper services that timeout so we skip them for the rest of the run
@@ -63,14 +71,11 @@ export async function GET(req: Request) {
     console.log(`📊 Processing up to ${MAX_ITEMS} items`);
 
     // Scan cooldown: all tiers get scanned daily minimum.
-    // Higher tiers get checked more frequently.
+    // Higher tiers get checked more frequently (free = daily scan, notifications still gated to weekly)
+    const cooldownHours: Record<string, number> = priceCheckCooldowns.tier_cooldown_hours;
+    const failureBackoffHours = priceCheckCooldowns.failure_backoff_hours;
     function tierCooldownHours(tier: string): number {
-      switch (tier) {
-        case 'creator':
-        case 'enterprise': return 6;
-        case 'pro': return 12;
-        default: return 24; // free = daily scan (notifications still gated to weekly)
-      }
+      return cooldownHours[tier] ?? cooldownHours.free;
     }
 
     while (hasMore && totalChecked < MAX_ITEMS) {
@@ -120,7 +125,7 @@ export async function GET(req: Request) {
           const elapsed = fbNow - new Date(item.last_price_check).getTime();
           const failures = item.price_check_failures || 0;
           const baseCooldown = tierCooldownHours(item.user_tier || 'free');
-          const cooldownMs = (baseCooldown + failures * 12) * 3600000;
+          const cooldownMs = (baseCooldown + failures * failureBackoffHours) * 3600000;
           return elapsed >= cooldownMs;
         }).slice(0, BATCH_SIZE);
 
@@ -145,7 +150,7 @@ export async function GET(req: Request) {
         const elapsed = now - new Date(item.last_price_check).getTime();
         const failures = item.price_check_failures || 0;
         const baseCooldown = tierCooldownHours(item.user_tier || 'free');
-        const cooldownMs = (baseCooldown + failures * 12) * 3600000;
+        const cooldownMs = (baseCooldown + failures * failureBackoffHours) * 3600000;
         return elapsed >= cooldownMs;
       });
 
@@ -199,7 +204,9 @@ export async function GET(req: Request) {
             const response = await fetch(`${scraperUrl}/api/scrape/sync`, {
               method: 'POST',
               headers: { 'Content-Type': 'application/json' },
-              body: JSON.stringify({ url: item.url }),
+              // Background lane: never competes with users adding items
+              // user_id: charged to the owner's plan quota, not the cron's IP
+              body: JSON.stringify({ url: item.url, priority: 'background', user_id: item.user_id }),
               signal: AbortSignal.timeout(8000),
             });
 
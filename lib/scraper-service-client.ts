@@ -25,14 +25,16 @@ export interface ScrapeSyncResponse {
 /**
  * Create an async scraping job
  * Returns job_id immediately, client should poll for status
+ * userId picks the user's rate limit (their plan, looked up by the service);
+ * without it the call counts against the caller IP's anonymous limit
  */
-export async function createScrapeJob(url: string): Promise<ScrapeJobResponse> {
+export async function createScrapeJob(url: string, userId?: string | null): Promise<ScrapeJobResponse> {
   const response = await fetch(`${SCRAPER_SERVICE_URL}/api/scrape`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
     },
-    body: JSON.stringify({ url }),
+    body: JSON.stringify({ url, user_id: userId || undefined }),
   });
 
   if (!response.ok) {
@@ -98,14 +100,15 @@ export async function pollJobUntilComplete(
 /**
  * Synchronous scraping (for fast methods only)
  * Use this for structured data extraction, not full Scrapy
+ * userId: see createScrapeJob
  */
-export async function scrapeSync(url: string): Promise<ScrapeSyncResponse> {
+export async function scrapeSync(url: string, userId?: string | null): Promise<ScrapeSyncResponse> {
   const response = await fetch(`${SCRAPER_SERVICE_URL}/api/scrape/sync`, {
     method: 'POST',
     headers: {
       'Content-Type': 'application/json',
     },
-    body: JSON.stringify({ url }),
+    body: JSON.stringify({ url, user_id: userId || undefined }),
   });
 
   const data = await response.json();
@@ -56,7 +56,7 @@ function cleanDomain(url: string): string {
  * Simple scraper function - just returns product data without saving
  * This is the main function to use in API routes
  */
-export async function scrapeAndSave(url: string): Promise<{
+export async function scrapeAndSave(url: string, userId: string | null = null): Promise<{
   title: string;
   price: string | number | null;
   priceRaw?: string | null;
@@ -79,7 +79,7 @@ export async function scrapeAndSave(url: string): Promise<{
     
     if (serviceAvailable) {
       console.log('[scrape-and-save] Using Python scraper service...');
-      const response = await scrapeSync(url);
+      const response = await scrapeSync(url, userId);
       
       if (response.success && response.result) {
         productData = {
@@ -172,7 +172,7 @@ export async function scrapeAndSaveProduct(
   data?: any;
   error?: string;
 }> {
-  const scraped = await scrapeAndSave(url);
+  const scraped = await scrapeAndSave(url, userId);
 
   const product = {
     title: scraped.title,
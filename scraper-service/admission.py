@@ -0,0 +1,221 @@
+"""
+Admission control and backpressure
+Under a load spike the service used to accept everything and then time it all
+out together (30 s sync waits, 60 s crawl timeouts, browser launches piling up).
+New work is now checked against three load signals before it is accepted:
+- queue depth: jobs waiting in the shared job store plus crawls not finished yet
+  (a crawl already handed to the crawler is backlog too)
+- in-flight crawls per lane: jobs of that lane submitted to the crawler
+- browser pool: Playwright runs are capped by a semaphore; its wait line is the signal
+Past a limit the caller gets 429 with a Retry-After computed from the backlog
+and the observed drain rate (or, for sync scrapes, a stale cached answer).
+Less urgent lanes are turned away earlier, so interactive traffic degrades last.
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from priority_lanes import PRIORITY_BACKGROUND, PRIORITY_BATCH, PRIORITY_INTERACTIVE
+
+ADMISSION_MAX_QUEUE_DEPTH = int(os.environ.get('ADMISSION_MAX_QUEUE_DEPTH', 500))
+ADMISSION_MAX_IN_FLIGHT_CRAWLS = int(os.environ.get('ADMISSION_MAX_IN_FLIGHT_CRAWLS', 64))
+BROWSER_POOL_SIZE = int(os.environ.get('BROWSER_POOL_SIZE', 2))
+# Playwright runs allowed to wait for a browser before new work is refused
+ADMISSION_MAX_BROWSER_WAITERS = int(os.environ.get('ADMISSION_MAX_BROWSER_WAITERS', 6))
+# Longest a job waits for a browser before failing
+BROWSER_WAIT_SECONDS = float(os.environ.get('BROWSER_WAIT_SECONDS', 30))
+
+# Share of each limit a lane may use - background is refused first, interactive last
+LANE_HEADROOM = {PRIORITY_INTERACTIVE: 1.0, PRIORITY_BATCH: 0.75, PRIORITY_BACKGROUND: 0.5}
+
+# Completions are counted over this window to estimate how fast backlogs drain
+THROUGHPUT_WINDOW_SECONDS = 60
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 300
+
+# Queue depth comes from the shared store - don't query it on every request
+QUEUE_DEPTH_CACHE_SECONDS = 1.0
+
+
+class Throughput:
+    """Completions per second over a sliding window (thread-safe)"""
+
+    def __init__(self, window=THROUGHPUT_WINDOW_SECONDS):
+        self.window = window
+        self._events = deque()
+        self._lock = threading.Lock()
+
+    def record(self):
+        with self._lock:
+            self._events.append(time.time())
+
+    def rate(self, floor=0.1):
+        cutoff = time.time() - self.window
+        with self._lock:
+            while self._events and self._events[0] < cutoff:
+                self._events.popleft()
+            return max(floor, len(self._events) / self.window)
+
+
+class BrowserPool:
+    """Caps concurrent Playwright browsers; the number of waiters is the saturation signal"""
+
+    def __init__(self, size):
+        self.size = size
+        self.in_use = 0
+        self.waiters = 0
+        # EWMA of seconds per browser run, for Retry-After estimates
+        self.run_seconds = 25.0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self, timeout=BROWSER_WAIT_SECONDS):
+        """Hold a browser slot for the body; yields False if none freed up in time"""
+        deadline = time.time() + timeout
+        with self._cond:
+            self.waiters += 1
+            try:
+                while self.in_use >= self.size:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                acquired = self.in_use < self.size
+                if acquired:
+                    self.in_use += 1
+            finally:
+                self.waiters -= 1
+        if not acquired:
+            yield False
+            return
+
+        started = time.time()
+        try:
+            yield True
+        finally:
+            with self._cond:
+                self.in_use -= 1
+                self.run_seconds = 0.8 * self.run_seconds + 0.2 * (time.time() - started)
+                self._cond.notify()
+
+    def snapshot(self):
+        with self._cond:
+            return {'size': self.size, 'in_use': self.in_use, 'waiting': self.waiters,
+                    'avg_run_seconds': round(self.run_seconds, 1)}
+
+
+class Decision:
+    """Outcome of an admission check: admitted, or refused with a reason and Retry-After seconds"""
+
+    def __init__(self, admitted, reason=None, retry_after=None, rate_limited=False):
+        self.admitted = admitted
+        self.reason = reason
+        self.retry_after = retry_after
+        # Refused because of the caller's own quota rather than service load
+        self.rate_limited = rate_limited
+
+    def __bool__(self):
+        return self.admitted
+
+
+def max_admissible(priority):
+    """Most jobs of this lane one check() can ever admit - a larger batch would be refused forever"""
+    return int(ADMISSION_MAX_QUEUE_DEPTH * LANE_HEADROOM.get(priority, 1.0))
+
+
+def clamp_retry_after(seconds):
+    return int(min(MAX_RETRY_AFTER, max(MIN_RETRY_AFTER, math.ceil(seconds))))
+
+
+class AdmissionController:
+    def __init__(self, queue_depth_fn, browser_pool):
+        self.queue_depth_fn = queue_depth_fn
+        self.browser_pool = browser_pool
+        self.in_flight_crawls = {lane: 0 for lane in LANE_HEADROOM}
+        self.queue_drained = Throughput()
+        self.crawls_finished = Throughput()
+        self._lock = threading.Lock()
+        self._queue_depth = (0, 0.0)
+
+    def crawl_started(self, priority):
+        with self._lock:
+            self.in_flight_crawls[priority] += 1
+
+    def crawl_finished(self, priority):
+        with self._lock:
+            self.in_flight_crawls[priority] -= 1
+        self.crawls_finished.record()
+
+    def job_drained(self):
+        """A queued job left the queue (claimed by a worker)"""
+        self.queue_drained.record()
+
+    def _queued(self):
+        """Pending jobs in the shared store (cached briefly, bumped locally on admission)"""
+        with self._lock:
+            depth, checked_at = self._queue_depth
+        if time.time() - checked_at > QUEUE_DEPTH_CACHE_SECONDS:
+            try:
+                depth = self.queue_depth_fn()
+            except Exception as e:
+                print(f"⚠️  Admission: queue depth unavailable: {e}")
+            with self._lock:
+                self._queue_depth = (depth, time.time())
+        return depth
+
+    def queue_depth(self):
+        return self._queued() + sum(self.in_flight_crawls.values())
+
+    def check(self, priority=PRIORITY_INTERACTIVE, count=1):
+        """Can `count` more jobs of this lane be accepted right now?"""
+        headroom = LANE_HEADROOM.get(priority, 1.0)
+
+        depth_limit = ADMISSION_MAX_QUEUE_DEPTH * headroom
+        depth = self.queue_depth()
+        if depth + count > depth_limit:
+            excess = depth + count - depth_limit
+            drain_rate = self.queue_drained.rate() + self.crawls_finished.rate()
+            return Decision(False, f"queue depth {depth}", clamp_retry_after(excess / drain_rate))
+
+        crawl_limit = ADMISSION_MAX_IN_FLIGHT_CRAWLS * headroom
+        in_flight = self.in_flight_crawls.get(priority, 0)
+        if count == 1 and in_flight >= crawl_limit:
+            excess = in_flight - crawl_limit + 1
+            return Decision(False, f"{in_flight} {priority} crawls in flight",
+                            clamp_retry_after(excess / self.crawls_finished.rate()))
+
+        pool = self.browser_pool
+        waiter_limit = ADMISSION_MAX_BROWSER_WAITERS * headroom
+        if pool.in_use >= pool.size and pool.waiters >= waiter_limit:
+            queued_runs = pool.waiters + 1
+            return Decision(False, "browser pool saturated",
+                            clamp_retry_after(queued_runs * pool.run_seconds / max(pool.size, 1)))
+
+        # Count this admission until the next store read, so a burst can't slip past a stale depth
+        with self._lock:
+            depth, checked_at = self._queue_depth
+            self._queue_depth = (depth + count, checked_at)
+        return Decision(True)
+
+    def snapshot(self):
+        return {
+            'queue_depth': self.queue_depth(),
+            'in_flight_crawls': dict(self.in_flight_crawls),
+            'browser_pool': self.browser_pool.snapshot(),
+        }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission(queue_depth_fn):
+    """Process-wide controller; queue_depth_fn returns the shared queue's pending count"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController(queue_depth_fn, BrowserPool(BROWSER_POOL_SIZE))
+    return _controller
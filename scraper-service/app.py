@@ -14,8 +14,11 @@ import crochet
 crochet.setup()
 
 # 3. ONLY THEN import everything else
+import multiprocessing
 import uuid
+import hmac
 import time
+import threading
 from datetime import datetime, timedelta
 from flask import Flask, request, jsonify
 from flask_cors import CORS
@@ -39,61 +42,158 @@ except Exception as e:
     supabase = None
 
 # Now import Scrapy components (after crochet.setup())
-from crochet import wait_for
-from scrapy.crawler import CrawlerRunner
-from scrapy.utils.project import get_project_settings
-from spiders.product_spider import ProductSpider
+from crochet import wait_for, run_in_reactor
+from twisted.internet import threads
+from crawler_shards import CRAWLER_SHARDS, get_crawler, shard_status
 
 # 👇 IMPORT THE PIPELINE DIRECTLY 👇
-from pipelines import SupabasePipeline
+from pipelines import SupabasePipeline, build_product_row
+
+# First-tier engine: pooled HTTP + the spider's extractors, no crawler
+from fast_tier import fetch_product, FAST_TIER_ENABLED, FAST_OK, FAST_NOT_MODIFIED, FAST_BLOCKED, FAST_THROTTLED
+
+# Shared block-page classifier (Scrapy middleware, fast tier, Playwright)
+from block_detection import BLOCKED_TITLES, PageBlocked
+
+# Per-domain engine choice from observed success rates / latency
+from engine_router import get_router, ENGINE_FAST, ENGINE_SCRAPY, ENGINE_PLAYWRIGHT
+engine_router = get_router()
+
+# Cross-process result cache (optional - enabled by SHARED_CACHE_PATH)
+from shared_cache import get_shared_cache
+shared_cache = get_shared_cache()
 
 app = Flask(__name__)
 CORS(app)  # Allow Next.js frontend to call this
 
-# In-memory job store (upgrade to Redis in production)
-JOBS = {}
+# Behind Railway/Render's proxy: take the client IP (anonymous rate limits) from the
+# X-Forwarded-For entries our own proxies appended, not the ones a client sent
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', 1))
+if TRUSTED_PROXY_HOPS > 0:
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
 
-# Global storage for scraped items (keyed by job_id)
+# Shared job store: any worker can accept, run or report on any job (SQLite WAL / Redis)
+from job_store import get_job_store, STATUS_PENDING, STATUS_PROCESSING, STATUS_COMPLETED, STATUS_FAILED
+jobs = get_job_store()
+
+# Items handed over by the spider to the job's completion handler (same worker, keyed by job_id)
 SCRAPED_ITEMS = {}
 
-# Job statuses
-STATUS_PENDING = 'pending'
-STATUS_PROCESSING = 'processing'
-STATUS_COMPLETED = 'completed'
-STATUS_FAILED = 'failed'
+# Upper bound on URLs accepted by one /api/scrape/bulk call (also capped by the lane's admission headroom)
+BULK_MAX_URLS = int(os.environ.get('BULK_MAX_URLS', 500))
+
+# Priority lanes (interactive / batch / background) with separate concurrency budgets
+from priority_lanes import (get_lane_budgets, parse_priority, LANES,
+                            PRIORITY_INTERACTIVE, PRIORITY_BATCH)
+lane_budgets = get_lane_budgets()
+
+# Longest /api/scrape/sync waits for a lane slot + the scrape itself
+SYNC_MAX_WAIT = 30
+
+# Admission control: queue depth, in-flight crawls and the browser pool decide
+# whether new work is accepted (429 + Retry-After, or a stale cached answer)
+from admission import get_admission, max_admissible
+admission = get_admission(jobs.pending_count)
+
+# Hedged escalation: Playwright races crawls that run past the domain's p90
+from hedging import get_hedge_budget, Race, ATTEMPT_RUNNING, ATTEMPT_FAILED, HEDGE_ENABLED, HEDGE_MIN_DELAY
+hedge_budget = get_hedge_budget()
+
+# Per-user weighted fair queuing + per-tier rate limits
+from user_fairness import TIER_ANONYMOUS, get_tier_lookup, get_user_quotas, quota_key
+user_quotas = get_user_quotas()
+tier_lookup = get_tier_lookup(supabase)
+
+# Shared retry policy: classified failures, domain cooldowns, global retry budget
+from retry_policy import get_retry_policy, FAILURE_BLOCKED, FAILURE_PARSE_MISS
+retry_policy = get_retry_policy()
+
+# Native price refresh of wishlist items (replaces the capped Vercel cron when enabled)
+from price_refresh import start_price_refresh, get_price_refresh
+
+
+def overloaded(decision, **body):
+    """429 response for a refused admission, with its computed Retry-After"""
+    print(f"🚦 Admission refused ({decision.reason}), retry after {decision.retry_after}s")
+    response = jsonify({
+        "error": "Rate limit exceeded, retry later" if decision.rate_limited else "Scraper is overloaded, retry later",
+        "reason": decision.reason,
+        "retry_after": decision.retry_after,
+        **body
+    })
+    response.headers['Retry-After'] = str(decision.retry_after)
+    return response, 429
 
 
-def get_scrapy_settings():
+def caller_quota(user_id):
     """
-    Get Scrapy settings with stealth configuration
-    Loads from settings.py file (stealth mode enabled)
+    (quota key, tier) of this request: the user's plan from profiles - never what
+    the caller claims - or, without a user_id, the client IP's anonymous limits
     """
-    # Load project settings (includes stealth config from settings.py)
-    settings = get_project_settings()
-    
-    # Force override critical settings just in case
-    settings.set('ROBOTSTXT_OBEY', False)
+    if user_id:
+        return quota_key(user_id, None), tier_lookup.tier(user_id)
+    return quota_key(None, request.remote_addr), TIER_ANONYMOUS
+
+
+def admit(key, tier, priority, count=1):
+    """The caller's quota first, then service load; returns the Decision"""
+    decision = user_quotas.check(key, tier, count)
+    if not decision:
+        return decision
+    decision = admission.check(priority, count)
+    if not decision:
+        # Refused for load - don't charge the caller for it
+        user_quotas.refund(key, tier, count)
+    return decision
+
+
+def playwright_attempt(job_id, url, cancel=None):
+    """
+    One Playwright run (the caller holds a browser slot)
+    Returns (result, error): result only for a real product page, otherwise the
+    message to fail the job with - (None, None) if the attempt was cancelled
+    """
+    started = time.time()
+    try:
+        from playwright_scraper import scrape_with_playwright
+        result = scrape_with_playwright(url, cancel=cancel)
+    except ImportError:
+        # Playwright not installed
+        print(f"❌ Job {job_id}: Playwright not installed. Run: pip install playwright && playwright install chromium")
+        return None, "Scrapy failed and Playwright not available. Install: pip install playwright && playwright install chromium"
+    except Exception as e:
+        print(f"❌ Job {job_id}: Playwright crashed: {e}")
+        return None, f"Playwright fallback failed: {str(e)}"
     
-    # 👇 CHANGE LOG LEVEL TO INFO (So we can see the logs!) 👇
-    settings.set('LOG_LEVEL', 'INFO')
+    if cancel is not None and cancel.is_set():
+        return None, None
     
-    # REMOVED: Windows-specific reactor setting - Railway (Linux) will auto-detect EPoll reactor
-    # Don't force SelectReactor on Linux - let the system choose the best reactor
-    # settings.set('TWISTED_REACTOR', 'twisted.internet.selectreactor.SelectReactor')
+    # Get title safely (handle None values)
+    title = (result.get('title') or '') if result else ''
     
-    # 👇 USE THE IMPORTED CLASS DIRECTLY 👇
-    settings.set('ITEM_PIPELINES', {
-        SupabasePipeline: 300,
-    })
+    if result and title and "amazon.com" not in title.lower():
+        # SUCCESS - Check for captcha trap one more time
+        if not detect_captcha_trap(result):
+            print(f"✅ Job {job_id}: Playwright succeeded! Title: {title[:50]}...")
+            engine_router.record(url, ENGINE_PLAYWRIGHT, True, time.time() - started)
+            return result, None
+        # Still detected as captcha
+        print(f"❌ Job {job_id}: Playwright also detected captcha.")
+        engine_router.record(url, ENGINE_PLAYWRIGHT, False, time.time() - started)
+        return None, "All scraping methods failed or detected captcha"
     
-    # Ensure user-agent rotation is enabled
-    if 'scrapy_user_agents.middlewares.RandomUserAgentMiddleware' not in settings.get('DOWNLOADER_MIDDLEWARES', {}):
-        settings.set('DOWNLOADER_MIDDLEWARES', {
-            'scrapy.downloadermiddlewares.useragent.UserAgentMiddleware': None,
-            'scrapy_user_agents.middlewares.RandomUserAgentMiddleware': 400,
-        })
+    # FAILED - No title or generic title
+    display_title = title[:50] if title else 'None'
+    print(f"❌ Job {job_id}: Playwright also failed (title: '{display_title}')")
+    engine_router.record(url, ENGINE_PLAYWRIGHT, False, time.time() - started)
     
-    return settings
+    # Provide helpful error message based on the URL
+    from urllib.parse import urlparse
+    domain = urlparse(url).netloc.lower()
+    if 'etsy' in domain:
+        return None, "Etsy is blocking automated access. Please add this item manually."
+    return None, "Could not extract product data. The site may be blocking scrapers."
 
 
 def try_playwright_fallback(job_id, url):
@@ -105,55 +205,47 @@ def try_playwright_fallback(job_id, url):
     """
     print(f"🔄 Job {job_id}: Starting Playwright fallback...")
     
+    # Run the scraping logic - at most BROWSER_POOL_SIZE browsers at once
+    with admission.browser_pool.slot() as got_browser:
+        if not got_browser:
+            print(f"❌ Job {job_id}: no browser free, giving up")
+            jobs.fail(job_id, "All browsers are busy. Please try again shortly.")
+            return
+        result, error = playwright_attempt(job_id, url)
+    
+    if result:
+        jobs.complete(job_id, result)
+    else:
+        jobs.fail(job_id, error)
+
+
+def run_hedge(job_id, url, race):
+    """
+    Hedged Playwright attempt racing a slow crawl (runs in the thread pool)
+    Only starts if a browser is free right away; a win cancels the crawl
+    """
+    won = False
     try:
-        from playwright_scraper import scrape_with_playwright
-        
-        # Run the scraping logic
-        result = scrape_with_playwright(url)
-        
-        # Get title safely (handle None values)
-        title = (result.get('title') or '') if result else ''
+        with admission.browser_pool.slot(timeout=0) as got_browser:
+            if not got_browser:
+                print(f"🏁 Job {job_id}: no browser free, not hedging")
+                if race.hedge_skipped():
+                    # The crawl already gave up, counting on this attempt
+                    try_playwright_fallback(job_id, url)
+                return
+            result, error = playwright_attempt(job_id, url, cancel=race.cancelled)
         
-        if result and title and "amazon.com" not in title.lower():
-            # SUCCESS - Check for captcha trap one more time
-            if not detect_captcha_trap(result):
-                print(f"✅ Job {job_id}: Playwright fallback succeeded! Title: {title[:50]}...")
-                JOBS[job_id]["status"] = STATUS_COMPLETED
-                JOBS[job_id]["data"] = result
-                JOBS[job_id]["completed_at"] = time.time()
-            else:
-                # Still detected as captcha
-                print(f"❌ Job {job_id}: Playwright also detected captcha.")
-                JOBS[job_id]["status"] = STATUS_FAILED
-                JOBS[job_id]["error"] = "All scraping methods failed or detected captcha"
-                JOBS[job_id]["completed_at"] = time.time()
-        else:
-            # FAILED - No title or generic title
-            display_title = title[:50] if title else 'None'
-            print(f"❌ Job {job_id}: Playwright also failed (title: '{display_title}')")
-            JOBS[job_id]["status"] = STATUS_FAILED
-            
-            # Provide helpful error message based on the URL
-            from urllib.parse import urlparse
-            domain = urlparse(url).netloc.lower()
-            if 'etsy' in domain:
-                JOBS[job_id]["error"] = "Etsy is blocking automated access. Please add this item manually."
-            else:
-                JOBS[job_id]["error"] = "Could not extract product data. The site may be blocking scrapers."
-            
-            JOBS[job_id]["completed_at"] = time.time()
-            
-    except ImportError:
-        # Playwright not installed
-        print(f"❌ Job {job_id}: Playwright not installed. Run: pip install playwright && playwright install chromium")
-        JOBS[job_id]["status"] = STATUS_FAILED
-        JOBS[job_id]["error"] = "Scrapy failed and Playwright not available. Install: pip install playwright && playwright install chromium"
-        JOBS[job_id]["completed_at"] = time.time()
-    except Exception as e:
-        print(f"❌ Job {job_id}: Playwright crashed: {e}")
-        JOBS[job_id]["status"] = STATUS_FAILED
-        JOBS[job_id]["error"] = f"Playwright fallback failed: {str(e)}"
-        JOBS[job_id]["completed_at"] = time.time()
+        if result is not None:
+            if race.claim(ENGINE_PLAYWRIGHT):
+                won = True
+                print(f"🏁 Job {job_id}: hedged Playwright attempt won, cancelling the crawl")
+                jobs.complete(job_id, result)
+                from twisted.internet import reactor
+                reactor.callFromThread(get_crawler().cancel, job_id)
+        elif race.hedge_failed():
+            jobs.fail(job_id, error)
+    finally:
+        hedge_budget.finished(won)
 
 
 def detect_captcha_trap(data):
@@ -176,21 +268,7 @@ def detect_captcha_trap(data):
     image = data.get('image')
     
     # Suspicious titles that indicate blocking
-    suspicious_titles = [
-        "amazon.com",
-        "amazon.com: online shopping",
-        "robot check",
-        "sorry! something went wrong",
-        "page not found",
-        "access denied",
-        "unusual traffic",
-        "verify you're not a robot",
-        "pardon our interruption",  # Etsy
-        "security check",
-        "please verify you are a human",  # Etsy
-        "etsy - shop for handmade",  # Generic Etsy blocked
-        "just a moment",  # Cloudflare
-    ]
+    suspicious_titles = ("amazon.com", "amazon.com: online shopping", "page not found") + BLOCKED_TITLES
     
     if any(suspicious in title for suspicious in suspicious_titles):
         return True
@@ -220,71 +298,295 @@ def detect_captcha_trap(data):
     return False
 
 
-@wait_for(timeout=60.0)  # 60s timeout
-def run_spider(url, job_id, user_id=None):
+# Internal bookkeeping fields that ride along on items but never go back to clients
+INTERNAL_RESULT_KEYS = ('validators', 'fingerprint')
+
+
+def public_result(data):
+    """Strip internal fields from a scrape result before returning/caching it"""
+    if not data:
+        return data
+    return {k: v for k, v in data.items() if k not in INTERNAL_RESULT_KEYS}
+
+
+def cached_item_to_result(cached_item):
+    """Map a `products` cache row back to the scrape result shape"""
+    return {
+        "title": cached_item.get('title'),
+        "price": cached_item.get('price'),
+        "priceRaw": cached_item.get('price_raw') or cached_item.get('price'),
+        "image": cached_item.get('image'),
+        "description": cached_item.get('description'),
+        "domain": cached_item.get('domain'),
+        "url": cached_item.get('url'),
+    }
+
+
+def try_fast_tier(url, job_id, user_id=None, validators=None, fingerprint=None):
     """
-    Run Scrapy spider using CrawlerRunner (managed by crochet)
-    This runs in a separate thread managed by crochet's reactor
+    Try the fast tier before starting a crawl
+    Returns True if the job was settled here, False to escalate to Scrapy
+    """
+    if not FAST_TIER_ENABLED:
+        return False
     
-    CRITICAL: Uses callback mechanism to capture scraped items
+    started = time.time()
+    try:
+        outcome, item_data = fetch_product(url, user_id=user_id, validators=validators, fingerprint=fingerprint)
+    except Exception as e:
+        print(f"⚠️  Job {job_id}: Fast tier crashed: {e}")
+        engine_router.record(url, ENGINE_FAST, False, time.time() - started)
+        return False
+    
+    if outcome == FAST_THROTTLED:
+        # Not a failure of the fast tier - the crawler paces the domain without holding a thread
+        return False
+    
+    succeeded = outcome == FAST_NOT_MODIFIED or (outcome == FAST_OK and not detect_captcha_trap(item_data))
+    engine_router.record(url, ENGINE_FAST, succeeded, time.time() - started)
+    
+    if outcome == FAST_NOT_MODIFIED:
+        jobs.complete(job_id, not_modified=True)
+        return True
+    
+    if outcome == FAST_BLOCKED:
+        # Block page at response time - Scrapy would get the same one, go straight to a browser
+        print(f"⚠️  Job {job_id}: Fast tier got a block page, trying Playwright fallback...")
+        try_playwright_fallback(job_id, url)
+        return True
+    
+    if outcome == FAST_OK:
+        if detect_captcha_trap(item_data):
+            # Plain HTTP got a block page - Scrapy would get the same one, go straight to a browser
+            print(f"⚠️  Job {job_id}: Fast tier hit a captcha, trying Playwright fallback...")
+            retry_policy.failed(url, FAILURE_BLOCKED)
+            try_playwright_fallback(job_id, url)
+        else:
+            print(f"⚡ Job {job_id}: Fast tier succeeded! Title: '{item_data.get('title', '')[:50]}...'")
+            jobs.complete(job_id, item_data)
+        return True
+    
+    return False
+
+
+def submit_to_crawler(url, job_id, user_id=None, validators=None, fingerprint=None, priority=None):
     """
-    settings = get_scrapy_settings()
-    runner = CrawlerRunner(settings)
+    Queue one job on the persistent crawler and wire up its completion handling
+    Must run in crochet's reactor thread; returns a Deferred for the job
     
+    CRITICAL: Uses callback mechanism to capture scraped items
+    """
     # Define the callback that the Spider will call
     def store_scraped_item(item):
         """Callback function to store scraped item"""
         print(f"✅ Job {job_id} found item: {item.get('title', '')[:50]}...")
         SCRAPED_ITEMS[job_id] = item  # Store in global dict
     
-    # Pass the callback and user_id to the spider via arguments
-    deferred = runner.crawl(ProductSpider, url=url, on_item_scraped=store_scraped_item, user_id=user_id)
+    def mark_not_modified():
+        """Callback for a 304 / unchanged fingerprint on a refresh - the cached copy is current"""
+        print(f"♻️  Job {job_id}: page not modified since last scrape")
+        jobs.update(job_id, not_modified=True)
+    
+    # Queue the job on the shared crawl - callbacks and user_id ride along with the request
+    started = time.time()
+    lane = priority or PRIORITY_INTERACTIVE
+    admission.crawl_started(lane)
+    deferred = get_crawler().submit(url, user_id=user_id, validators=validators, fingerprint=fingerprint,
+                                    on_item_scraped=store_scraped_item, on_not_modified=mark_not_modified,
+                                    job_id=job_id, priority=priority)
+    
+    # Interactive crawls that outlive the domain's p90 get a Playwright attempt alongside (budgeted)
+    race = Race()
+    hedge_run = None
+    hedge_timer = None
+    
+    def start_hedge(delay):
+        nonlocal hedge_run
+        if race.primary != ATTEMPT_RUNNING or not hedge_budget.try_start():
+            return
+        if not race.hedge_started():
+            hedge_budget.finished(False)
+            return
+        print(f"🏁 Job {job_id}: crawl still running after {delay:.1f}s (domain p90), hedging with Playwright...")
+        hedge_run = threads.deferToThread(run_hedge, job_id, url, race)
+    
+    if HEDGE_ENABLED and lane == PRIORITY_INTERACTIVE:
+        from twisted.internet import reactor
+        hedge_budget.crawl_started()
+        delay = max(HEDGE_MIN_DELAY, engine_router.latency_quantile(url, ENGINE_SCRAPY, 0.9))
+        hedge_timer = reactor.callLater(delay, start_hedge, delay)
+    
+    def crawl_settled():
+        """The crawl is over - no hedge starts after this; True if a hedge already won"""
+        if hedge_timer is not None and hedge_timer.active():
+            hedge_timer.cancel()
+        if race.winner is not None:
+            SCRAPED_ITEMS.pop(job_id, None)
+            return True
+        return False
+    
+    def escalate():
+        """The crawl came back empty - Playwright takes over, unless a hedge is already on it"""
+        hedge_state = race.primary_failed()
+        if hedge_state is None:
+            return threads.deferToThread(try_playwright_fallback, job_id, url)
+        if hedge_state == ATTEMPT_RUNNING:
+            return hedge_run
+        if hedge_state == ATTEMPT_FAILED:
+            jobs.fail(job_id, "All scraping methods failed or detected captcha")
+        return None
     
     def on_success(result):
         """Called when crawl completes successfully"""
+        if crawl_settled():
+            return result
+        
         # Check if we got an item via callback
         item_data = SCRAPED_ITEMS.get(job_id)
+        not_modified = (jobs.get(job_id) or {}).get("not_modified")
+        fallback = None
+        
+        succeeded = not_modified or (item_data and not detect_captcha_trap(item_data))
+        engine_router.record(url, ENGINE_SCRAPY, bool(succeeded), time.time() - started)
         
-        if item_data:
+        if not_modified:
+            # Revalidated - caller keeps its cached copy, nothing to extract
+            if race.claim(ENGINE_SCRAPY):
+                jobs.complete(job_id, not_modified=True)
+        elif item_data:
             # Check for captcha trap
             if detect_captcha_trap(item_data):
                 # Scrapy detected captcha → Try Playwright fallback
                 print(f"⚠️  Job {job_id}: Scrapy detected captcha (title: '{item_data.get('title', '')[:50]}'), trying Playwright fallback...")
-                try_playwright_fallback(job_id, url)
-            else:
-                # Success with Scrapy!
+                retry_policy.failed(url, FAILURE_BLOCKED)
+                fallback = escalate()
+            elif race.claim(ENGINE_SCRAPY):
+                # Success with Scrapy! (a hedged Playwright run, if any, stops at its next step)
                 print(f"✅ Job {job_id}: Scrapy succeeded! Title: '{item_data.get('title', '')[:50]}...'")
-                JOBS[job_id]["status"] = STATUS_COMPLETED
-                JOBS[job_id]["data"] = item_data
-                JOBS[job_id]["completed_at"] = time.time()
+                jobs.complete(job_id, item_data)
         else:
             # No data from Scrapy → Try Playwright fallback
             print(f"⚠️  Job {job_id}: Scrapy returned no data, trying Playwright fallback...")
-            try_playwright_fallback(job_id, url)
+            retry_policy.failed(url, FAILURE_PARSE_MISS)
+            fallback = escalate()
         
         # Clean up
         if job_id in SCRAPED_ITEMS:
             del SCRAPED_ITEMS[job_id]
         
-        return result
+        # Playwright runs in the thread pool so the shared reactor keeps crawling
+        return fallback if fallback is not None else result
     
     def on_error(failure):
         """Called when crawl fails"""
-        JOBS[job_id]["status"] = STATUS_FAILED
-        error_msg = str(failure.value) if hasattr(failure, 'value') else str(failure)
-        JOBS[job_id]["error"] = error_msg
-        JOBS[job_id]["completed_at"] = time.time()
+        if crawl_settled():
+            # Cancelled because a hedged attempt won - not a Scrapy failure
+            return None
+        engine_router.record(url, ENGINE_SCRAPY, False, time.time() - started)
+        if failure.check(PageBlocked):
+            # Block page caught at response time - skip extraction, escalate to a browser
+            print(f"⚠️  Job {job_id}: Scrapy got a block page ({failure.value.reason}), trying Playwright fallback...")
+            if job_id in SCRAPED_ITEMS:
+                del SCRAPED_ITEMS[job_id]
+            return escalate()
         
         # Clean up
         if job_id in SCRAPED_ITEMS:
             del SCRAPED_ITEMS[job_id]
         
+        hedge_state = race.primary_failed()
+        if hedge_state == ATTEMPT_RUNNING:
+            # The hedged attempt settles the job
+            return hedge_run
+        if hedge_state is None or hedge_state == ATTEMPT_FAILED:
+            error_msg = str(failure.value) if hasattr(failure, 'value') else str(failure)
+            jobs.fail(job_id, error_msg)
+        
         return failure
     
+    def crawl_finished(result):
+        admission.crawl_finished(lane)
+        return result
+    
+    deferred.addBoth(crawl_finished)
     deferred.addCallbacks(on_success, on_error)
     return deferred
 
 
+@wait_for(timeout=60.0)  # 60s timeout
+def run_spider(url, job_id, user_id=None, validators=None, fingerprint=None, priority=None):
+    """
+    Run the URL through the persistent crawler (managed by crochet)
+    This runs in a separate thread managed by crochet's reactor
+    """
+    return submit_to_crawler(url, job_id, user_id, validators, fingerprint, priority)
+
+
+def start_job(url, job_id, user_id=None, validators=None, fingerprint=None, priority=PRIORITY_INTERACTIVE):
+    """
+    Run a job through the engines the router picks for its domain
+    (cheapest likely to succeed first; Playwright stays the last resort)
+    """
+    for engine in engine_router.plan(url):
+        if engine == ENGINE_FAST:
+            if try_fast_tier(url, job_id, user_id, validators, fingerprint):
+                return
+        elif engine == ENGINE_SCRAPY:
+            # Falls back to Playwright on its own
+            run_spider(url, job_id, user_id, validators, fingerprint, priority)
+            return
+        else:
+            print(f"🧭 Job {job_id}: going straight to Playwright")
+            try_playwright_fallback(job_id, url)
+            return
+
+
+def run_queued_job(job):
+    """Execute a job claimed from the shared queue; whatever happens, it ends up finished"""
+    job_id = job["id"]
+    admission.job_drained()
+    SCRAPED_ITEMS[job_id] = None
+    try:
+        start_job(job["url"], job_id, job.get("user_id"), job.get("validators"), job.get("fingerprint"),
+                  job.get("priority") or PRIORITY_INTERACTIVE)
+    except Exception as e:
+        print(f"❌ Job {job_id}: {e}")
+        if not jobs.is_finished(job_id):
+            jobs.fail(job_id, str(e))
+    finally:
+        SCRAPED_ITEMS.pop(job_id, None)
+
+
+def job_worker_loop(lane):
+    """Claim queued jobs of one priority lane from the shared store - any worker may run any job"""
+    while True:
+        try:
+            job = jobs.claim(lanes=(lane,), timeout=2.0)
+        except Exception as e:
+            print(f"⚠️  Job queue error: {e}")
+            time.sleep(1)
+            continue
+        if not job:
+            continue
+        print(f"📥 Job {job['id']}: claimed {job['url']} ({lane})")
+        # Sync scrapes of the same lane share its budget
+        while not lane_budgets.acquire(lane, timeout=5.0):
+            pass
+        try:
+            # Long runs (browser waits, retries) keep their lease instead of being requeued mid-run
+            with jobs.leased(job):
+                run_queued_job(job)
+        finally:
+            lane_budgets.release(lane)
+
+
+def start_job_workers():
+    """One queue worker per slot of each lane's budget"""
+    for lane in LANES:
+        for _ in range(lane_budgets.budgets[lane]):
+            threading.Thread(target=job_worker_loop, args=(lane,), daemon=True).start()
+
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -293,7 +595,15 @@ def health():
         "service": "wist-scraper",
         "python": True,
         "scrapy": True,
-        "crochet": True
+        "crochet": True,
+        "fast_tier": FAST_TIER_ENABLED,
+        "job_store": jobs.backend,
+        "crawler_shards": shard_status(),
+        "lanes": lane_budgets.snapshot(),
+        "load": admission.snapshot(),
+        "hedging": hedge_budget.snapshot() if HEDGE_ENABLED else None,
+        "retries": retry_policy.snapshot(),
+        "price_refresh": get_price_refresh().snapshot() if get_price_refresh() else None
     }), 200
 
 
@@ -311,6 +621,12 @@ def start_scrape_job():
     if not url:
         return jsonify({"error": "URL required"}), 400
     
+    try:
+        priority = parse_priority(data.get('priority'), PRIORITY_INTERACTIVE)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    key, tier = caller_quota(user_id)
+    
     # Validate URL
     try:
         from urllib.parse import urlparse
@@ -320,30 +636,16 @@ def start_scrape_job():
     except Exception:
         return jsonify({"error": "Invalid URL format"}), 400
     
-    # Create job
-    job_id = str(uuid.uuid4())
-    JOBS[job_id] = {
-        "id": job_id,
-        "status": STATUS_PROCESSING,
-        "url": url,
-        "data": None,
-        "error": None,
-        "started_at": time.time()
-    }
+    decision = admit(key, tier, priority)
+    if not decision:
+        return overloaded(decision)
     
-    # Initialize item storage for this job
-    SCRAPED_ITEMS[job_id] = None
-    
-    # Start the scrape in the background (crochet manages the reactor)
+    # Queue the job - whichever worker claims it first runs it
+    job_id = str(uuid.uuid4())
     try:
-        # 👇 PASS user_id TO THE SPIDER
-        run_spider(url, job_id, user_id)
+        # 👇 user_id rides along to the SPIDER
+        jobs.enqueue(job_id, url, priority=priority, user_id=user_id, tier=tier)
     except Exception as e:
-        JOBS[job_id]["status"] = STATUS_FAILED
-        JOBS[job_id]["error"] = str(e)
-        JOBS[job_id]["completed_at"] = time.time()
-        if job_id in SCRAPED_ITEMS:
-            del SCRAPED_ITEMS[job_id]
         return jsonify({
             "error": "Failed to start scrape job",
             "detail": str(e)
@@ -351,19 +653,82 @@ def start_scrape_job():
     
     return jsonify({
         "job_id": job_id,
-        "status": STATUS_PROCESSING,
+        "status": STATUS_PENDING,
         "url": url,
+        "priority": priority,
         "message": "Job created, polling /api/job/<job_id> for status"
     }), 202
 
 
+@app.route('/api/scrape/bulk', methods=['POST'])
+def start_bulk_scrape():
+    """
+    Queue one async job per URL - the lane's workers run them like any queued job
+    (lane budget, fair order across users, engine routing)
+    Returns every job_id immediately; poll /api/job/<job_id> for each
+    """
+    data = request.get_json(silent=True) or {}
+    urls = data.get('urls') or []
+    user_id = data.get('user_id')
+    
+    if not isinstance(urls, list) or not urls:
+        return jsonify({"error": "urls (non-empty list) required"}), 400
+    try:
+        priority = parse_priority(data.get('priority'), PRIORITY_BATCH)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    key, tier = caller_quota(user_id)
+    # More than the lane's admission headroom would be refused with 429 however long the caller waits
+    max_urls = min(BULK_MAX_URLS, max_admissible(priority))
+    if len(urls) > max_urls:
+        return jsonify({"error": f"At most {max_urls} URLs per bulk request on the {priority} lane"}), 400
+    if len(urls) > user_quotas.burst(tier):
+        plan = "without a user_id" if tier == TIER_ANONYMOUS else f"on the {tier} plan"
+        return jsonify({"error": f"At most {user_quotas.burst(tier)} URLs per bulk request {plan}"}), 400
+    
+    from urllib.parse import urlparse
+    valid = []
+    rejected = []
+    for url in urls:
+        parsed = urlparse(url) if isinstance(url, str) else None
+        if not parsed or not parsed.scheme or not parsed.netloc:
+            rejected.append(url)
+        else:
+            valid.append(url)
+    
+    # The whole batch is admitted or refused - half an import is harder to retry
+    decision = admit(key, tier, priority, count=len(valid))
+    if not decision:
+        return overloaded(decision, rejected=rejected)
+    
+    queued = []
+    try:
+        for url in valid:
+            job_id = str(uuid.uuid4())
+            jobs.enqueue(job_id, url, priority=priority, user_id=user_id, tier=tier)
+            queued.append((url, job_id))
+    except Exception as e:
+        return jsonify({
+            "error": "Failed to queue bulk jobs",
+            "detail": str(e),
+            "jobs": [{"job_id": job_id, "url": url} for url, job_id in queued],
+        }), 500
+    
+    return jsonify({
+        "jobs": [{"job_id": job_id, "url": url} for url, job_id in queued],
+        "rejected": rejected,
+        "status": STATUS_PENDING,
+        "message": "Jobs created, polling /api/job/<job_id> for status"
+    }), 202
+
+
 @app.route('/api/job/<job_id>', methods=['GET'])
 def check_status(job_id):
     """
     Get job status and result
     Returns data in format expected by TypeScript frontend
     """
-    job = JOBS.get(job_id)
+    job = jobs.get(job_id)
     
     if not job:
         return jsonify({"error": "Job not found"}), 404
@@ -377,7 +742,7 @@ def check_status(job_id):
     
     if job["status"] == STATUS_COMPLETED:
         # Return result in format: { status: "completed", result: { title, price, ... } }
-        response["result"] = job["data"]
+        response["result"] = public_result(job["data"])
         response["completed_at"] = job.get("completed_at", time.time())
     elif job["status"] == STATUS_FAILED:
         response["error"] = job.get("error", "Unknown error")
@@ -386,6 +751,87 @@ def check_status(job_id):
     return jsonify(response)
 
 
+def admin_refusal():
+    """
+    Error response for a request without the admin key, None if it may proceed
+    Admin endpoints don't exist at all unless ADMIN_API_KEY is configured
+    """
+    admin_key = os.environ.get('ADMIN_API_KEY')
+    if not admin_key:
+        return jsonify({"error": "Not found"}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Key', ''), admin_key):
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+
+def positive_number(value, kind, name, maximum=None):
+    """Parse an optional positive request parameter, clamped to maximum; ValueError if invalid"""
+    if value is None:
+        return None
+    try:
+        number = kind(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a positive number")
+    if number <= 0:
+        raise ValueError(f"{name} must be a positive number")
+    return min(number, maximum) if maximum else number
+
+
+@app.route('/api/reextract', methods=['POST'])
+def start_reextraction():
+    """
+    Re-run the current extractors over the HTML archive (no network)
+    Runs in the background - poll /api/job/<job_id> for the summary
+    """
+    refusal = admin_refusal()
+    if refusal:
+        return refusal
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        since_hours = positive_number(data.get('since_hours'), float, 'since_hours')
+        # Leave a core for the web workers and the crawl
+        workers = positive_number(data.get('workers'), int, 'workers', max(1, (os.cpu_count() or 2) - 1))
+        limit = positive_number(data.get('limit'), int, 'limit')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    job_id = str(uuid.uuid4())
+    jobs.create(job_id, "archive://" + (data.get('domain') or '*'))
+    
+    def run():
+        try:
+            from reextract import run_reextraction
+            summary = run_reextraction(
+                domain=data.get('domain'),
+                since=time.time() - since_hours * 3600 if since_hours else None,
+                workers=workers,
+                dry_run=bool(data.get('dry_run')),
+                limit=limit,
+            )
+            jobs.complete(job_id, summary)
+        except Exception as e:
+            print(f"❌ Re-extraction job {job_id} failed: {e}")
+            jobs.fail(job_id, str(e))
+    
+    threading.Thread(target=run, daemon=True).start()
+    
+    return jsonify({
+        "job_id": job_id,
+        "status": STATUS_PROCESSING,
+        "message": "Re-extraction started, polling /api/job/<job_id> for the summary"
+    }), 202
+
+
+@app.route('/api/router', methods=['GET'])
+def router_stats():
+    """Per-domain engine success rates / latency the router is working from (this worker only)"""
+    refusal = admin_refusal()
+    if refusal:
+        return refusal
+    return jsonify(engine_router.snapshot()), 200
+
+
 @app.route('/api/scrape/sync', methods=['POST'])
 def scrape_sync():
     """
@@ -405,9 +851,26 @@ def scrape_sync():
     if not url:
         return jsonify({"error": "URL required"}), 400
     
-    print(f"🔔 Request received for: {url} (user_id: {user_id})")
+    try:
+        priority = parse_priority(data.get('priority'), PRIORITY_INTERACTIVE)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    key, tier = caller_quota(user_id)
+    
+    print(f"🔔 Request received for: {url} (user_id: {user_id}, priority: {priority})")
+    
+    # --- 0. CHECK SHARED LOCAL CACHE (warm across all workers on this box) ---
+    if shared_cache:
+        cached_result = shared_cache.get(url)
+        if cached_result:
+            print(f"✅ Found in Cache (Shared): {(cached_result.get('title') or '')[:50]}...")
+            return jsonify({
+                "success": True,
+                "result": {**cached_result, "source": "cache"}
+            }), 200
     
     # --- 1. CHECK DATABASE (CACHE) FIRST ---
+    cached_item = None
     if supabase:
         try:
             # Check if we scraped this URL in the last 6 hours
@@ -426,17 +889,17 @@ def scrape_sync():
                         if age_hours < 6:
                             print(f"✅ Found in Cache (Database): {cached_item.get('title', '')[:50]}... (age: {age_hours:.1f}h)")
                             
+                            cached_result = cached_item_to_result(cached_item)
+                            
+                            # Warm the shared cache for the other workers (only for the remaining freshness)
+                            if shared_cache:
+                                shared_cache.set(url, cached_result, ttl_seconds=(6 - age_hours) * 3600)
+                            
                             # Return the cached data immediately!
                             return jsonify({
                                 "success": True,
                                 "result": {
-                                    "title": cached_item.get('title'),
-                                    "price": cached_item.get('price'),
-                                    "priceRaw": cached_item.get('price_raw') or cached_item.get('price'),
-                                    "image": cached_item.get('image'),
-                                    "description": cached_item.get('description'),
-                                    "domain": cached_item.get('domain'),
-                                    "url": cached_item.get('url'),
+                                    **cached_result,
                                     "source": "cache"  # Let frontend know it was cached
                                 }
                             }), 200
@@ -449,62 +912,89 @@ def scrape_sync():
         except Exception as e:
             print(f"⚠️  Database Read Error: {e}")
     
-    # --- 2. IF NOT IN DB OR EXPIRED, SCRAPE IT ---
+    # --- 2. IF NOT IN DB OR EXPIRED, SCRAPE IT (within this priority lane's budget) ---
+    decision = admit(key, tier, priority)
+    if not decision:
+        if cached_item:
+            # Overloaded or over quota: an expired cache row beats a 429 - serve it, flagged as stale
+            print(f"🚦 Admission refused ({decision.reason}), serving stale cache")
+            return jsonify({
+                "success": True,
+                "result": {**cached_item_to_result(cached_item), "source": "stale_cache"}
+            }), 200
+        return overloaded(decision, success=False)
+    
+    wait_started = time.time()
+    if not lane_budgets.acquire(priority, SYNC_MAX_WAIT):
+        return jsonify({
+            "success": False,
+            "error": f"Too many {priority} scrapes in progress"
+        }), 503
+    try:
+        return scrape_and_respond(url, user_id, priority, cached_item, SYNC_MAX_WAIT - (time.time() - wait_started))
+    finally:
+        lane_budgets.release(priority)
+
+
+def scrape_and_respond(url, user_id, priority, cached_item, max_wait):
+    """Run one sync scrape and build the /api/scrape/sync response (caller holds a lane slot)"""
     job_id = str(uuid.uuid4())
-    JOBS[job_id] = {
-        "id": job_id,
-        "status": STATUS_PROCESSING,
-        "url": url,
-        "data": None,
-        "error": None,
-        "started_at": time.time()
-    }
+    jobs.create(job_id, url, user_id=user_id, priority=priority)
     
     SCRAPED_ITEMS[job_id] = None
     
+    # Refresh of an expired cache row: revalidate with its ETag / Last-Modified,
+    # and let the spider skip extraction if the content fingerprint still matches
+    validators = None
+    fingerprint = None
+    if cached_item:
+        cached_meta = cached_item.get('meta') or {}
+        validators = cached_meta.get('validators')
+        fingerprint = cached_meta.get('fingerprint')
+    
     try:
-        # Run spider and wait for result (crochet handles this)
+        # Fast tier first, then the spider (crochet handles this)
         # 👇 PASS user_id TO THE SPIDER
-        run_spider(url, job_id, user_id)
+        start_job(url, job_id, user_id, validators, fingerprint, priority)
         
-        # Poll until complete (with timeout)
-        max_wait = 30  # 30 second timeout for sync
-        start_time = time.time()
+        # Wait for the completion signal (with timeout)
+        job = jobs.wait(job_id, max(0.0, max_wait))
+        if job is None:
+            if job_id in SCRAPED_ITEMS:
+                del SCRAPED_ITEMS[job_id]
+            return jsonify({
+                "success": False,
+                "error": "Scraping timeout"
+            }), 504
         
-        while JOBS[job_id]["status"] == STATUS_PROCESSING:
-            if time.time() - start_time > max_wait:
-                if job_id in SCRAPED_ITEMS:
-                    del SCRAPED_ITEMS[job_id]
-                return jsonify({
-                    "success": False,
-                    "error": "Scraping timeout"
-                }), 504
+        if job["status"] == STATUS_COMPLETED and job.get("not_modified"):
+            # --- 3a. UNCHANGED (304 OR SAME FINGERPRINT): ONLY BUMP FRESHNESS ---
+            cached_result = cached_item_to_result(cached_item)
+            if shared_cache:
+                shared_cache.set(url, cached_result)
+            if supabase:
+                try:
+                    supabase.table('products').update({
+                        "last_scraped": datetime.utcnow().isoformat() + 'Z'
+                    }).eq('url', url).execute()
+                except Exception as e:
+                    print(f"⚠️  Failed to bump last_scraped: {e}")
             
-            time.sleep(0.5)  # Check every 500ms
+            return jsonify({
+                "success": True,
+                "result": {**cached_result, "source": "revalidated"}
+            }), 200
         
-        if JOBS[job_id]["status"] == STATUS_COMPLETED:
-            result_data = JOBS[job_id]["data"]
+        if job["status"] == STATUS_COMPLETED:
+            result_data = job["data"]
+            
+            if shared_cache and result_data:
+                shared_cache.set(url, public_result(result_data))
             
             # --- 3. SAVE TO SUPABASE CACHE ---
             if supabase and result_data:
                 try:
-                    from urllib.parse import urlparse
-                    domain = urlparse(url).netloc.replace('www.', '')
-                    
-                    product_data = {
-                        "url": url,
-                        "title": result_data.get('title'),
-                        "price": str(result_data.get('price', '')) if result_data.get('price') else None,
-                        "price_raw": result_data.get('priceRaw') or result_data.get('price'),
-                        "image": result_data.get('image'),
-                        "description": result_data.get('description'),
-                        "domain": domain,
-                        "last_scraped": datetime.utcnow().isoformat() + 'Z',
-                        "meta": {
-                            "scraped_at": datetime.utcnow().isoformat(),
-                            "method": "scrapy_playwright"
-                        }
-                    }
+                    product_data = build_product_row(url, result_data, "scrapy_playwright")
                     
                     # Use upsert to handle duplicates (update if exists, insert if new)
                     supabase.table('products').upsert(
@@ -519,23 +1009,39 @@ def scrape_sync():
             
             return jsonify({
                 "success": True,
-                "result": result_data
+                "result": public_result(result_data)
             }), 200
         else:
             return jsonify({
                 "success": False,
-                "error": JOBS[job_id].get("error", "Scraping failed")
+                "error": job.get("error") or "Scraping failed"
             }), 500
             
     except Exception as e:
         if job_id in SCRAPED_ITEMS:
             del SCRAPED_ITEMS[job_id]
+        if not jobs.is_finished(job_id):
+            jobs.fail(job_id, str(e))
         return jsonify({
             "success": False,
             "error": str(e)
         }), 500
 
 
+# Every worker (gunicorn process) also runs jobs queued by any other worker -
+# but not a crawler shard that re-imported this module as its spawn __main__
+if multiprocessing.parent_process() is None:
+    if int(os.environ.get('WEB_CONCURRENCY', 1)) > 1:
+        print("⚠️  WEB_CONCURRENCY > 1: domain, browser, lane and user limits are per worker - "
+              "each retailer gets them once per worker (use CRAWLER_SHARDS to scale instead)")
+    if CRAWLER_SHARDS > 0:
+        # Start the shards now so the fast tier throttles against their token buckets from the first request
+        get_crawler()
+    start_job_workers()
+    # One worker per box wins the scheduler lock
+    start_price_refresh(supabase, jobs)
+
+
 if __name__ == '__main__':
     # Get port from environment variable (for Railway/Render) or default to 5000
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,156 @@
+"""
+Early block-page detection shared by every engine
+Classifies a fetch from cheap signals only - status code, challenge headers,
+redirect target, <title> and one precompiled multi-pattern scan over the first
+few KB of the body - so block/captcha pages are abandoned at response time
+instead of after a full extraction. Used by the Scrapy downloader middleware,
+the fast tier and Playwright's response hook; app.detect_captcha_trap shares
+the title lists for extracted items.
+"""
+import re
+
+from scrapy.exceptions import IgnoreRequest
+
+# Only the start of the body is scanned - challenge pages are tiny and say so early
+SCAN_BYTES = 8 * 1024
+
+# Statuses that only count as a block together with another signal (a plain 503 can be a real outage)
+CHALLENGE_STATUSES = (403, 429, 503)
+
+# Header name → value substring ('' = presence is enough), checked on challenge statuses
+CHALLENGE_HEADERS = {
+    'cf-mitigated': 'challenge',
+    'x-amzn-waf-action': '',
+    'x-datadome': '',
+    'x-px-block': '',
+    'x-sucuri-block': '',
+    'server': 'cloudflare',
+}
+
+# Redirect / final URLs that are always a challenge
+BLOCK_URL_RE = re.compile(
+    r'validatecaptcha|/captcha|captcha-delivery\.com|challenges\.cloudflare\.com|'
+    r'/blocked\?|px-captcha|/sorry/index|/errors/validate',
+    re.IGNORECASE,
+)
+
+# Titles of known block/interstitial pages (also used for extracted items in app.py)
+BLOCKED_TITLES = (
+    "robot check",
+    "sorry! something went wrong",
+    "access denied",
+    "unusual traffic",
+    "verify you're not a robot",
+    "pardon our interruption",  # Etsy
+    "security check",
+    "please verify you are a human",  # Etsy
+    "etsy - shop for handmade",  # Generic Etsy blocked
+    "just a moment",  # Cloudflare
+    "attention required",  # Cloudflare
+)
+# Keywords that are safe to match anywhere in a title - 'robot' or 'verify' are not
+# (robot vacuums), app.detect_captcha_trap applies its broader list to extracted items
+BLOCKED_TITLE_KEYWORDS = (
+    'captcha', 'bot detected', 'checking your browser',
+    'automated access', 'suspicious activity',
+)
+BLOCKED_TITLE_RE = re.compile(
+    '|'.join(re.escape(t) for t in BLOCKED_TITLES + BLOCKED_TITLE_KEYWORDS),
+    re.IGNORECASE,
+)
+
+# Phrases that only appear on challenge pages - matched on any status
+BLOCK_BODY_RE = re.compile(
+    rb'enter the characters you see below|pardon our interruption|'
+    rb'verify you are a human|are you a robot|checking your browser before accessing|'
+    rb'cf-browser-verification|_incapsula_resource|px-captcha|'
+    rb'api-services-support@amazon\.com|to discuss automated access',
+    re.IGNORECASE,
+)
+# Markers that normal pages also load (bot-management scripts) - only on challenge statuses
+CHALLENGE_BODY_RE = re.compile(
+    rb'/cdn-cgi/challenge-platform|captcha-delivery\.com|captcha',
+    re.IGNORECASE,
+)
+
+TITLE_RE = re.compile(rb'<title[^>]*>([^<]{0,300})', re.IGNORECASE)
+
+
+class PageBlocked(IgnoreRequest):
+    """A fetch came back as a block/challenge page - escalate instead of extracting"""
+
+    def __init__(self, reason, url=None):
+        super().__init__(f"Blocked ({reason}): {url}")
+        self.reason = reason
+        self.url = url
+
+
+def _header(headers, name):
+    value = headers.get(name)
+    if value is None:
+        return None
+    if isinstance(value, list):
+        value = value[0] if value else b''
+    if isinstance(value, bytes):
+        value = value.decode('latin-1')
+    return value.lower()
+
+
+def title_reason(title):
+    """Reason string if a page title looks like a block page, else None"""
+    if not title:
+        return None
+    match = BLOCKED_TITLE_RE.search(title)
+    return f"title '{match.group(0).lower()}'" if match else None
+
+
+def classify(status=None, headers=None, url=None, body=None, title=None, location=None):
+    """
+    Return a short reason string if the response looks like a block page, else None
+    headers may be Scrapy Headers, httpx Headers or a plain dict; body is bytes (only the head is read)
+    """
+    if status == 429:
+        return 'status 429'
+
+    for target in (location, url):
+        if target and BLOCK_URL_RE.search(target):
+            return f"redirect to {target[:80]}"
+
+    challenged = status in CHALLENGE_STATUSES
+    if challenged and headers is not None:
+        for name, needle in CHALLENGE_HEADERS.items():
+            value = _header(headers, name)
+            if value is not None and needle in value:
+                return f"status {status} + {name} header"
+
+    head = body[:SCAN_BYTES] if body else b''
+    if head and title is None:
+        match = TITLE_RE.search(head)
+        if match:
+            title = match.group(1).decode('utf-8', 'ignore')
+
+    reason = title_reason(title)
+    if reason:
+        return reason
+
+    if head:
+        match = BLOCK_BODY_RE.search(head)
+        if match:
+            return f"body '{match.group(0).decode('latin-1').lower()}'"
+        if challenged:
+            match = CHALLENGE_BODY_RE.search(head)
+            if match:
+                return f"status {status} + body '{match.group(0).decode('latin-1').lower()}'"
+    return None
+
+
+def classify_response(response):
+    """classify() for a Scrapy response"""
+    location = response.headers.get('Location')
+    return classify(
+        status=response.status,
+        headers=response.headers,
+        url=response.url,
+        body=response.body,
+        location=location.decode('latin-1') if location else None,
+    )
@@ -0,0 +1,171 @@
+"""
+Long-lived crawler infrastructure
+One CrawlerRunner with cached settings and one long-running ProductSpider that
+takes new jobs from a queue. The downloader (connection pool, DNS cache, TLS
+sessions) stays warm across scrapes instead of being rebuilt for every job.
+All methods must run in the reactor thread (crochet) unless noted.
+"""
+from collections import deque
+
+from scrapy import signals
+from scrapy.crawler import CrawlerRunner
+from scrapy.utils.project import get_project_settings
+from twisted.internet import defer
+
+from pipelines import SupabasePipeline
+from spiders.product_spider import JobCancelled, ProductSpider
+
+# Different sites share one crawler now, so global concurrency has to allow
+# several jobs side by side - politeness stays per domain (settings.py, domain_throttle.py)
+SERVICE_CONCURRENT_REQUESTS = 16
+
+_settings = None
+
+
+def get_scrapy_settings():
+    """
+    Get Scrapy settings with stealth configuration
+    Loads from settings.py file (stealth mode enabled) - read once per process
+    """
+    global _settings
+    if _settings is not None:
+        return _settings
+
+    # Load project settings (includes stealth config from settings.py)
+    settings = get_project_settings()
+
+    # Force override critical settings just in case
+    settings.set('ROBOTSTXT_OBEY', False)
+
+    # 👇 CHANGE LOG LEVEL TO INFO (So we can see the logs!) 👇
+    settings.set('LOG_LEVEL', 'INFO')
+
+    # REMOVED: Windows-specific reactor setting - Railway (Linux) will auto-detect EPoll reactor
+    # Don't force SelectReactor on Linux - let the system choose the best reactor
+    # settings.set('TWISTED_REACTOR', 'twisted.internet.selectreactor.SelectReactor')
+
+    # 👇 USE THE IMPORTED CLASS DIRECTLY 👇
+    settings.set('ITEM_PIPELINES', {
+        SupabasePipeline: 300,
+    })
+
+    # Ensure user-agent rotation is enabled
+    if 'scrapy_user_agents.middlewares.RandomUserAgentMiddleware' not in settings.get('DOWNLOADER_MIDDLEWARES', {}):
+        settings.set('DOWNLOADER_MIDDLEWARES', {
+            'scrapy.downloadermiddlewares.useragent.UserAgentMiddleware': None,
+            'scrapy_user_agents.middlewares.RandomUserAgentMiddleware': 400,
+        })
+
+    settings.set('CONCURRENT_REQUESTS', max(settings.getint('CONCURRENT_REQUESTS'), SERVICE_CONCURRENT_REQUESTS))
+
+    _settings = settings
+    return settings
+
+
+class CrawlerService:
+    """
+    Keeps one persistent crawl running and feeds it jobs
+    If the crawl ever stops (engine error, shutdown) the next submit starts a new one
+    """
+
+    def __init__(self, settings=None):
+        self.runner = CrawlerRunner(settings or get_scrapy_settings())
+        self.spider = None
+        self._starting = False
+        # Jobs submitted while the spider is still opening
+        self._backlog = deque()
+        # job_id → job dict, until the job's request is done (for cancel())
+        self._jobs = {}
+
+    def _start(self):
+        self._starting = True
+        crawler = self.runner.create_crawler(ProductSpider)
+        crawler.signals.connect(self._on_spider_opened, signal=signals.spider_opened)
+        print("🕷️  Starting persistent crawler...")
+
+        finished = self.runner.crawl(crawler, persistent=True)
+        finished.addBoth(self._on_crawl_finished)
+
+    def _on_spider_opened(self, spider):
+        print("✅ Persistent crawler ready")
+        self.spider = spider
+        self._starting = False
+        while self._backlog:
+            spider.add_job(self._backlog.popleft())
+
+    def _on_crawl_finished(self, result):
+        print(f"⚠️  Persistent crawler stopped: {result!r}")
+        self.spider = None
+        self._starting = False
+        # Anything that never reached the spider fails now instead of hanging
+        while self._backlog:
+            job = self._backlog.popleft()
+            job['on_done'](RuntimeError("Crawler stopped before the job started"))
+        return None
+
+    def submit(self, url, user_id=None, validators=None, fingerprint=None,
+               on_item_scraped=None, on_not_modified=None, job_id=None, priority=None):
+        """
+        Queue one URL on the shared crawl
+        Returns a Deferred that fires when that URL's request is done
+        (results arrive through on_item_scraped / on_not_modified)
+        """
+        done = defer.Deferred()
+
+        def on_done(failure=None):
+            self._jobs.pop(job_id, None)
+            if done.called:
+                return
+            if failure is None:
+                done.callback(None)
+            else:
+                done.errback(failure)
+
+        job = {
+            'url': url,
+            'job_id': job_id,
+            'user_id': user_id,
+            'validators': validators or {},
+            'fingerprint': fingerprint,
+            'priority': priority,
+            'on_item_scraped': on_item_scraped,
+            'on_not_modified': on_not_modified,
+            'on_done': on_done,
+        }
+        if job_id:
+            self._jobs[job_id] = job
+
+        if self.spider is not None:
+            self.spider.add_job(job)
+        else:
+            self._backlog.append(job)
+            if not self._starting:
+                self._start()
+        return done
+
+    def cancel(self, job_id):
+        """
+        Abandon a job whose result is no longer wanted (another engine won)
+        Its Deferred errbacks with JobCancelled right away; the spider drops the
+        request before download or stops the download at the next chunk
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        job['cancelled'] = True
+        if job in self._backlog:
+            self._backlog.remove(job)
+        on_done = job.pop('on_done', None)
+        if on_done:
+            on_done(JobCancelled(job_id))
+
+
+_service = None
+
+
+def get_crawler_service():
+    """Process-wide crawler service (created lazily in the reactor thread)"""
+    global _service
+    if _service is None:
+        _service = CrawlerService()
+    return _service
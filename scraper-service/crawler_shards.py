@@ -0,0 +1,373 @@
+"""
+Domain-affinity sharding across crawler processes
+One reactor thread parses every page, so a single CrawlerService tops out at
+one core. With CRAWLER_SHARDS=N the service runs N crawler processes (each with
+its own reactor and persistent CrawlerService) and routes every URL by a stable
+hash of its registrable domain. A retailer always lands on the same shard, so
+its token bucket, download slot and connection pool stay in one process and
+it is never hit from two places at once - throughput scales with cores.
+The fast tier, Playwright and retry pauses still run in the web process; their
+token bucket calls go to the owning shard too (ShardedThrottle).
+The supervisor pings shards through their reactor, restarts dead or stuck ones
+and fails their in-flight jobs so callers can fall back instead of hanging.
+ShardedCrawlerService.submit() has the same contract as CrawlerService.submit().
+"""
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+import zlib
+
+from block_detection import PageBlocked
+from domain_throttle import DomainThrottle, set_throttle
+from url_utils import registrable_domain
+
+CRAWLER_SHARDS = int(os.environ.get('CRAWLER_SHARDS', 0))
+SHARD_HEALTH_INTERVAL = float(os.environ.get('SHARD_HEALTH_INTERVAL', 10))
+# A shard that hasn't answered a ping for this many intervals is restarted
+MISSED_PINGS_BEFORE_RESTART = 3
+# Longest the web process waits for a shard's token bucket before using a local one
+SHARD_THROTTLE_TIMEOUT = 2
+# Token bucket operations the web process may run in a shard
+THROTTLE_OPERATIONS = ('reserve', 'cancel', 'pause')
+
+
+def shard_for(url, shards):
+    """Stable shard index for a URL's registrable domain (same in every process)"""
+    return zlib.crc32(registrable_domain(url).encode('utf-8')) % shards
+
+
+def shard_main(index, conn):
+    """
+    Entry point of one crawler process
+    Messages in: ('job', job) / ('cancel', job_id) / ('ping', sent_at) /
+    ('throttle', request_id, operation, url, args) / ('stop',)
+    Messages out: ('item', job_id, item) / ('not_modified', job_id) /
+    ('done', job_id, error) / ('pong', sent_at) / ('throttle_reply', request_id, result),
+    error = None | (kind, detail)
+    """
+    import crochet
+    crochet.setup()
+    from crochet import run_in_reactor
+    from twisted.internet import reactor
+    from crawler_service import get_crawler_service
+    from domain_throttle import get_throttle
+
+    send_lock = threading.Lock()
+
+    def send(*message):
+        with send_lock:
+            try:
+                conn.send(message)
+            except (BrokenPipeError, EOFError, OSError):
+                pass  # Supervisor is gone - we exit on the next recv()
+
+    @run_in_reactor
+    def submit(job):
+        job_id = job['job_id']
+
+        def on_done(result):
+            send('done', job_id, None)
+
+        def on_error(failure):
+            if failure.check(PageBlocked):
+                send('done', job_id, ('blocked', failure.value.reason))
+            else:
+                send('done', job_id, ('error', str(failure.value)))
+
+        get_crawler_service().submit(
+            job['url'],
+            user_id=job['user_id'],
+            validators=job['validators'],
+            fingerprint=job['fingerprint'],
+            on_item_scraped=lambda item: send('item', job_id, dict(item)),
+            on_not_modified=lambda: send('not_modified', job_id),
+            job_id=job_id,
+            priority=job['priority'],
+        ).addCallbacks(on_done, on_error)
+
+    @run_in_reactor
+    def cancel(job_id):
+        get_crawler_service().cancel(job_id)
+
+    print(f"🧩 Crawler shard {index} started (pid {os.getpid()})")
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        kind = message[0]
+        if kind == 'job':
+            submit(message[1])
+        elif kind == 'cancel':
+            cancel(message[1])
+        elif kind == 'ping':
+            # Answered by the reactor, so a wedged reactor misses its pings and gets restarted
+            reactor.callFromThread(send, 'pong', message[1])
+        elif kind == 'throttle':
+            _, request_id, operation, url, args = message
+            if operation not in THROTTLE_OPERATIONS:
+                continue
+            result = getattr(get_throttle(), operation)(url, *args)
+            if request_id is not None:
+                send('throttle_reply', request_id, result)
+        elif kind == 'stop':
+            break
+
+
+class CrawlerShard:
+    """Parent-side handle of one crawler process and the jobs in flight on it"""
+
+    def __init__(self, index, context):
+        self.index = index
+        self.context = context
+        self.process = None
+        self.conn = None
+        self.restarts = 0
+        self.last_pong = 0.0
+        self._send_lock = threading.Lock()
+        # job_id → (deferred, url, on_item_scraped, on_not_modified); touched in the reactor thread only
+        self.pending = {}
+        # request_id → [event, result] of throttle calls waiting for the shard's answer
+        self._throttle_replies = {}
+        self._throttle_lock = threading.Lock()
+
+    def start(self):
+        parent_conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(
+            target=shard_main, args=(self.index, child_conn),
+            name=f'crawler-shard-{self.index}', daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.last_pong = time.time()
+        threading.Thread(target=self._read_loop, args=(parent_conn,), daemon=True).start()
+
+    def send(self, *message):
+        with self._send_lock:
+            self.conn.send(message)
+
+    def _read_loop(self, conn):
+        from twisted.internet import reactor
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                return
+            if message[0] == 'pong':
+                self.last_pong = time.time()
+            elif message[0] == 'throttle_reply':
+                with self._throttle_lock:
+                    waiter = self._throttle_replies.get(message[1])
+                if waiter is not None:
+                    waiter[1] = message[2]
+                    waiter[0].set()
+            else:
+                reactor.callFromThread(self._dispatch, message)
+
+    def _dispatch(self, message):
+        """Deliver a shard message to the job's callbacks (reactor thread)"""
+        kind, job_id = message[0], message[1]
+        entry = self.pending.get(job_id)
+        if entry is None:
+            return
+        deferred, url, on_item_scraped, on_not_modified = entry
+        if kind == 'item':
+            if on_item_scraped:
+                on_item_scraped(message[2])
+        elif kind == 'not_modified':
+            if on_not_modified:
+                on_not_modified()
+        elif kind == 'done':
+            del self.pending[job_id]
+            error = message[2]
+            if error is None:
+                deferred.callback(None)
+            elif error[0] == 'blocked':
+                deferred.errback(PageBlocked(error[1], url))
+            else:
+                deferred.errback(RuntimeError(error[1]))
+
+    def throttle(self, operation, url, *args, reply=False):
+        """
+        Run a token bucket operation in this shard's DomainThrottle; with reply,
+        waits for its result and returns None if the shard didn't answer in time
+        """
+        request_id = str(uuid.uuid4()) if reply else None
+        waiter = [threading.Event(), None]
+        if reply:
+            with self._throttle_lock:
+                self._throttle_replies[request_id] = waiter
+        try:
+            self.send('throttle', request_id, operation, url, args)
+            if reply and waiter[0].wait(SHARD_THROTTLE_TIMEOUT):
+                return waiter[1]
+        except (BrokenPipeError, OSError):
+            pass
+        finally:
+            if reply:
+                with self._throttle_lock:
+                    self._throttle_replies.pop(request_id, None)
+        return None
+
+    def fail_pending(self, reason):
+        """Error out every job in flight on this shard (reactor thread)"""
+        pending, self.pending = self.pending, {}
+        for deferred, _, _, _ in pending.values():
+            if not deferred.called:
+                deferred.errback(RuntimeError(reason))
+
+    def is_healthy(self):
+        if self.process is None or not self.process.is_alive():
+            return False
+        return time.time() - self.last_pong < SHARD_HEALTH_INTERVAL * MISSED_PINGS_BEFORE_RESTART
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.send('stop')
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=5)
+        self.conn.close()
+
+
+class ShardedThrottle(DomainThrottle):
+    """
+    The web process's DomainThrottle when crawling is sharded: token buckets
+    live in the shard that owns the domain, so the fast tier, Playwright and
+    retry pauses here draw from the same bucket as that shard's Scrapy. The
+    fast tier's concurrency slots stay local - only this process's worker
+    threads take them. A shard that doesn't answer falls back to a local bucket.
+    """
+
+    def __init__(self, service):
+        super().__init__()
+        self.service = service
+
+    def reserve(self, url):
+        wait = self.service.shard_of(url).throttle('reserve', url, reply=True)
+        return super().reserve(url) if wait is None else wait
+
+    def cancel(self, url):
+        self.service.shard_of(url).throttle('cancel', url)
+
+    def pause(self, url, seconds):
+        self.service.shard_of(url).throttle('pause', url, seconds)
+
+
+class ShardedCrawlerService:
+    """
+    Drop-in for CrawlerService that spreads jobs over crawler processes by domain
+    submit() must run in the reactor thread (crochet), like CrawlerService.submit()
+    """
+
+    def __init__(self, shards):
+        # spawn: a forked child would inherit the parent's running reactor/crochet threads
+        context = multiprocessing.get_context('spawn')
+        self.shards = [CrawlerShard(index, context) for index in range(shards)]
+        for shard in self.shards:
+            shard.start()
+        threading.Thread(target=self._health_loop, daemon=True).start()
+        set_throttle(ShardedThrottle(self))
+        print(f"✅ {shards} crawler shards started (domain-affinity routing)")
+
+    def shard_of(self, url):
+        return self.shards[shard_for(url, len(self.shards))]
+
+    def submit(self, url, user_id=None, validators=None, fingerprint=None,
+               on_item_scraped=None, on_not_modified=None, job_id=None, priority=None):
+        from twisted.internet import defer
+        shard = self.shard_of(url)
+        job_id = job_id or str(uuid.uuid4())
+        done = defer.Deferred()
+        shard.pending[job_id] = (done, url, on_item_scraped, on_not_modified)
+        try:
+            shard.send('job', {
+                'url': url,
+                'job_id': job_id,
+                'user_id': user_id,
+                'validators': validators or {},
+                'fingerprint': fingerprint,
+                'priority': priority,
+            })
+        except (BrokenPipeError, OSError) as e:
+            del shard.pending[job_id]
+            done.errback(RuntimeError(f"Crawler shard {shard.index} unavailable: {e}"))
+        return done
+
+    def cancel(self, job_id):
+        """Abandon a job on whichever shard runs it; its Deferred errbacks with JobCancelled now"""
+        from spiders.product_spider import JobCancelled
+        for shard in self.shards:
+            entry = shard.pending.pop(job_id, None)
+            if entry is None:
+                continue
+            try:
+                shard.send('cancel', job_id)
+            except (BrokenPipeError, OSError):
+                pass
+            entry[0].errback(JobCancelled(job_id))
+            return
+
+    def _health_loop(self):
+        from twisted.internet import reactor
+        from twisted.internet.threads import blockingCallFromThread
+        while True:
+            time.sleep(SHARD_HEALTH_INTERVAL)
+            for shard in self.shards:
+                if shard.is_healthy():
+                    try:
+                        shard.send('ping', time.time())
+                    except (BrokenPipeError, OSError):
+                        pass
+                    continue
+                print(f"♻️  Crawler shard {shard.index} is unresponsive, restarting...")
+                # Close the pipe first so new submits fail fast, then fail what was in flight
+                shard.stop()
+                blockingCallFromThread(reactor, shard.fail_pending, f"Crawler shard {shard.index} restarted")
+                shard.restarts += 1
+                shard.start()
+
+    def status(self):
+        """Per-shard health for /health"""
+        return [
+            {
+                'shard': shard.index,
+                'pid': shard.process.pid if shard.process else None,
+                'alive': shard.is_healthy(),
+                'restarts': shard.restarts,
+                'in_flight': len(shard.pending),
+            }
+            for shard in self.shards
+        ]
+
+
+_sharded = None
+_sharded_lock = threading.Lock()
+
+
+def get_crawler():
+    """
+    The crawl backend for this process: N domain-sharded crawler processes when
+    CRAWLER_SHARDS > 0, otherwise the in-process CrawlerService
+    """
+    global _sharded
+    if CRAWLER_SHARDS <= 0:
+        from crawler_service import get_crawler_service
+        return get_crawler_service()
+    with _sharded_lock:
+        if _sharded is None:
+            _sharded = ShardedCrawlerService(CRAWLER_SHARDS)
+    return _sharded
+
+
+def shard_status():
+    """Shard health list, or None when sharding is off / not started yet"""
+    return _sharded.status() if _sharded is not None else None
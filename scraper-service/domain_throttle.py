@@ -0,0 +1,182 @@
+"""
+Per-domain politeness: token buckets + concurrency slots
+Each registrable domain gets its own request rate (token bucket, with a small
+burst) and concurrency cap, configurable per retailer, so being gentle with
+Amazon no longer slows down a hundred unrelated small shops. Global concurrency
+can then be high: throughput scales with the number of distinct domains.
+One process-wide DomainThrottle is shared by the fast tier (blocking waits on
+worker threads) and Scrapy (DomainThrottleMiddleware waits without blocking the
+reactor; Scrapy's own download slots enforce the concurrency caps). With
+crawler shards the web process's throttle forwards its token bucket calls to the
+shard that owns the domain (crawler_shards.ShardedThrottle), so there is still
+one bucket per domain.
+The buckets are per web process: every gunicorn worker has its own, so run one
+worker (WEB_CONCURRENCY=1, the default) and scale crawling with CRAWLER_SHARDS.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from extraction_rules import RULES
+from url_utils import registrable_domain
+
+# rate = requests/second, burst = requests allowed back to back, concurrency = requests in flight
+DEFAULT_LIMITS = {'rate': 0.5, 'burst': 2, 'concurrency': 2}
+
+# Per retailer (keys of extraction_rules.RULES) - applied to all of its storefront domains
+RETAILER_LIMITS = {
+    'amazon': {'rate': 0.25, 'burst': 1, 'concurrency': 1},
+    'etsy': {'rate': 0.2, 'burst': 1, 'concurrency': 1},
+    'walmart': {'rate': 0.33, 'burst': 1, 'concurrency': 1},
+    'target': {'rate': 0.5, 'burst': 2, 'concurrency': 2},
+    'bestbuy': {'rate': 0.33, 'burst': 1, 'concurrency': 1},
+}
+
+# Longest a fast-tier caller will wait for a token before giving up on the fast path
+FAST_TIER_MAX_WAIT = float(os.environ.get('FAST_TIER_MAX_WAIT', 5))
+
+
+def _load_limits():
+    """Registrable domain → limits; DOMAIN_LIMITS (JSON) overrides by retailer key or domain"""
+    limits = {}
+    overrides = json.loads(os.environ.get('DOMAIN_LIMITS') or '{}')
+    for key, rule in RULES.items():
+        retailer = dict(DEFAULT_LIMITS, **RETAILER_LIMITS.get(key, {}), **overrides.get(key, {}))
+        for domain in rule.domains:
+            limits[domain] = retailer
+    for key, value in overrides.items():
+        if key not in RULES:
+            limits[key] = dict(DEFAULT_LIMITS, **value)
+    return limits
+
+
+DOMAIN_LIMITS = _load_limits()
+
+
+def limits_for(domain):
+    return DOMAIN_LIMITS.get(domain, DEFAULT_LIMITS)
+
+
+def download_slots():
+    """Scrapy DOWNLOAD_SLOTS for the configured domains (pacing itself is the token bucket's job)"""
+    return {
+        domain: {'concurrency': int(limits['concurrency']), 'delay': 0, 'randomize_delay': False}
+        for domain, limits in DOMAIN_LIMITS.items()
+    }
+
+
+class TokenBucket:
+    """
+    Classic token bucket; reserve() never blocks - it books the next token and
+    returns how long the caller has to wait for it (0 if one is available)
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self):
+        self._refill(time.monotonic())
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def take(self, count=1):
+        """Take count tokens only if they are all available now; else seconds until they would be"""
+        self._refill(time.monotonic())
+        if self.tokens >= count:
+            self.tokens -= count
+            return 0.0
+        return (count - self.tokens) / self.rate
+
+    def cancel(self, count=1):
+        """Give back reserved tokens the caller decided not to use"""
+        self.tokens = min(self.capacity, self.tokens + count)
+
+    def is_full(self):
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+    def pause(self, seconds):
+        """Push the next free token at least `seconds` out (a domain cooling down after failures)"""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class DomainThrottle:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._slots = {}
+
+    def _bucket(self, domain):
+        bucket = self._buckets.get(domain)
+        if bucket is None:
+            limits = limits_for(domain)
+            bucket = self._buckets[domain] = TokenBucket(limits['rate'], limits['burst'])
+        return bucket
+
+    def reserve(self, url):
+        """Book the next request slot for this URL's domain; returns seconds to wait"""
+        with self._lock:
+            return self._bucket(registrable_domain(url)).reserve()
+
+    def cancel(self, url):
+        with self._lock:
+            self._bucket(registrable_domain(url)).cancel()
+
+    def pause(self, url, seconds):
+        """Hold back every engine's next request to this URL's domain for `seconds` (see retry_policy.py)"""
+        with self._lock:
+            self._bucket(registrable_domain(url)).pause(seconds)
+
+    def _semaphore(self, domain):
+        with self._lock:
+            semaphore = self._slots.get(domain)
+            if semaphore is None:
+                semaphore = self._slots[domain] = threading.BoundedSemaphore(int(limits_for(domain)['concurrency']))
+            return semaphore
+
+    @contextmanager
+    def slot(self, url, max_wait=FAST_TIER_MAX_WAIT):
+        """
+        Blocking variant for worker threads (fast tier): wait for a concurrency
+        slot and a token, then run the body. Yields False instead of waiting
+        longer than max_wait - the caller should hand the URL to the crawler
+        """
+        deadline = time.monotonic() + max_wait
+        semaphore = self._semaphore(registrable_domain(url))
+        if not semaphore.acquire(timeout=max_wait):
+            yield False
+            return
+        try:
+            wait = self.reserve(url)
+            if time.monotonic() + wait > deadline:
+                self.cancel(url)
+                yield False
+                return
+            if wait:
+                time.sleep(wait)
+            yield True
+        finally:
+            semaphore.release()
+
+
+_throttle = DomainThrottle()
+
+
+def get_throttle():
+    return _throttle
+
+
+def set_throttle(throttle):
+    """Swap in another DomainThrottle for this process (crawler shards route buckets to their owner)"""
+    global _throttle
+    _throttle = throttle
@@ -0,0 +1,159 @@
+"""
+Embedded state extraction for server-rendered storefronts
+Walmart, Target and Best Buy ship the product record inside script blobs
+(__NEXT_DATA__, window.__PRELOADED_STATE__, __TGT_DATA__ ...). The static HTML
+often has no usable price markup, so reading these blobs keeps major-retailer
+scrapes on the Scrapy path instead of launching a browser.
+Blobs are located and decoded once per response; retailer rules map product
+fields with paths like '__NEXT_DATA__:props.pageProps.initialData.data.product.name'
+('*' matches every list item / dict value at that level).
+"""
+import json
+import re
+
+from json_ld import decode
+
+# Blob names we know how to locate - add new ones here, paths live in extraction_rules.py
+STATE_MARKERS = (
+    '__NEXT_DATA__',
+    '__PRELOADED_STATE__',
+    '__INITIAL_STATE__',
+    '__APOLLO_STATE__',
+    '__TGT_DATA__',
+)
+
+# Only inline scripts can hold state, and only ones mentioning a marker are decoded
+SCRIPT_XPATH = '//script[not(@src)]'
+
+# How far past the marker we look for the start of the value
+LOOKAHEAD_CHARS = 400
+JSON_PARSE_RE = re.compile(r'JSON\.parse\(\s*(["\'])')
+
+# Guard against walking enormous states with '*'
+MAX_WILDCARD_MATCHES = 50
+
+MEMO_ATTR = '_wist_embedded_state'
+
+_decoder = json.JSONDecoder(strict=False)
+
+
+def _decode_value(text, marker_end):
+    """Decode the JSON value assigned after a marker (object literal or JSON.parse("..."))"""
+    window = text[marker_end:marker_end + LOOKAHEAD_CHARS]
+
+    # Object.defineProperty(window, '__TGT_DATA__', {..., value: JSON.parse("...")})
+    parse_call = JSON_PARSE_RE.search(window)
+    if parse_call:
+        quote_at = marker_end + parse_call.end() - 1
+        if parse_call.group(1) == "'":
+            # JS single-quoted strings aren't JSON - swap the quotes for the decoder
+            end = text.find("')", quote_at + 1)
+            if end == -1:
+                return None
+            literal = '"' + text[quote_at + 1:end].replace('\\\'', '\'').replace('"', '\\"') + '"'
+        else:
+            literal = text[quote_at:]
+        try:
+            inner, _ = _decoder.raw_decode(literal)
+            return decode(inner)
+        except ValueError:
+            return None
+
+    brace = window.find('{')
+    if brace == -1:
+        return None
+    try:
+        value, _ = _decoder.raw_decode(text, marker_end + brace)
+        return value
+    except ValueError:
+        return None
+
+
+def locate_blobs(scripts):
+    """
+    Find and decode every known state blob in a page's inline scripts
+    `scripts` yields (id attribute, text): <script id="__NEXT_DATA__"> holds
+    plain JSON, the others are assignments like window.__PRELOADED_STATE__ = {...}
+    """
+    blobs = {}
+    for script_id, text in scripts:
+        if not text:
+            continue
+        if script_id in STATE_MARKERS:
+            value = decode(text)
+            if isinstance(value, (dict, list)):
+                blobs.setdefault(script_id, value)
+            continue
+        if '__' not in text:
+            continue
+        for marker in STATE_MARKERS:
+            if marker in blobs:
+                continue
+            index = text.find(marker)
+            if index == -1:
+                continue
+            value = _decode_value(text, index + len(marker))
+            if isinstance(value, (dict, list)):
+                blobs[marker] = value
+    return blobs
+
+
+def lookup(data, path):
+    """Yield every value at a dotted path; '*' fans out over list items / dict values"""
+    if not path:
+        yield data
+        return
+    key, _, rest = path.partition('.')
+    if key == '*':
+        if isinstance(data, dict):
+            children = data.values()
+        elif isinstance(data, list):
+            children = data
+        else:
+            return
+        for count, child in enumerate(children):
+            if count >= MAX_WILDCARD_MATCHES:
+                return
+            yield from lookup(child, rest)
+    elif isinstance(data, dict) and key in data:
+        yield from lookup(data[key], rest)
+    elif isinstance(data, list) and key.isdigit() and int(key) < len(data):
+        yield from lookup(data[int(key)], rest)
+
+
+class EmbeddedState:
+    """Decoded state blobs of one page, keyed by marker name"""
+
+    def __init__(self, blobs):
+        self.blobs = blobs
+
+    def __bool__(self):
+        return bool(self.blobs)
+
+    def values(self, spec):
+        """Scalar values for one 'MARKER:dotted.path' spec"""
+        marker, _, path = spec.partition(':')
+        blob = self.blobs.get(marker)
+        if blob is None:
+            return
+        for value in lookup(blob, path):
+            if isinstance(value, (str, int, float)) and not isinstance(value, bool) and value != '':
+                yield value
+
+
+def for_response(response):
+    """Embedded state for a Scrapy/Parsel response, located and decoded at most once"""
+    state = getattr(response, MEMO_ATTR, None)
+    if state is None:
+        scripts = (
+            (script.get('id'), ''.join(script.itertext()))
+            for script in response.selector.root.xpath(SCRIPT_XPATH)
+        )
+        state = EmbeddedState(locate_blobs(scripts))
+        if state:
+            print(f"🧊 Embedded state found: {', '.join(state.blobs)}")
+        try:
+            setattr(response, MEMO_ATTR, state)
+        except AttributeError:
+            pass
+    return state
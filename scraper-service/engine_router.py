@@ -0,0 +1,169 @@
+"""
+Adaptive per-domain engine routing
+Records, per registrable domain and engine (fast tier, Scrapy, Playwright), an
+exponentially decayed success rate and latency. Each new scrape tries the
+cheapest engines that are likely to succeed and skips the ones that keep
+failing there (Etsy never works over plain HTTP), with a little random
+exploration so a domain that starts working again is noticed.
+Thread-safe; state is per process.
+"""
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from url_utils import registrable_domain
+
+ENGINE_FAST = 'fast'
+ENGINE_SCRAPY = 'scrapy'
+ENGINE_PLAYWRIGHT = 'playwright'
+
+# Cheapest first; Playwright is always the last resort and never skipped
+ENGINES = (ENGINE_FAST, ENGINE_SCRAPY, ENGINE_PLAYWRIGHT)
+
+# Typical seconds per attempt before we've measured a domain
+DEFAULT_LATENCY = {ENGINE_FAST: 1.0, ENGINE_SCRAPY: 6.0, ENGINE_PLAYWRIGHT: 25.0}
+
+ROUTER_HALF_LIFE_HOURS = float(os.environ.get('ROUTER_HALF_LIFE_HOURS', 24))
+ROUTER_EXPLORE_RATE = float(os.environ.get('ROUTER_EXPLORE_RATE', 0.05))
+# Skip an engine once its decayed success rate drops below this with enough evidence
+SKIP_BELOW_SUCCESS_RATE = 0.2
+MIN_EVIDENCE = 3.0
+
+# Known-hostile domains start with a few pseudo-failures (they decay like real ones)
+DOMAIN_PRIORS = {
+    'etsy.com': {ENGINE_FAST: 0.0, ENGINE_SCRAPY: 0.0},
+}
+PRIOR_WEIGHT = 5.0
+
+# Latencies of recent successful attempts kept per (domain, engine) for quantiles (hedging)
+LATENCY_SAMPLES = 50
+MIN_LATENCY_SAMPLES = 5
+
+_DECAY_PER_SECOND = math.log(2) / (ROUTER_HALF_LIFE_HOURS * 3600)
+
+
+class EngineStats:
+    """Decayed attempt/success counts and latency EWMA for one (domain, engine)"""
+
+    def __init__(self, engine, attempts=0.0, successes=0.0):
+        self.attempts = attempts
+        self.successes = successes
+        self.latency = DEFAULT_LATENCY[engine]
+        self.samples = deque(maxlen=LATENCY_SAMPLES)
+        self.updated_at = time.time()
+
+    def _decay(self, now):
+        factor = math.exp(-_DECAY_PER_SECOND * max(0.0, now - self.updated_at))
+        self.attempts *= factor
+        self.successes *= factor
+        self.updated_at = now
+
+    def record(self, success, latency, now):
+        self._decay(now)
+        self.attempts += 1
+        if success:
+            self.successes += 1
+        if latency is not None:
+            self.latency = 0.7 * self.latency + 0.3 * latency
+            if success:
+                self.samples.append(latency)
+
+    def success_rate(self, now):
+        self._decay(now)
+        # Laplace smoothing: unknown engines look like 50/50, not 0 or 1
+        return (self.successes + 1) / (self.attempts + 2)
+
+    def evidence(self):
+        return self.attempts
+
+    def latency_quantile(self, q):
+        """q-quantile of recent successful latencies; None until there are enough"""
+        if len(self.samples) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class EngineRouter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _get(self, domain, engine):
+        key = (domain, engine)
+        stats = self._stats.get(key)
+        if stats is None:
+            prior = DOMAIN_PRIORS.get(domain, {}).get(engine)
+            if prior is None:
+                stats = EngineStats(engine)
+            else:
+                stats = EngineStats(engine, attempts=PRIOR_WEIGHT, successes=PRIOR_WEIGHT * prior)
+            self._stats[key] = stats
+        return stats
+
+    def plan(self, url):
+        """
+        Engines to try for this URL, in order
+        Cheapest expected cost (latency / success rate) first; engines that keep
+        failing on this domain are dropped unless we're exploring this time
+        """
+        domain = registrable_domain(url)
+        now = time.time()
+        explore = random.random() < ROUTER_EXPLORE_RATE
+
+        scored = []
+        with self._lock:
+            for engine in ENGINES:
+                stats = self._get(domain, engine)
+                rate = stats.success_rate(now)
+                doomed = stats.evidence() >= MIN_EVIDENCE and rate < SKIP_BELOW_SUCCESS_RATE
+                if engine != ENGINE_PLAYWRIGHT and doomed and not explore:
+                    continue
+                scored.append((stats.latency / max(rate, 0.05), engine))
+
+        # Playwright stays last - it's the fallback for everything else
+        plan = [engine for _, engine in sorted(scored) if engine != ENGINE_PLAYWRIGHT]
+        plan.append(ENGINE_PLAYWRIGHT)
+        if len(plan) < len(ENGINES):
+            skipped = [engine for engine in ENGINES if engine not in plan]
+            print(f"🧭 Router: skipping {', '.join(skipped)} for {domain}")
+        return plan
+
+    def record(self, url, engine, success, latency=None):
+        """Record one attempt's outcome (latency in seconds)"""
+        domain = registrable_domain(url)
+        with self._lock:
+            self._get(domain, engine).record(success, latency, time.time())
+
+    def latency_quantile(self, url, engine, q=0.9):
+        """
+        q-quantile of how long a successful attempt of this engine takes on the
+        URL's domain; twice the engine's typical latency until it has been measured
+        """
+        domain = registrable_domain(url)
+        with self._lock:
+            value = self._get(domain, engine).latency_quantile(q)
+        return value if value is not None else 2 * DEFAULT_LATENCY[engine]
+
+    def snapshot(self):
+        """{domain: {engine: {success_rate, attempts, latency}}} for debugging endpoints"""
+        now = time.time()
+        result = {}
+        with self._lock:
+            for (domain, engine), stats in self._stats.items():
+                result.setdefault(domain, {})[engine] = {
+                    'success_rate': round(stats.success_rate(now), 3),
+                    'attempts': round(stats.attempts, 2),
+                    'latency': round(stats.latency, 2),
+                }
+        return result
+
+
+_router = EngineRouter()
+
+
+def get_router():
+    return _router
@@ -0,0 +1,568 @@
+"""
+Declarative extraction rules shared by the Scrapy spider, the fast tier and Playwright
+Each retailer is one RetailerRule: an ordered list of selectors per field.
+Rules are compiled once at import - CSS → lxml XPath (via Parsel's translator)
+for static HTML, and one JS payload so Playwright reads every field in a single
+page.evaluate() round trip. Both engines then share the same validation.
+Selector syntax is Scrapy's: plain CSS reads the element text, '::attr(name)' an attribute.
+"""
+import json
+import re
+from urllib.parse import urljoin
+
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+
+import embedded_state
+from json_ld import JsonLdDocument, for_response
+from url_utils import registrable_domain
+
+FIELDS = ('title', 'price', 'image', 'description')
+
+# Matches read per selector before moving on to the next one
+MAX_MATCHES = 5
+MIN_TITLE_LENGTH = 3
+MAX_TITLE_LENGTH = 300
+MAX_DESCRIPTION_LENGTH = 500
+
+PRICE_RE = re.compile(r'([\d,]+\.?\d*)')
+WHITESPACE_RE = re.compile(r'\s+')
+TAG_RE = re.compile(r'<[^>]+>')
+
+RETAILER_RULES = [
+    {
+        'key': 'amazon',
+        'name': 'Amazon',
+        'icon': '🛒',
+        'domains': [
+            'amazon.com', 'amazon.ca', 'amazon.co.uk', 'amazon.de', 'amazon.fr', 'amazon.it',
+            'amazon.es', 'amazon.nl', 'amazon.co.jp', 'amazon.in', 'amazon.com.au',
+            'amazon.com.mx', 'amazon.com.br', 'amazon.se', 'amazon.pl', 'amazon.com.be',
+            'amazon.com.tr', 'amazon.sg', 'amazon.ae', 'amazon.sa', 'amazon.eg',
+        ],
+        'wait_for': '#productTitle, #title, .product-title-word-break',
+        'fields': {
+            'title': [
+                '#productTitle',
+                '#title span',
+                'h1.product-title-word-break',
+            ],
+            # IMPORTANT: Order matters - actual "price to pay" first, never "was" prices
+            'price': [
+                '.priceToPay span.a-offscreen',
+                '#corePrice_desktop .priceToPay span.a-offscreen',
+                '#priceblock_dealprice',
+                '#priceblock_saleprice',
+                '#priceblock_ourprice',
+                '#corePriceDisplay_desktop_feature_div .priceToPay span.a-offscreen',
+                '#corePriceDisplay_desktop_feature_div .a-price:not(.a-text-price) span.a-offscreen',
+                '#corePrice_feature_div .a-price span.a-offscreen',
+                '#apex_desktop .priceToPay span.a-offscreen',
+                '#kindle-price',
+                '#price_inside_buybox',
+                # Fallback - first non-struck price (less accurate)
+                '.a-price:not(.a-text-price) span.a-offscreen',
+            ],
+            'image': [
+                '#landingImage::attr(src)',
+                '#landingImage::attr(data-old-hires)',
+                '#landingImage::attr(data-a-dynamic-image)',
+                '#imgBlkFront::attr(src)',
+                '#ebooksImgBlkFront::attr(src)',
+                '#main-image::attr(src)',
+                '.a-dynamic-image::attr(src)',
+                '#imageBlock img::attr(src)',
+            ],
+            'description': [
+                '#productDescription p',
+                '#feature-bullets',
+            ],
+        },
+    },
+    {
+        'key': 'etsy',
+        'name': 'Etsy',
+        'icon': '🎨',
+        'domains': ['etsy.com'],
+        # JSON-LD is the most reliable source on Etsy
+        'json_ld_first': True,
+        'fields': {
+            'title': [
+                'h1[data-buy-box-listing-title]',
+                'h1.listing-page-title',
+                'h1.wt-text-body-01',
+                'h1[data-listing-page-title]',
+                '[data-testid="listing-title"]',
+                'h1',
+            ],
+            'price': [
+                'p.wt-text-title-03 .currency-value',
+                '[data-buy-box-region="price"] .currency-value',
+                '.wt-text-title-larger',
+                '[data-testid="listing-price"]',
+                '.wt-text-title-01',
+                '[data-selector="price"]',
+            ],
+            'image': [
+                'meta[property="og:image"]::attr(content)',
+                'img[src*="etsystatic.com"][src*="/il/"]::attr(src)',
+            ],
+            'description': [
+                'meta[property="og:description"]::attr(content)',
+            ],
+        },
+    },
+    {
+        'key': 'bestbuy',
+        'name': 'Best Buy',
+        'icon': '🛍️',
+        'domains': ['bestbuy.com', 'bestbuy.ca'],
+        'state': {
+            'title': [
+                '__PRELOADED_STATE__:product.name',
+                '__NEXT_DATA__:props.pageProps.product.name',
+                '__APOLLO_STATE__:*.name',
+            ],
+            'price': [
+                '__PRELOADED_STATE__:price.customerPrice',
+                '__PRELOADED_STATE__:product.price.customerPrice',
+                '__NEXT_DATA__:props.pageProps.product.price.customerPrice',
+                '__APOLLO_STATE__:*.customerPrice',
+            ],
+            'image': [
+                '__PRELOADED_STATE__:product.images.0.href',
+                '__NEXT_DATA__:props.pageProps.product.images.0.href',
+            ],
+            'description': [
+                '__PRELOADED_STATE__:product.shortDescription',
+                '__NEXT_DATA__:props.pageProps.product.shortDescription',
+            ],
+        },
+        'fields': {
+            'title': ['h1.heading-5', '[data-testid="product-title"]', 'h1'],
+            'price': ['.priceView-customer-price span', '[data-testid="price"]', '.pricing-price'],
+            'image': [
+                '[data-testid="product-image"] img::attr(src)',
+                '.product-image img::attr(src)',
+                'img.primary-image::attr(src)',
+            ],
+            'description': [],
+        },
+    },
+    {
+        'key': 'target',
+        'name': 'Target',
+        'icon': '🎯',
+        'domains': ['target.com'],
+        'state': {
+            'title': [
+                '__TGT_DATA__:__PRELOADED_QUERIES__.queries.*.*.data.product.item.product_description.title',
+                '__NEXT_DATA__:props.pageProps.product.item.product_description.title',
+            ],
+            'price': [
+                '__TGT_DATA__:__PRELOADED_QUERIES__.queries.*.*.data.product.price.current_retail',
+                '__TGT_DATA__:__PRELOADED_QUERIES__.queries.*.*.data.product.price.formatted_current_price',
+                '__NEXT_DATA__:props.pageProps.product.price.current_retail',
+            ],
+            'image': [
+                '__TGT_DATA__:__PRELOADED_QUERIES__.queries.*.*.data.product.item.enrichment.images.primary_image_url',
+                '__NEXT_DATA__:props.pageProps.product.item.enrichment.images.primary_image_url',
+            ],
+            'description': [
+                '__TGT_DATA__:__PRELOADED_QUERIES__.queries.*.*.data.product.item.product_description.downstream_description',
+            ],
+        },
+        'fields': {
+            'title': ['h1[data-test="product-title"]', 'h1'],
+            'price': ['[data-test="product-price"]', '.pricing-current-price'],
+            'image': [
+                '[data-test="product-image"] img::attr(src)',
+                '.carousel-image img::attr(src)',
+            ],
+            'description': [],
+        },
+    },
+    {
+        'key': 'walmart',
+        'name': 'Walmart',
+        'icon': '🏪',
+        'domains': ['walmart.com', 'walmart.ca'],
+        'state': {
+            'title': ['__NEXT_DATA__:props.pageProps.initialData.data.product.name'],
+            'price': [
+                '__NEXT_DATA__:props.pageProps.initialData.data.product.priceInfo.currentPrice.price',
+                '__NEXT_DATA__:props.pageProps.initialData.data.product.priceInfo.currentPrice.priceString',
+            ],
+            'image': [
+                '__NEXT_DATA__:props.pageProps.initialData.data.product.imageInfo.thumbnailUrl',
+                '__NEXT_DATA__:props.pageProps.initialData.data.product.imageInfo.allImages.0.url',
+            ],
+            'description': [
+                '__NEXT_DATA__:props.pageProps.initialData.data.product.shortDescription',
+                '__NEXT_DATA__:props.pageProps.initialData.data.idml.shortDescription',
+            ],
+        },
+        'fields': {
+            'title': ['h1.prod-ProductTitle', '[data-testid="product-title"]', 'h1'],
+            'price': [
+                '[itemprop="price"]::attr(content)',
+                '[data-testid="price"]',
+                '.price-characteristic',
+            ],
+            'image': [
+                '[data-testid="product-image"] img::attr(src)',
+                '.prod-hero-image img::attr(src)',
+            ],
+            'description': [],
+        },
+    },
+]
+
+# Independent stores: JSON-LD → OpenGraph → CSS heuristics
+GENERIC_RULE = {
+    'key': 'generic',
+    'name': 'generic',
+    'icon': '🌐',
+    'domains': [],
+    'json_ld_first': True,
+    'fields': {
+        'title': [
+            'meta[property="og:title"]::attr(content)',
+            '[itemprop="name"]',
+            'h1',
+            '.product-title',
+            '.product-name',
+            'title',
+        ],
+        'price': [
+            '[itemprop="price"]::attr(content)',
+            'meta[property="product:price:amount"]::attr(content)',
+            'meta[property="og:price:amount"]::attr(content)',
+            '[itemprop="price"]',
+            '.price',
+            '.product-price',
+            '.current-price',
+            '[data-price]::attr(data-price)',
+            '.amount',
+        ],
+        'image': [
+            'meta[property="og:image"]::attr(content)',
+            '[itemprop="image"]::attr(src)',
+            '[itemprop="image"]::attr(content)',
+            '.product-image img::attr(src)',
+            '.gallery img::attr(src)',
+            '#product-image::attr(src)',
+            'img[src*="product"]::attr(src)',
+            'main img::attr(src)',
+            'main img::attr(data-src)',
+        ],
+        'description': [
+            'meta[property="og:description"]::attr(content)',
+            'meta[name="description"]::attr(content)',
+            '[itemprop="description"]',
+        ],
+    },
+}
+
+# Meta tags only - what's left to read on challenge/blocked pages
+BLOCKED_PAGE_RULE = {
+    'key': 'blocked',
+    'name': 'blocked page',
+    'icon': '🚧',
+    'domains': [],
+    'fields': {
+        'title': ['meta[property="og:title"]::attr(content)'],
+        'price': ['meta[property="product:price:amount"]::attr(content)'],
+        'image': ['meta[property="og:image"]::attr(content)'],
+        'description': ['meta[property="og:description"]::attr(content)'],
+    },
+}
+
+# One evaluate() call returns [selector, raw value] candidates per field plus the JSON-LD blocks
+BROWSER_SCRIPT = """
+(spec) => {
+    const out = {fields: {}, jsonLd: []};
+    for (const [field, selectors] of Object.entries(spec.fields)) {
+        const candidates = [];
+        for (const [selector, css, attr] of selectors) {
+            let nodes;
+            try { nodes = document.querySelectorAll(css); } catch (e) { continue; }
+            for (const el of Array.from(nodes).slice(0, spec.maxMatches)) {
+                const value = attr ? el.getAttribute(attr) : el.textContent;
+                if (value && value.trim()) candidates.push([selector, value]);
+            }
+        }
+        out.fields[field] = candidates;
+    }
+    if (spec.jsonLd) {
+        for (const script of document.querySelectorAll('script[type="application/ld+json"]')) {
+            out.jsonLd.push(script.textContent);
+        }
+    }
+    return out;
+}
+"""
+
+_translator = HTMLTranslator()
+
+
+class CompiledSelector:
+    """One selector string compiled for both engines"""
+
+    def __init__(self, selector):
+        self.selector = selector
+        css, _, attr = selector.partition('::attr(')
+        self.css = css.strip()
+        self.attr = attr.rstrip(')') or None
+        self.xpath = etree.XPath(_translator.css_to_xpath(self.css))
+
+    def values(self, root):
+        """Raw non-empty values from an lxml tree, in document order"""
+        found = 0
+        for element in self.xpath(root):
+            if self.attr:
+                value = element.get(self.attr)
+            else:
+                value = ''.join(element.itertext())
+            if value and value.strip():
+                yield value
+                found += 1
+                if found >= MAX_MATCHES:
+                    return
+
+
+class RetailerRule:
+    def __init__(self, key, name, icon, domains, fields, json_ld_first=False, wait_for=None, state=None):
+        self.key = key
+        self.name = name
+        self.icon = icon
+        self.domains = domains
+        self.json_ld_first = json_ld_first
+        self.wait_for = wait_for
+        # Embedded state paths per field (see embedded_state.py) - static HTML only
+        self.state = state or {}
+        self.fields = {
+            field: [CompiledSelector(selector) for selector in fields.get(field, [])]
+            for field in FIELDS
+        }
+        self.browser_spec = {
+            'fields': {
+                field: [[s.selector, s.css, s.attr] for s in selectors]
+                for field, selectors in self.fields.items()
+            },
+            'maxMatches': MAX_MATCHES,
+            'jsonLd': True,
+        }
+
+    def candidates(self, root, field):
+        for compiled in self.fields[field]:
+            for value in compiled.values(root):
+                yield compiled.selector, value
+
+    def state_candidates(self, state, field):
+        for spec in self.state.get(field, ()):
+            for value in state.values(spec):
+                yield spec, value
+
+
+RULES = {spec['key']: RetailerRule(**spec) for spec in RETAILER_RULES}
+GENERIC = RetailerRule(**GENERIC_RULE)
+BLOCKED_PAGE = RetailerRule(**BLOCKED_PAGE_RULE)
+
+# Registrable domain → rule; only listed storefronts match (a brand label alone would
+# also catch unrelated sites such as target.com.au)
+DOMAIN_INDEX = {domain: rule for rule in RULES.values() for domain in rule.domains}
+
+
+def rule_for_url(url):
+    """Pick the retailer rule for a URL - one dict lookup, generic for unlisted domains"""
+    return DOMAIN_INDEX.get(registrable_domain(url), GENERIC)
+
+
+def parse_price(value):
+    """First number in a price string ('$1,299.99' → 1299.99); None unless positive"""
+    match = PRICE_RE.search(str(value))
+    if not match:
+        return None
+    try:
+        price = float(match.group(1).replace(',', ''))
+    except ValueError:
+        return None
+    return price if price > 0 else None
+
+
+def clean_title(value):
+    title = WHITESPACE_RE.sub(' ', value).strip()
+    if MIN_TITLE_LENGTH <= len(title) <= MAX_TITLE_LENGTH:
+        return title
+    return None
+
+
+def clean_image(value, base_url=None):
+    image = value.strip()
+    # Amazon's data-a-dynamic-image is a JSON map of {url: [w, h]}
+    if image.startswith('{'):
+        try:
+            image = next(iter(json.loads(image)), '')
+        except (ValueError, StopIteration):
+            return None
+    if image.startswith('//'):
+        return 'https:' + image
+    if image.startswith('http'):
+        return image
+    if base_url and image and not image.startswith('data:'):
+        return urljoin(base_url, image)
+    return None
+
+
+def clean_description(value):
+    # Embedded state descriptions are often HTML fragments
+    description = WHITESPACE_RE.sub(' ', TAG_RE.sub(' ', value)).strip()
+    return description[:MAX_DESCRIPTION_LENGTH] or None
+
+
+def first_valid(field, candidates, base_url=None):
+    """Return the first candidate that survives the field's validation"""
+    for selector, raw in candidates:
+        raw = str(raw)
+        if field == 'title':
+            value = clean_title(raw)
+        elif field == 'price':
+            value = parse_price(raw)
+            if value:
+                print(f"   💵 Found price via '{selector}': ${value:.2f}")
+        elif field == 'image':
+            value = clean_image(raw, base_url)
+        else:
+            value = clean_description(raw)
+        if value:
+            return value
+    return None
+
+
+def product_from_json_ld(document, url=None):
+    """The page's main Product (or Offer) node from a JsonLdDocument, in our product format"""
+    node = document.product()
+    if node is None:
+        return {}
+    return normalize_json_ld(node, url, document)
+
+
+def normalize_json_ld(data, url=None, document=None):
+    """Normalize a schema.org Product/Offer node to product format"""
+    result = {'url': url}
+
+    title = data.get('name') or data.get('title')
+    result['title'] = clean_title(str(title)) if title else None
+
+    description = data.get('description')
+    result['description'] = clean_description(str(description)) if description else None
+
+    image = data.get('image')
+    if isinstance(image, list):
+        image = image[0] if image else None
+    if isinstance(image, dict):
+        image = image.get('url') or image.get('contentUrl')
+    result['image'] = clean_image(str(image), url) if image else None
+
+    offer = document.offer(data) if document is not None else data.get('offers') or data
+    if isinstance(offer, list):
+        offer = offer[0] if offer else None
+    if isinstance(offer, dict):
+        price = parse_price(offer.get('price') or offer.get('lowPrice') or '')
+        if price:
+            result['price'] = price
+            result['priceRaw'] = f"${price:.2f}"
+    return result
+
+
+def _fill(product, field_candidates, url):
+    for field in FIELDS:
+        if not product.get(field):
+            value = first_valid(field, field_candidates(field), url)
+            if value:
+                product[field] = value
+                if field == 'price':
+                    product['priceRaw'] = f"${value:.2f}"
+
+
+def build_product(rule, candidates, load_json_ld, url, load_state=None):
+    """
+    Apply a rule: selector candidates per field (callable field → iterable of
+    (selector, raw value)) merged with JSON-LD (callable → JsonLdDocument)
+    and, for static HTML, embedded state blobs (callable → EmbeddedState)
+    """
+    product = {}
+    json_ld = None
+
+    if rule.json_ld_first:
+        json_ld = product_from_json_ld(load_json_ld(), url)
+        product = {key: value for key, value in json_ld.items() if value}
+
+    # Server-rendered state beats CSS on storefronts whose markup is mostly client-rendered
+    if rule.state and load_state is not None:
+        state = load_state()
+        if state:
+            _fill(product, lambda field: rule.state_candidates(state, field), url)
+
+    _fill(product, candidates, url)
+
+    # Fill gaps from JSON-LD when the selectors came up short
+    if json_ld is None and (not product.get('title') or not product.get('price')):
+        print("⚠️ Trying JSON-LD fallback...")
+        json_ld = product_from_json_ld(load_json_ld(), url)
+        for key, value in json_ld.items():
+            if value and not product.get(key):
+                product[key] = value
+
+    product['url'] = url
+    return product
+
+
+def product_from_fields(source, fields, url):
+    """Validate already-structured fields (e.g. a platform API payload) like any other candidate"""
+    product = {}
+    _fill(product, lambda field: [(source, fields[field])] if fields.get(field) else [], url)
+    product['url'] = url
+    return product
+
+
+def extract_from_response(response, rule=None):
+    """Run a rule over a Scrapy/Parsel response (static HTML)"""
+    rule = rule or rule_for_url(response.url)
+    root = response.selector.root
+    return build_product(
+        rule,
+        lambda field: rule.candidates(root, field),
+        lambda: for_response(response),
+        response.url,
+        load_state=lambda: embedded_state.for_response(response),
+    )
+
+
+def state_fingerprint_parts(response, rule=None):
+    """Raw embedded-state values a rule reads, so fingerprint.py notices state-only price changes"""
+    rule = rule or rule_for_url(response.url)
+    if not rule.state:
+        return []
+    state = embedded_state.for_response(response)
+    if not state:
+        return []
+    parts = []
+    for field in FIELDS:
+        for _, value in rule.state_candidates(state, field):
+            parts.append(str(value))
+            break
+    return parts
+
+
+def extract_in_browser(page, rule, url):
+    """Run a rule inside a Playwright page with a single evaluate() round trip"""
+    data = page.evaluate(BROWSER_SCRIPT, rule.browser_spec)
+    fields = data.get('fields') or {}
+    return build_product(
+        rule,
+        lambda field: fields.get(field) or [],
+        lambda: JsonLdDocument(data.get('jsonLd') or []),
+        url,
+    )
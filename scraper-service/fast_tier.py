@@ -0,0 +1,229 @@
+"""
+Fast tier: one pooled keep-alive HTTP request + the ProductSpider extractors
+For most stores the data we need (JSON-LD, OG meta) is in the static HTML, so
+this skips the CrawlerRunner/Twisted/AutoThrottle machinery entirely and parses
+the body with lxml (via parsel) using the exact same extraction rules.
+The caller escalates to Scrapy/Playwright when required fields are missing.
+"""
+import os
+import random
+import threading
+from urllib.parse import urlparse
+
+import httpx
+from scrapy.http import HtmlResponse, Request
+
+from block_detection import classify
+from domain_throttle import get_throttle
+from extraction_rules import product_from_fields
+from fingerprint import compute_fingerprint
+from html_archive import get_archive
+from platforms import fetch_platform_product, forget_platform, known_platform
+from retry_policy import (
+    FAILURE_BLOCKED,
+    FAILURE_RATE_LIMITED,
+    classify_exception,
+    classify_status,
+    get_retry_policy,
+    parse_retry_after,
+)
+from settings import DEFAULT_REQUEST_HEADERS
+from spiders.product_spider import ProductSpider
+from streaming import StreamScanner, STREAM_EARLY_EXIT
+
+FAST_TIER_ENABLED = os.environ.get('FAST_TIER_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+FAST_TIER_TIMEOUT = float(os.environ.get('FAST_TIER_TIMEOUT', 8))
+
+# Without these the result isn't good enough - escalate to the heavier engines
+REQUIRED_FIELDS = ('title', 'price')
+
+# fetch_product() outcomes
+FAST_OK = 'ok'
+FAST_NOT_MODIFIED = 'not_modified'
+FAST_ESCALATE = 'escalate'
+# Block/captcha page - plain HTTP (and Scrapy) will get the same one, go to a browser
+FAST_BLOCKED = 'blocked'
+# Domain is at its rate/concurrency limit - nothing was fetched, let the crawler queue it
+FAST_THROTTLED = 'throttled'
+
+# Chrome UAs only - DEFAULT_REQUEST_HEADERS are Chrome's Sec-Fetch headers
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+]
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Process-wide pooled client: keep-alive connections, DNS and TLS sessions
+    are reused across scrapes instead of being rebuilt per request
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(
+                headers={k: v for k, v in DEFAULT_REQUEST_HEADERS.items() if k != 'Accept-Encoding'},
+                follow_redirects=True,
+                timeout=httpx.Timeout(FAST_TIER_TIMEOUT, connect=4.0),
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60),
+            )
+    return _client
+
+
+def read_body(http_response):
+    """
+    Read a streamed response, stopping early once title + price have gone past
+    (leaving the `with` block then closes the connection mid-body)
+    Returns (body, truncated)
+    """
+    if not STREAM_EARLY_EXIT:
+        return http_response.read(), False
+
+    # iter_bytes() yields already-decoded bytes, so no content encoding to undo here
+    scanner = StreamScanner()
+    chunks = []
+    for chunk in http_response.iter_bytes():
+        chunks.append(chunk)
+        if scanner.feed(chunk):
+            print(f"⚡ Fast tier: stopped download after {scanner.bytes_seen // 1024} KB ({scanner.stop_reason})")
+            return b''.join(chunks), True
+    return b''.join(chunks), False
+
+
+def platform_item(url, user_id, platform, fields):
+    """Item in ProductSpider's shape from a Shopify/WooCommerce API payload"""
+    product = product_from_fields(platform, fields, url)
+    return {
+        'title': product.get('title', ''),
+        'price': product.get('price'),
+        'priceRaw': product.get('priceRaw'),
+        'image': product.get('image') or '',
+        'description': product.get('description') or '',
+        'url': url,
+        'user_id': user_id,
+        'domain': urlparse(url).netloc.lower().replace('www.', ''),
+        'validators': {},
+        'fingerprint': None,
+    }
+
+
+def fetch_product(url, user_id=None, validators=None, fingerprint=None):
+    """
+    Fetch and extract a product page in one plain HTTP request
+    Returns (outcome, item): FAST_OK with the item, FAST_NOT_MODIFIED when the
+    cached copy is still current, or FAST_ESCALATE (item None) when a heavier
+    engine is needed, FAST_BLOCKED when the site served a block page, or
+    FAST_THROTTLED when the domain's limits left no room for a request
+    Shares the per-domain rate/concurrency limits with Scrapy (domain_throttle.py)
+    """
+    with get_throttle().slot(url) as allowed:
+        if not allowed:
+            print("⚡ Fast tier: domain is at its rate limit, handing over to the crawler...")
+            return FAST_THROTTLED, None
+        return _fetch_product(url, user_id, validators, fingerprint)
+
+
+def _fetch_product(url, user_id, validators, fingerprint):
+    # Known Shopify/WooCommerce shop: one small JSON request instead of the page
+    platform = known_platform(url)
+    if platform:
+        fields = fetch_platform_product(get_client(), url, platform)
+        if fields:
+            return FAST_OK, platform_item(url, user_id, platform, fields)
+        forget_platform(url)
+
+    policy = get_retry_policy()
+    policy.request_started()
+    headers = {'User-Agent': random.choice(USER_AGENTS)}
+    validators = validators or {}
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        headers['If-Modified-Since'] = validators['last_modified']
+
+    try:
+        with get_client().stream('GET', url, headers=headers) as http_response:
+            if http_response.status_code == 304:
+                print("⚡ Fast tier: 304 Not Modified")
+                return FAST_NOT_MODIFIED, None
+
+            if http_response.status_code != 200:
+                status = http_response.status_code
+                if status == 429:
+                    # No retry here - the domain cools down and Scrapy retries once it may
+                    policy.failed(url, FAILURE_RATE_LIMITED, parse_retry_after(http_response.headers.get('retry-after')))
+                    print("⚡ Fast tier: HTTP 429, escalating...")
+                    return FAST_ESCALATE, None
+                reason = classify(status, http_response.headers, str(http_response.url))
+                if reason:
+                    print(f"⚡ Fast tier: block page ({reason})")
+                    policy.failed(url, FAILURE_BLOCKED)
+                    return FAST_BLOCKED, None
+                if classify_status(status):
+                    policy.failed(url, classify_status(status))
+                print(f"⚡ Fast tier: HTTP {status}, escalating...")
+                return FAST_ESCALATE, None
+
+            content_type = http_response.headers.get('content-type', '')
+            if 'html' not in content_type:
+                print(f"⚡ Fast tier: not HTML ({content_type}), escalating...")
+                return FAST_ESCALATE, None
+
+            body, truncated = read_body(http_response)
+    except httpx.HTTPError as e:
+        print(f"⚡ Fast tier: request failed ({type(e).__name__}), escalating...")
+        policy.failed(url, classify_exception(e))
+        return FAST_ESCALATE, None
+
+    reason = classify(200, http_response.headers, str(http_response.url), body)
+    if reason:
+        print(f"⚡ Fast tier: block page ({reason})")
+        policy.failed(url, FAILURE_BLOCKED)
+        return FAST_BLOCKED, None
+
+    response = HtmlResponse(
+        url=str(http_response.url),
+        status=http_response.status_code,
+        headers=dict(http_response.headers),
+        body=body,
+        request=Request(url),
+    )
+
+    archive = get_archive()
+    if archive is not None:
+        archive.store(url, response.body, engine='fast', status=200, final_url=response.url, truncated=truncated)
+
+    page_fingerprint = compute_fingerprint(response, truncated)
+    if page_fingerprint and page_fingerprint == fingerprint:
+        print("⚡ Fast tier: content fingerprint unchanged")
+        return FAST_NOT_MODIFIED, None
+
+    spider = ProductSpider(url=url, user_id=user_id)
+    item = spider.extract_product(response)
+
+    # First visit to a platform store (the generic extractor just detected it):
+    # exact price/variant from its API beats HTML guessing
+    platform = known_platform(url)
+    if platform:
+        fields = fetch_platform_product(get_client(), url, platform)
+        if not fields:
+            forget_platform(url)
+        else:
+            api_item = platform_item(url, user_id, platform, fields)
+            api_item['validators'] = spider.extract_validators(response)
+            api_item['fingerprint'] = page_fingerprint
+            for key, value in (item or {}).items():
+                if value and not api_item.get(key):
+                    api_item[key] = value
+            return FAST_OK, api_item
+    if not item or any(not item.get(field) for field in REQUIRED_FIELDS):
+        print("⚡ Fast tier: required fields missing, escalating...")
+        return FAST_ESCALATE, None
+
+    item['validators'] = spider.extract_validators(response)
+    item['fingerprint'] = page_fingerprint
+    return FAST_OK, item
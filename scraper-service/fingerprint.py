@@ -0,0 +1,89 @@
+"""
+Content fingerprints for product pages
+Hashes only the regions our extractors read (JSON-LD, OG/product meta and the
+title/price selectors of the page's retailer rule), so layout/ads/recommendation
+churn doesn't count as a change.
+If the fingerprint matches the one stored with the cached product, extraction
+and the database write can both be skipped.
+Pages whose meta/JSON-LD give title + price - the ones the streaming early-exit
+cuts short - hash only those regions up to the one completing title + price:
+every download that got that far has all of them, wherever it stopped, so a
+truncated refresh still matches a full fetch and vice versa.
+"""
+import hashlib
+import re
+
+from extraction_rules import rule_for_url, state_fingerprint_parts
+from streaming import fields_in
+
+# Regions that feed the extractors - order matters only for stability of the hash
+FINGERPRINT_XPATHS = [
+    '//script[@type="application/ld+json"]/text()',
+    '//meta[starts-with(@property, "og:") or starts-with(@property, "product:")]/@content',
+    '//*[@itemprop="price"]/@content',
+]
+# Fields whose selectors (from the page's retailer rule) are hashed
+FINGERPRINT_FIELDS = ('title', 'price')
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def compute_fingerprint(response, truncated=False):
+    """
+    Return a hex digest of the product-relevant regions of a response,
+    or None if none of them are present (nothing to compare - always extract)
+    or the body was cut short before title + price (nothing complete to hash)
+    """
+    parts = stream_parts(response)
+    if parts is None:
+        if truncated:
+            return None
+        parts = page_parts(response)
+
+    parts = [WHITESPACE_RE.sub(' ', part).strip() for part in parts]
+    parts = [part for part in parts if part]
+    if not parts:
+        return None
+
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+def stream_parts(response):
+    """
+    Meta/JSON-LD regions in document order up to the one completing title + price
+    (what the streaming early-exit reads before stopping), None if they never do
+    """
+    parts = []
+    found = set()
+    for element in response.selector.root.iter('meta', 'script'):
+        if element.tag == 'script':
+            if element.get('type') != 'application/ld+json':
+                continue
+            parts.append(element.text or '')
+        else:
+            prop = element.get('property') or ''
+            if prop.startswith(('og:', 'product:')) or element.get('itemprop') == 'price':
+                parts.append(element.get('content') or '')
+        found |= fields_in(element)
+        if 'title' in found and 'price' in found:
+            return parts
+    return None
+
+
+def page_parts(response):
+    """Every product region of a complete page"""
+    rule = rule_for_url(response.url)
+    parts = []
+    for xpath in FINGERPRINT_XPATHS:
+        parts.extend(response.xpath(xpath).getall())
+    # Every selector the extractor may fall back to, not just the one that matched last time
+    root = response.selector.root
+    for field in FINGERPRINT_FIELDS:
+        parts.extend(value for _, value in rule.candidates(root, field))
+    # Walmart/Target/Best Buy: the price may only live in embedded state
+    parts.extend(state_fingerprint_parts(response, rule))
+    return parts
@@ -0,0 +1,125 @@
+"""
+Hedged escalation: race Playwright against a Scrapy attempt that runs long
+Playwright used to start only after Scrapy had finished or failed, so a slow,
+doomed Scrapy attempt added its whole duration to the tail. Once a Scrapy
+attempt outlives the domain's observed p90 latency (see engine_router.py), a
+Playwright attempt starts alongside it. The first valid, non-captcha result
+completes the job and the loser is cancelled.
+A global budget keeps hedging from doubling load: only a share of crawls may be
+hedged (a token bucket refilled by each crawl) and only a few hedges run at once.
+"""
+import os
+import threading
+
+HEDGE_ENABLED = os.environ.get('HEDGE_ENABLED', 'true').lower() == 'true'
+# Hedges allowed per crawl on average (token bucket refilled by every crawl)
+HEDGE_BUDGET_RATIO = float(os.environ.get('HEDGE_BUDGET_RATIO', 0.1))
+# Unused hedge tokens saved up for a burst of slow crawls
+HEDGE_BUDGET_BURST = 5
+# Hedged Playwright runs at once per worker (they also need a free browser)
+HEDGE_MAX_IN_FLIGHT = int(os.environ.get('HEDGE_MAX_IN_FLIGHT', 1))
+# Never hedge earlier than this, however fast the domain usually is
+HEDGE_MIN_DELAY = float(os.environ.get('HEDGE_MIN_DELAY', 2))
+
+# Attempt states
+ATTEMPT_RUNNING = 'running'
+ATTEMPT_FAILED = 'failed'
+
+
+class HedgeBudget:
+    """Global cap on hedged attempts: a share of crawls and a concurrency limit (thread-safe)"""
+
+    def __init__(self, ratio, burst, max_in_flight):
+        self.ratio = ratio
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.tokens = float(burst)
+        self.in_flight = 0
+        self.hedged = 0
+        self.won = 0
+        self._lock = threading.Lock()
+
+    def crawl_started(self):
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_start(self):
+        with self._lock:
+            if self.in_flight >= self.max_in_flight or self.tokens < 1:
+                return False
+            self.tokens -= 1
+            self.in_flight += 1
+            self.hedged += 1
+            return True
+
+    def finished(self, won):
+        with self._lock:
+            self.in_flight -= 1
+            if won:
+                self.won += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {'in_flight': self.in_flight, 'max_in_flight': self.max_in_flight,
+                    'tokens': round(self.tokens, 2), 'hedged': self.hedged, 'won': self.won}
+
+
+class Race:
+    """
+    One job's primary (Scrapy) and hedged (Playwright) attempts
+    claim() picks the single winner; the failure hooks tell the last attempt
+    standing whether it has to fail the job
+    """
+
+    def __init__(self):
+        self.winner = None
+        self.primary = ATTEMPT_RUNNING
+        self.hedge = None
+        # Set when the other attempt won - Playwright checks it between steps
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    def claim(self, engine):
+        """True for the first valid result only"""
+        with self._lock:
+            if self.winner is not None:
+                return False
+            self.winner = engine
+            self.cancelled.set()
+            return True
+
+    def hedge_started(self):
+        with self._lock:
+            if self.winner is not None or self.primary != ATTEMPT_RUNNING:
+                return False
+            self.hedge = ATTEMPT_RUNNING
+            return True
+
+    def hedge_skipped(self):
+        """
+        The hedge never got going (no free browser) - Scrapy falls back as usual;
+        True if Scrapy already gave up and handed the job over, so the caller has to
+        run the fallback itself
+        """
+        with self._lock:
+            self.hedge = None
+            return self.primary == ATTEMPT_FAILED and self.winner is None
+
+    def hedge_failed(self):
+        """Hedge came back empty; True if Scrapy already gave up, so the hedge fails the job"""
+        with self._lock:
+            self.hedge = ATTEMPT_FAILED
+            return self.winner is None and self.primary == ATTEMPT_FAILED
+
+    def primary_failed(self):
+        """Scrapy came back empty; returns the hedge state (None = never hedged)"""
+        with self._lock:
+            self.primary = ATTEMPT_FAILED
+            return self.winner or self.hedge
+
+
+_hedge_budget = HedgeBudget(HEDGE_BUDGET_RATIO, HEDGE_BUDGET_BURST, HEDGE_MAX_IN_FLIGHT)
+
+
+def get_hedge_budget():
+    return _hedge_budget
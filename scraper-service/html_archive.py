@@ -0,0 +1,280 @@
+"""
+Compressed on-disk archive of fetched product pages
+Bodies are zstd-compressed and content-addressed (sha256 of the raw body), and
+indexed by canonical URL + fetch timestamp so selector fixes can be replayed
+offline instead of re-fetching pages. Oldest snapshots are evicted once the
+archive grows past its size budget.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from url_utils import canonicalize_url
+
+# zstd (optional) - falls back to zlib so the archive still works without it
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+    print("[Archive] Warning: zstandard not installed, falling back to zlib")
+
+ZSTD_LEVEL = 10
+
+# Check the size budget every N stores rather than on every write
+EVICT_EVERY_STORES = 50
+
+
+class HtmlArchive:
+    """
+    Layout:
+        <root>/blobs/ab/abcdef....zst   compressed page bodies
+        <root>/index.sqlite3            pages (one row per fetch) + blobs
+    """
+
+    def __init__(self, root, max_bytes=2 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.blob_dir = os.path.join(root, 'blobs')
+        self.index_path = os.path.join(root, 'index.sqlite3')
+        self._local = threading.local()
+        self._stores = 0
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._init_schema()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.index_path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                canonical_url TEXT NOT NULL,
+                url TEXT NOT NULL,
+                final_url TEXT,
+                fetched_at REAL NOT NULL,
+                sha256 TEXT NOT NULL,
+                engine TEXT,
+                status INTEGER,
+                truncated INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                codec TEXT NOT NULL,
+                raw_size INTEGER NOT NULL,
+                stored_size INTEGER NOT NULL
+            )
+            """
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS pages_canonical_idx ON pages(canonical_url, fetched_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS pages_sha_idx ON pages(sha256)')
+
+    # --- Compression ---
+
+    def _compress(self, raw):
+        if ZSTD_AVAILABLE:
+            return 'zstd', zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+        return 'zlib', zlib.compress(raw, 6)
+
+    def _decompress(self, codec, data):
+        if codec == 'zstd':
+            if not ZSTD_AVAILABLE:
+                raise RuntimeError("zstandard is required to read this archive entry")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data)
+
+    def _blob_path(self, sha, codec):
+        suffix = 'zst' if codec == 'zstd' else 'zz'
+        return os.path.join(self.blob_dir, sha[:2], f"{sha}.{suffix}")
+
+    # --- Writes ---
+
+    def store(self, url, body, engine=None, status=200, final_url=None, fetched_at=None, truncated=False):
+        """
+        Archive one fetched page body
+        Identical bodies are stored once no matter how many URLs/timestamps point at them
+        `truncated` marks a download stopped early (streaming early-exit): only the start of the page
+        """
+        if not body:
+            return None
+        raw = body.encode('utf-8') if isinstance(body, str) else bytes(body)
+        sha = hashlib.sha256(raw).hexdigest()
+
+        try:
+            conn = self._connect()
+            known = conn.execute('SELECT codec FROM blobs WHERE sha256 = ?', (sha,)).fetchone()
+            if not known:
+                codec, data = self._compress(raw)
+                path = self._blob_path(sha, codec)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                conn.execute(
+                    'INSERT OR IGNORE INTO blobs (sha256, codec, raw_size, stored_size) VALUES (?, ?, ?, ?)',
+                    (sha, codec, len(raw), len(data))
+                )
+
+            conn.execute(
+                """
+                INSERT INTO pages (canonical_url, url, final_url, fetched_at, sha256, engine, status, truncated)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (canonicalize_url(url), url, final_url or url, fetched_at or time.time(), sha, engine, status,
+                 1 if truncated else 0)
+            )
+        except (sqlite3.Error, OSError) as e:
+            print(f"⚠️  [Archive] Failed to store {url}: {e}")
+            return None
+
+        self._stores += 1
+        if self._stores % EVICT_EVERY_STORES == 0:
+            self.evict()
+        return sha
+
+    def evict(self):
+        """Drop the oldest snapshots until the compressed blobs fit in max_bytes"""
+        try:
+            conn = self._connect()
+            total = conn.execute('SELECT COALESCE(SUM(stored_size), 0) FROM blobs').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+
+            print(f"🧹 [Archive] {total / 1024 ** 2:.0f} MB over budget, evicting oldest snapshots...")
+            while total > self.max_bytes:
+                oldest = conn.execute('SELECT id FROM pages ORDER BY fetched_at ASC LIMIT 100').fetchall()
+                if not oldest:
+                    break
+                conn.executemany('DELETE FROM pages WHERE id = ?', oldest)
+
+                orphans = conn.execute(
+                    """
+                    SELECT sha256, codec, stored_size FROM blobs
+                    WHERE sha256 NOT IN (SELECT DISTINCT sha256 FROM pages)
+                    """
+                ).fetchall()
+                for sha, codec, stored_size in orphans:
+                    try:
+                        os.remove(self._blob_path(sha, codec))
+                    except FileNotFoundError:
+                        pass
+                    conn.execute('DELETE FROM blobs WHERE sha256 = ?', (sha,))
+                    total -= stored_size
+        except (sqlite3.Error, OSError) as e:
+            print(f"⚠️  [Archive] Eviction error: {e}")
+
+    # --- Reads ---
+
+    def load(self, sha):
+        """Return the raw (decompressed) body for a content hash, or None"""
+        row = self._connect().execute('SELECT codec FROM blobs WHERE sha256 = ?', (sha,)).fetchone()
+        if not row:
+            return None
+        try:
+            with open(self._blob_path(sha, row[0]), 'rb') as f:
+                return self._decompress(row[0], f.read())
+        except FileNotFoundError:
+            return None
+
+    def latest(self, url):
+        """Most recent snapshot for a URL as a dict (with 'body'), or None"""
+        row = self._connect().execute(
+            """
+            SELECT canonical_url, url, final_url, fetched_at, sha256, engine, status, truncated FROM pages
+            WHERE canonical_url = ? ORDER BY fetched_at DESC LIMIT 1
+            """,
+            (canonicalize_url(url),)
+        ).fetchone()
+        if not row:
+            return None
+        entry = self._row_to_entry(row)
+        entry['body'] = self.load(entry['sha256'])
+        return entry
+
+    def iter_latest(self, domain=None, since=None, include_truncated=False):
+        """
+        Yield the newest snapshot per canonical URL (without bodies - call load())
+        Optionally limited to one domain and/or snapshots fetched after `since`
+        Truncated snapshots (download stopped early) are skipped unless include_truncated
+        """
+        query = """
+            SELECT canonical_url, url, final_url, MAX(fetched_at), sha256, engine, status, truncated
+            FROM pages
+            WHERE status = 200
+        """
+        params = []
+        if not include_truncated:
+            query += ' AND truncated = 0'
+        if since:
+            query += ' AND fetched_at >= ?'
+            params.append(since)
+        query += ' GROUP BY canonical_url'
+
+        # Separate read-only connection so callers can store while iterating
+        conn = sqlite3.connect(self.index_path, timeout=10)
+        try:
+            for row in conn.execute(query, params):
+                entry = self._row_to_entry(row)
+                if domain and domain not in entry['canonical_url']:
+                    continue
+                yield entry
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_entry(row):
+        canonical_url, url, final_url, fetched_at, sha, engine, status, truncated = row
+        return {
+            'canonical_url': canonical_url,
+            'url': url,
+            'final_url': final_url,
+            'fetched_at': fetched_at,
+            'sha256': sha,
+            'engine': engine,
+            'status': status,
+            'truncated': bool(truncated),
+        }
+
+
+_archive = None
+_archive_lock = threading.Lock()
+
+
+def get_archive():
+    """Return the process-wide archive, or None when HTML_ARCHIVE_DIR is not set"""
+    global _archive
+    root = os.environ.get('HTML_ARCHIVE_DIR')
+    if not root:
+        return None
+
+    with _archive_lock:
+        if _archive is None:
+            try:
+                _archive = HtmlArchive(
+                    root,
+                    max_bytes=int(float(os.environ.get('HTML_ARCHIVE_MAX_MB', 2048)) * 1024 ** 2),
+                )
+                print(f"✅ HTML archive at {root}")
+            except Exception as e:
+                print(f"⚠️  HTML archive initialization failed: {e}")
+                return None
+    return _archive
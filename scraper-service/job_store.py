@@ -0,0 +1,657 @@
+"""
+Shared job store: registry, queue and completion signalling for scrape jobs
+Jobs used to live in one process's JOBS dict, so a GET /api/job/<id> landing on
+another gunicorn worker (or replica) found nothing. Every worker now reads and
+writes jobs through one backend, and any worker can accept, execute or report
+on any job:
+- SQLite in WAL mode (default) - all workers on one box, no extra services
+- Redis (JOB_STORE_URL=redis://...) - several boxes; any redis-py compatible
+  client works, so tests can pass a local stand-in such as fakeredis
+Queued jobs are claimed with a lease, most urgent priority lane first and,
+within a lane, in weighted fair order across users (see user_fairness.py);
+the worker renews the lease while the job runs (leased()), so a job whose
+worker died is requeued once the lease runs out, and a worker whose job was
+re-claimed meanwhile can no longer finish it.
+"""
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from priority_lanes import LANES, PRIORITY_INTERACTIVE, lane_rank
+from user_fairness import fair_flow
+
+# Fast JSON encoder (optional) - falls back to the stdlib with compact separators
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    import json
+    ORJSON_AVAILABLE = False
+
+# Redis backend (optional) - only needed when JOB_STORE_URL points at Redis
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# Job statuses
+STATUS_PENDING = 'pending'
+STATUS_PROCESSING = 'processing'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+FINISHED_STATUSES = (STATUS_COMPLETED, STATUS_FAILED)
+
+# Finished jobs are kept this long for polling clients
+JOB_TTL_SECONDS = float(os.environ.get('JOB_TTL_HOURS', 24)) * 3600
+# A claimed job whose lease isn't renewed within this is handed to another worker
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', 180))
+# Running jobs renew their lease this often
+LEASE_RENEW_SECONDS = JOB_LEASE_SECONDS / 3
+# Give up on a queued job after this many claims (crashing workers)
+MAX_CLAIMS = 2
+
+# Purge finished jobs every N writes instead of on every write
+PURGE_EVERY_WRITES = 500
+
+# How often waiters re-check the SQLite store when no local signal arrives
+POLL_INTERVAL = 0.2
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _dumps(value):
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def _loads(blob):
+    if ORJSON_AVAILABLE:
+        return orjson.loads(blob)
+    return json.loads(blob)
+
+
+def new_job(job_id, url, status, **fields):
+    now = time.time()
+    job = {
+        "id": job_id,
+        "status": status,
+        "url": url,
+        "data": None,
+        "error": None,
+        "started_at": now,
+    }
+    job.update(fields)
+    return job
+
+
+class JobStore:
+    """
+    Backend-independent job lifecycle on top of get/_write/_modify/_signal
+    Jobs are plain dicts (JSON-serializable); changes to a stored job are
+    read-modify-write in one transaction, since lease expiry may touch it too
+    """
+
+    backend = None
+
+    def __init__(self):
+        # job_id → claim token of the jobs this process claimed and hasn't finished
+        self._held = {}
+        self._held_lock = threading.Lock()
+
+    def _hold(self, job):
+        """Tag a job being claimed with a fresh claim token and remember it as ours"""
+        job['claim'] = uuid.uuid4().hex
+        with self._held_lock:
+            self._held[job['id']] = job['claim']
+        return job
+
+    def create(self, job_id, url, status=STATUS_PROCESSING, **fields):
+        """Register a job this worker runs itself (sync scrapes, bulk, re-extraction)"""
+        job = new_job(job_id, url, status, worker=WORKER_ID, **fields)
+        self._write(job)
+        return job
+
+    def enqueue(self, job_id, url, priority=PRIORITY_INTERACTIVE, **fields):
+        """Register a job for whichever worker claims it first (see claim())"""
+        job = new_job(job_id, url, STATUS_PENDING, priority=priority, **fields)
+        self._push(job)
+        return job
+
+    def update(self, job_id, **fields):
+        """Merge fields into a stored job (atomically - claims and lease expiry write the same doc)"""
+        def merge(job):
+            job.update(fields)
+            return job
+        return self._modify(job_id, merge)
+
+    def complete(self, job_id, data=None, **fields):
+        return self._finish(job_id, status=STATUS_COMPLETED, data=data, completed_at=time.time(), **fields)
+
+    def fail(self, job_id, error):
+        return self._finish(job_id, status=STATUS_FAILED, error=error, completed_at=time.time())
+
+    def _finish(self, job_id, **fields):
+        """
+        Finish a job - unless it already is, or another worker re-claimed it after
+        its lease ran out (that worker's result counts); None if it was left alone
+        """
+        with self._held_lock:
+            claim = self._held.pop(job_id, None)
+
+        def finish(job):
+            if job['status'] in FINISHED_STATUSES:
+                return None
+            if job.get('claim') is not None and job['claim'] != claim:
+                return None
+            job.update(fields)
+            return job
+
+        job = self._modify(job_id, finish)
+        if job is None:
+            print(f"⚠️  Job {job_id}: already finished or re-claimed by another worker, result dropped")
+        self._signal(job_id)
+        return job
+
+    @contextmanager
+    def leased(self, job):
+        """Renew a claimed job's lease every LEASE_RENEW_SECONDS while the body runs"""
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(LEASE_RENEW_SECONDS):
+                try:
+                    if not self.renew(job['id'], job['claim']):
+                        return  # Finished, or re-claimed elsewhere after all
+                except Exception as e:
+                    print(f"⚠️  Job {job['id']}: lease renewal failed: {e}")
+
+        threading.Thread(target=heartbeat, daemon=True).start()
+        try:
+            yield
+        finally:
+            stop.set()
+
+    def is_finished(self, job_id):
+        job = self.get(job_id)
+        return job is not None and job['status'] in FINISHED_STATUSES
+
+
+class SqliteJobStore(JobStore):
+    """
+    Jobs in one SQLite file in WAL mode - safe across threads and processes
+    Completion wakes waiters in this process immediately; other processes notice
+    within POLL_INTERVAL
+    """
+
+    backend = 'sqlite'
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+        self._changed = threading.Condition()
+        self._writes = 0
+        self._init_schema()
+
+    def _connect(self):
+        # sqlite connections must not cross threads or a gunicorn fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                doc BLOB NOT NULL,
+                queued_at REAL,
+                lease_until REAL,
+                claims INTEGER NOT NULL DEFAULT 0,
+                lane_rank INTEGER NOT NULL DEFAULT 0,
+                fair_at REAL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS jobs_fair_queue_idx ON jobs(status, lane_rank, fair_at, queued_at)')
+        # Virtual clocks per lane: flow '' is the lane's clock, every other row a user's last finish tag
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fair_clocks (
+                lane TEXT NOT NULL,
+                flow TEXT NOT NULL,
+                finish REAL NOT NULL,
+                PRIMARY KEY (lane, flow)
+            )
+            """
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS jobs_updated_idx ON jobs(updated_at)')
+
+    def get(self, job_id):
+        row = self._connect().execute('SELECT doc FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return _loads(row[0]) if row else None
+
+    def _write(self, job):
+        now = time.time()
+        self._connect().execute(
+            """
+            INSERT INTO jobs (id, status, doc, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET status = excluded.status, doc = excluded.doc,
+                updated_at = excluded.updated_at
+            """,
+            (job['id'], job['status'], _dumps(job), now)
+        )
+        self._writes += 1
+        if self._writes % PURGE_EVERY_WRITES == 0:
+            self.purge()
+
+    def _modify(self, job_id, change):
+        """Read, change and write a job in one transaction; change(job) returns the job, or None to leave it"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT doc FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            job = change(_loads(row[0])) if row else None
+            if job is not None:
+                conn.execute(
+                    'UPDATE jobs SET status = ?, doc = ?, updated_at = ? WHERE id = ?',
+                    (job['status'], _dumps(job), time.time(), job_id)
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if job is not None:
+            self._writes += 1
+            if self._writes % PURGE_EVERY_WRITES == 0:
+                self.purge()
+        return job
+
+    def _push(self, job):
+        conn = self._connect()
+        lane = job.get('priority') or PRIORITY_INTERACTIVE
+        flow, cost = fair_flow(job)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Start tag = max(lane clock, user's last finish): a user with a backlog queues behind their own work
+            clock = conn.execute(
+                "SELECT MAX(CASE WHEN flow = '' THEN finish END), MAX(CASE WHEN flow = ? THEN finish END) "
+                "FROM fair_clocks WHERE lane = ? AND flow IN ('', ?)",
+                (flow, lane, flow)
+            ).fetchone()
+            job['fair_at'] = max(clock[0] or 0.0, clock[1] or 0.0)
+            conn.execute(
+                'INSERT INTO fair_clocks (lane, flow, finish) VALUES (?, ?, ?) '
+                'ON CONFLICT(lane, flow) DO UPDATE SET finish = excluded.finish',
+                (lane, flow, job['fair_at'] + cost)
+            )
+            conn.execute(
+                'INSERT INTO jobs (id, status, doc, queued_at, lane_rank, fair_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job['id'], job['status'], _dumps(job), job['started_at'], lane_rank(lane), job['fair_at'],
+                 job['started_at'])
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        with self._changed:
+            self._changed.notify_all()
+
+    def _signal(self, job_id):
+        with self._changed:
+            self._changed.notify_all()
+
+    def _claim_once(self, lanes):
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Jobs whose worker vanished go back to the queue (or fail after MAX_CLAIMS)
+            for job_id, doc, claims in conn.execute(
+                'SELECT id, doc, claims FROM jobs WHERE status = ? AND lease_until < ?',
+                (STATUS_PROCESSING, now)
+            ).fetchall():
+                job = _loads(doc)
+                if claims >= MAX_CLAIMS:
+                    job.update(status=STATUS_FAILED, error="Worker stopped while processing the job", completed_at=now)
+                else:
+                    job['status'] = STATUS_PENDING
+                conn.execute(
+                    'UPDATE jobs SET status = ?, doc = ?, lease_until = NULL, updated_at = ? WHERE id = ?',
+                    (job['status'], _dumps(job), now, job_id)
+                )
+
+            ranks = [lane_rank(lane) for lane in lanes]
+            row = conn.execute(
+                f"SELECT id, doc, fair_at FROM jobs WHERE status = ? AND lane_rank IN ({','.join('?' * len(ranks))}) "
+                "ORDER BY lane_rank, fair_at, queued_at LIMIT 1",
+                (STATUS_PENDING, *ranks)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+
+            job = _loads(row[1])
+            # The lane's clock follows the start tag of the job in service
+            if row[2] is not None:
+                conn.execute(
+                    "INSERT INTO fair_clocks (lane, flow, finish) VALUES (?, '', ?) "
+                    "ON CONFLICT(lane, flow) DO UPDATE SET finish = MAX(finish, excluded.finish)",
+                    (job.get('priority') or PRIORITY_INTERACTIVE, row[2])
+                )
+            job.update(status=STATUS_PROCESSING, worker=WORKER_ID, claimed_at=now)
+            self._hold(job)
+            conn.execute(
+                """
+                UPDATE jobs SET status = ?, doc = ?, lease_until = ?, claims = claims + 1, updated_at = ?
+                WHERE id = ?
+                """,
+                (STATUS_PROCESSING, _dumps(job), now + JOB_LEASE_SECONDS, now, row[0])
+            )
+            conn.execute('COMMIT')
+            return job
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def renew(self, job_id, claim):
+        """Extend the lease of a job we still hold; False if it finished or was re-claimed"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT doc FROM jobs WHERE id = ? AND status = ?', (job_id, STATUS_PROCESSING)).fetchone()
+            held = row is not None and _loads(row[0]).get('claim') == claim
+            if held:
+                conn.execute('UPDATE jobs SET lease_until = ? WHERE id = ?', (time.time() + JOB_LEASE_SECONDS, job_id))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return held
+
+    def claim(self, lanes=LANES, timeout=2.0):
+        """
+        Take the next queued job from these lanes (most urgent lane first, then
+        fair order across users) and mark it processing; waits up to timeout,
+        None if nothing comes
+        """
+        deadline = time.time() + timeout
+        while True:
+            job = self._claim_once(lanes)
+            if job is not None or time.time() >= deadline:
+                return job
+            with self._changed:
+                self._changed.wait(min(POLL_INTERVAL * 5, max(0.0, deadline - time.time())))
+
+    def wait(self, job_id, timeout):
+        """Block until the job finishes; returns it, or None on timeout"""
+        deadline = time.time() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is not None and job['status'] in FINISHED_STATUSES:
+                return job
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            with self._changed:
+                self._changed.wait(min(POLL_INTERVAL, remaining))
+
+    def pending_count(self):
+        """Jobs queued and not yet claimed by any worker"""
+        row = self._connect().execute('SELECT COUNT(*) FROM jobs WHERE status = ?', (STATUS_PENDING,)).fetchone()
+        return row[0]
+
+    def purge(self):
+        """Drop finished jobs older than JOB_TTL_SECONDS, and user clocks the lane clock has passed"""
+        try:
+            conn = self._connect()
+            conn.execute(
+                'DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?',
+                (*FINISHED_STATUSES, time.time() - JOB_TTL_SECONDS)
+            )
+            conn.execute(
+                """
+                DELETE FROM fair_clocks WHERE flow != '' AND finish <= (
+                    SELECT lane_clock.finish FROM fair_clocks AS lane_clock
+                    WHERE lane_clock.lane = fair_clocks.lane AND lane_clock.flow = ''
+                )
+                """
+            )
+        except sqlite3.Error as e:
+            print(f"⚠️  Job store purge error: {e}")
+
+
+class RedisJobStore(JobStore):
+    """
+    Jobs in Redis: one key per job, a sorted set per lane as the queue (scored by
+    fair start tag), a sorted set of leases, and a per-job list that is pushed to
+    on completion (waiters BLPOP it)
+    Only uses basic commands and WATCH/MULTI (no scripts), so any redis-py compatible client works
+    """
+
+    backend = 'redis'
+
+    # One sorted set per lane: BZPOPMIN takes from the first non-empty key, i.e. the most urgent lane
+    QUEUE_KEY = 'wist:jobs:fairqueue:'
+    # Hash per lane: field '' is the lane's virtual clock, every other field a user's last finish tag
+    CLOCKS_KEY = 'wist:jobs:fairclock:'
+    LEASES_KEY = 'wist:jobs:leases'
+
+    def __init__(self, client, prefix='wist:job:'):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, job_id):
+        return self.prefix + job_id
+
+    def _done_key(self, job_id):
+        return self.prefix + job_id + ':done'
+
+    def get(self, job_id):
+        blob = self.client.get(self._key(job_id))
+        return _loads(blob) if blob else None
+
+    def _write(self, job):
+        self.client.set(self._key(job['id']), _dumps(job), ex=int(JOB_TTL_SECONDS))
+
+    def _modify(self, job_id, change):
+        """
+        Read, change and write a job under WATCH, retrying if another worker wrote it
+        in between; change(job) returns the job, or None to leave it
+        """
+        key = self._key(job_id)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    blob = pipe.get(key)
+                    job = change(_loads(blob)) if blob else None
+                    if job is None:
+                        pipe.unwatch()
+                        return None
+                    pipe.multi()
+                    pipe.set(key, _dumps(job), ex=int(JOB_TTL_SECONDS))
+                    pipe.execute()
+                    return job
+                except redis.WatchError:
+                    continue
+
+    def _queue(self, job):
+        lane = job.get('priority') or PRIORITY_INTERACTIVE
+        self.client.zadd(self.QUEUE_KEY + lane, {job['id']: job['fair_at']})
+
+    def _push(self, job):
+        lane = job.get('priority') or PRIORITY_INTERACTIVE
+        if job.get('fair_at') is None:
+            # Not atomic across workers: two simultaneous enqueues of one user may share a tag, which is harmless
+            flow, cost = fair_flow(job)
+            clocks_key = self.CLOCKS_KEY + lane
+            lane_clock, user_finish = self.client.hmget(clocks_key, ['', flow])
+            job['fair_at'] = max(float(lane_clock or 0), float(user_finish or 0))
+            self.client.hset(clocks_key, flow, job['fair_at'] + cost)
+            # Idle clocks expire; a lane restarting from zero is fine once its queue has drained
+            self.client.expire(clocks_key, int(JOB_TTL_SECONDS))
+        self._write(job)
+        self._queue(job)
+
+    def _signal(self, job_id):
+        done_key = self._done_key(job_id)
+        self.client.rpush(done_key, 1)
+        self.client.expire(done_key, int(JOB_LEASE_SECONDS))
+
+    def _requeue_expired(self):
+        now = time.time()
+
+        def expire(job):
+            # Finished in the meantime - the worker was just slow
+            if job['status'] != STATUS_PROCESSING:
+                return None
+            if job.get('claims', 0) >= MAX_CLAIMS:
+                job.update(status=STATUS_FAILED, error="Worker stopped while processing the job", completed_at=now)
+            else:
+                job['status'] = STATUS_PENDING
+            return job
+
+        for raw_id in self.client.zrangebyscore(self.LEASES_KEY, 0, now):
+            job_id = raw_id.decode() if isinstance(raw_id, bytes) else raw_id
+            # Whoever removes the lease first handles the job
+            if not self.client.zrem(self.LEASES_KEY, raw_id):
+                continue
+            job = self._modify(job_id, expire)
+            if job is None:
+                continue
+            if job['status'] == STATUS_FAILED:
+                self._signal(job_id)
+            else:
+                self._queue(job)
+
+    def claim(self, lanes=LANES, timeout=2.0):
+        """
+        Take the next queued job from these lanes (most urgent lane first, then
+        fair order across users) and mark it processing; waits up to timeout,
+        None if nothing comes
+        """
+        self._requeue_expired()
+        keys = [self.QUEUE_KEY + lane for lane in LANES if lane in lanes]
+        popped = self.client.bzpopmin(keys, timeout=max(1, int(timeout)))
+        if not popped:
+            return None
+        raw_key, raw_id, fair_at = popped
+        job_id = raw_id.decode() if isinstance(raw_id, bytes) else raw_id
+        now = time.time()
+
+        def take(job):
+            # Finished (e.g. failed/cancelled) while it was still queued
+            if job['status'] != STATUS_PENDING:
+                return None
+            job.update(status=STATUS_PROCESSING, worker=WORKER_ID, claimed_at=now, claims=job.get('claims', 0) + 1)
+            return self._hold(job)
+
+        job = self._modify(job_id, take)
+        if job is None:
+            return None
+        self.client.zadd(self.LEASES_KEY, {job_id: now + JOB_LEASE_SECONDS})
+        # The lane's clock follows the start tag of the job in service
+        lane = (raw_key.decode() if isinstance(raw_key, bytes) else raw_key)[len(self.QUEUE_KEY):]
+        clocks_key = self.CLOCKS_KEY + lane
+        if float(self.client.hget(clocks_key, '') or 0) < fair_at:
+            self.client.hset(clocks_key, '', fair_at)
+        return job
+
+    def renew(self, job_id, claim):
+        """Extend the lease of a job we still hold; False if it finished or was re-claimed"""
+        key = self._key(job_id)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    blob = pipe.get(key)
+                    job = _loads(blob) if blob else None
+                    if job is None or job['status'] != STATUS_PROCESSING or job.get('claim') != claim:
+                        pipe.unwatch()
+                        return False
+                    pipe.multi()
+                    # xx: a lease already taken by _requeue_expired stays gone
+                    pipe.zadd(self.LEASES_KEY, {job_id: time.time() + JOB_LEASE_SECONDS}, xx=True, ch=True)
+                    return bool(pipe.execute()[0])
+                except redis.WatchError:
+                    continue
+
+    def _finished(self, job):
+        """Drop a finished job's lease, and its queue entry if it never got claimed"""
+        if job is not None:
+            self.client.zrem(self.LEASES_KEY, job['id'])
+            self.client.zrem(self.QUEUE_KEY + (job.get('priority') or PRIORITY_INTERACTIVE), job['id'])
+        return job
+
+    def complete(self, job_id, data=None, **fields):
+        return self._finished(super().complete(job_id, data, **fields))
+
+    def fail(self, job_id, error):
+        return self._finished(super().fail(job_id, error))
+
+    def wait(self, job_id, timeout):
+        """Block until the job finishes; returns it, or None on timeout"""
+        deadline = time.time() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is not None and job['status'] in FINISHED_STATUSES:
+                return job
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            self.client.blpop(self._done_key(job_id), timeout=max(1, int(min(remaining, 5))))
+
+    def pending_count(self):
+        """Jobs queued and not yet claimed by any worker"""
+        return sum(self.client.zcard(self.QUEUE_KEY + lane) for lane in LANES)
+
+    def purge(self):
+        pass  # Keys expire on their own
+
+
+_job_store = None
+_job_store_lock = threading.Lock()
+
+
+def get_job_store():
+    """
+    Return the process-wide job store
+    JOB_STORE_URL=redis://... selects Redis; otherwise SQLite at JOB_STORE_PATH
+    (every worker pointing at the same file shares the same jobs)
+    """
+    global _job_store
+    with _job_store_lock:
+        if _job_store is None:
+            url = os.environ.get('JOB_STORE_URL', '')
+            if url.startswith(('redis://', 'rediss://', 'unix://')):
+                if not REDIS_AVAILABLE:
+                    raise RuntimeError("JOB_STORE_URL points at Redis but redis is not installed (pip install redis)")
+                _job_store = RedisJobStore(redis.Redis.from_url(url))
+                print("✅ Job store: Redis")
+            else:
+                path = os.environ.get('JOB_STORE_PATH') or os.path.join(tempfile.gettempdir(), 'wist-jobs.sqlite3')
+                _job_store = SqliteJobStore(path)
+                print(f"✅ Job store: SQLite at {path}")
+    return _job_store
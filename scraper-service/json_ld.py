@@ -0,0 +1,128 @@
+"""
+Parse-once JSON-LD for product pages
+Every <script type="application/ld+json"> block is decoded once per response
+(orjson when installed), walked through @graph containers and nested lists, and
+indexed by @type and @id. The parsed document is memoized on the response, so
+the spider, fast tier and fallbacks all share one parse; Playwright builds the
+same document from the script texts it reads in the page.
+"""
+import json
+import re
+
+# Fast JSON decoder (optional) - falls back to the stdlib
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+PRODUCT_TYPES = ('Product', 'IndividualProduct', 'ProductGroup', 'ProductModel')
+OFFER_TYPES = ('Offer', 'AggregateOffer')
+
+JSON_LD_XPATH = '//script[@type="application/ld+json"]/text()'
+
+# Wrappers some CMSes leave around the JSON
+WRAPPER_RE = re.compile(r'^\s*(?:<!--|<!\[CDATA\[)|(?:-->|\]\]>)\s*$')
+
+MEMO_ATTR = '_wist_json_ld'
+
+
+def decode(text):
+    """Decode one JSON-LD block; None if it isn't valid JSON even after cleanup"""
+    if not text:
+        return None
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    try:
+        # strict=False tolerates raw newlines/tabs inside strings (common in descriptions)
+        return json.loads(WRAPPER_RE.sub('', text), strict=False)
+    except ValueError:
+        return None
+
+
+def iter_nodes(data):
+    """Walk a decoded JSON-LD document, including @graph containers and nested lists"""
+    if isinstance(data, list):
+        for entry in data:
+            yield from iter_nodes(entry)
+    elif isinstance(data, dict):
+        yield data
+        if '@graph' in data:
+            yield from iter_nodes(data['@graph'])
+
+
+def node_types(node):
+    node_type = node.get('@type')
+    types = node_type if isinstance(node_type, list) else [node_type]
+    # 'http://schema.org/Product' and 'schema:Product' both count as Product
+    return [t.rsplit('/', 1)[-1].rsplit(':', 1)[-1] for t in types if isinstance(t, str)]
+
+
+def is_product(node):
+    return any(t in PRODUCT_TYPES or t in OFFER_TYPES for t in node_types(node))
+
+
+class JsonLdDocument:
+    """All JSON-LD nodes on one page, indexed by @type and @id"""
+
+    def __init__(self, texts):
+        self.nodes = []
+        self.by_type = {}
+        self.by_id = {}
+        for text in texts:
+            for node in iter_nodes(decode(text)):
+                self.nodes.append(node)
+                for node_type in node_types(node):
+                    self.by_type.setdefault(node_type, []).append(node)
+                if isinstance(node.get('@id'), str) and len(node) > 1:
+                    self.by_id.setdefault(node['@id'], node)
+
+    def __bool__(self):
+        return bool(self.nodes)
+
+    def of_type(self, *types):
+        for node_type in types:
+            yield from self.by_type.get(node_type, ())
+
+    def resolve(self, value):
+        """Follow an {"@id": ...} reference to the node it points at"""
+        if isinstance(value, dict) and set(value) == {'@id'}:
+            return self.by_id.get(value['@id'], value)
+        return value
+
+    def product(self):
+        """The main Product node, else a bare Offer node; None if the page has neither"""
+        for node in self.of_type(*PRODUCT_TYPES):
+            return node
+        for node in self.of_type(*OFFER_TYPES):
+            return node
+        return None
+
+    def offer(self, product):
+        """First offer for a product (resolving @id refs), falling back to standalone Offer nodes"""
+        offers = self.resolve(product.get('offers'))
+        if isinstance(offers, list):
+            offers = self.resolve(offers[0]) if offers else None
+        if isinstance(offers, dict) and (offers.get('price') or offers.get('lowPrice')):
+            return offers
+        if product.get('price') or product.get('lowPrice'):
+            return product
+        for node in self.of_type(*OFFER_TYPES):
+            if node.get('price') or node.get('lowPrice'):
+                return node
+        return offers if isinstance(offers, dict) else None
+
+
+def for_response(response):
+    """Parsed JSON-LD for a Scrapy/Parsel response, decoded at most once per response"""
+    document = getattr(response, MEMO_ATTR, None)
+    if document is None:
+        document = JsonLdDocument(response.xpath(JSON_LD_XPATH).getall())
+        try:
+            setattr(response, MEMO_ATTR, document)
+        except AttributeError:
+            pass
+    return document
@@ -0,0 +1,195 @@
+"""
+Scrapy downloader middlewares for the product spider
+Registered in settings.py DOWNLOADER_MIDDLEWARES
+"""
+import time
+
+from scrapy.downloadermiddlewares.retry import RetryMiddleware, get_retry_request
+from scrapy.exceptions import NotConfigured
+from scrapy.http import TextResponse
+from scrapy.utils.response import response_status_message
+
+from block_detection import PageBlocked, classify_response
+from domain_throttle import get_throttle
+from html_archive import get_archive
+from retry_policy import (
+    FAILURE_BLOCKED,
+    FAILURE_SERVER_ERROR,
+    classify_exception,
+    classify_status,
+    get_retry_policy,
+    parse_retry_after,
+)
+from spiders.product_spider import JobCancelled
+from url_utils import registrable_domain
+
+
+class DomainThrottleMiddleware:
+    """
+    Per-domain token bucket in front of the downloader (see domain_throttle.py)
+    Puts every request in its registrable domain's download slot (per-retailer
+    concurrency from DOWNLOAD_SLOTS) and, when the domain's bucket is empty,
+    waits for the next token without blocking the reactor - other domains keep
+    downloading meanwhile. Shares its buckets with the fast tier.
+    Retries scheduled by RetryPolicyMiddleware wait out their backoff here too.
+    Jobs cancelled while waiting here are dropped before they cost a request.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.throttle = get_throttle()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    async def process_request(self, request, spider):
+        request.meta.setdefault('download_slot', registrable_domain(request.url))
+        job = request.meta.get('wist_job') or {}
+        if job.get('cancelled'):
+            raise JobCancelled(request.url)
+        wait = self.throttle.reserve(request.url)
+        wait = max(wait, request.meta.pop('retry_not_before', 0) - time.time())
+        if wait > 0:
+            from twisted.internet import reactor
+            from twisted.internet.task import deferLater
+            self.stats.inc_value('domain_throttle/delayed')
+            await deferLater(reactor, wait)
+            if job.get('cancelled'):
+                self.throttle.cancel(request.url)
+                raise JobCancelled(request.url)
+        return None
+
+
+class BlockDetectionMiddleware:
+    """
+    Abandon block/captcha pages as soon as they arrive (see block_detection.py)
+    Sits below HttpCompressionMiddleware (590) so the body head is readable, and
+    above the archive (580) and RetryPolicyMiddleware (550): a challenge page is neither
+    archived nor retried - the request errbacks with PageBlocked and the caller
+    escalates straight to a browser instead of extracting a captcha page.
+    Plain 429s are left to RetryPolicyMiddleware to back off first.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    def process_response(self, request, response, spider):
+        if response.status == 304:
+            return response
+        reason = classify_response(response)
+        if reason is None:
+            return response
+        if response.status == 429 and not request.meta.get('dont_retry', False):
+            # Rate limited, not challenged - RetryPolicyMiddleware backs off (and escalates if it gives up)
+            return response
+
+        print(f"🚧 Block page detected ({reason}): {request.url}")
+        self.stats.inc_value('block_detection/blocked')
+        get_retry_policy().failed(request.url, FAILURE_BLOCKED)
+        raise PageBlocked(reason, request.url)
+
+
+class RetryPolicyMiddleware(RetryMiddleware):
+    """
+    Scrapy's RetryMiddleware driven by the shared retry policy (see retry_policy.py)
+    Same retryable statuses and exceptions (RETRY_HTTP_CODES / RETRY_EXCEPTIONS),
+    but each failure is classified, the domain cools down for every engine, the
+    retry comes out of the global retry budget and is sent only after a jittered
+    backoff (honouring Retry-After) - DomainThrottleMiddleware holds it back
+    without blocking the reactor. Replaces the stock RetryMiddleware at 550.
+    A 429 that can't be retried any more is escalated like a block page.
+    """
+
+    def __init__(self, settings, stats):
+        super().__init__(settings)
+        self.stats = stats
+        self.policy = get_retry_policy()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings, crawler.stats)
+
+    def process_request(self, request, spider):
+        if not request.meta.get('retry_times'):
+            self.policy.request_started()
+        return None
+
+    def process_response(self, request, response, spider):
+        if request.meta.get('dont_retry', False) or response.status not in self.retry_http_codes:
+            return response
+        failure = classify_status(response.status) or FAILURE_SERVER_ERROR
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        reason = response_status_message(response.status)
+        retry = self._retry_later(request, failure, reason, spider, retry_after)
+        if retry is not None:
+            return retry
+        if response.status == 429:
+            # Out of retries: same escalation as any other block page
+            self.stats.inc_value('block_detection/blocked')
+            raise PageBlocked('status 429', request.url)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        if request.meta.get('dont_retry', False) or not isinstance(exception, self.exceptions_to_retry):
+            return None
+        return self._retry_later(request, classify_exception(exception), exception, spider)
+
+    def _retry_later(self, request, failure, reason, spider, retry_after=None):
+        self.policy.failed(request.url, failure, retry_after)
+        if (request.meta.get('wist_job') or {}).get('cancelled'):
+            return None
+        attempt = request.meta.get('retry_times', 0)
+        delay = self.policy.retry_delay(failure, attempt, retry_after)
+        if delay is None:
+            self.stats.inc_value(f'retry_policy/gave_up/{failure}')
+            return None
+        retry = get_retry_request(
+            request,
+            spider=spider,
+            reason=reason,
+            max_retry_times=attempt + 1,
+            priority_adjust=self.priority_adjust,
+        )
+        if retry is not None:
+            retry.meta['retry_not_before'] = time.time() + delay
+            self.stats.inc_value(f'retry_policy/retried/{failure}')
+        return retry
+
+
+class HtmlArchiveMiddleware:
+    """
+    Archive every successful HTML response body (see html_archive.py)
+    Sits below HttpCompressionMiddleware (590) so it sees decompressed bodies,
+    and below RedirectMiddleware (600) so only final responses are stored.
+    Compression + disk writes run in the reactor thread pool, off the crawl path.
+    """
+
+    def __init__(self, archive):
+        self.archive = archive
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        archive = get_archive()
+        if archive is None:
+            raise NotConfigured("HTML_ARCHIVE_DIR not set")
+        return cls(archive)
+
+    def process_response(self, request, response, spider):
+        if response.status == 200 and isinstance(response, TextResponse):
+            from twisted.internet import reactor
+            reactor.callInThread(
+                self.archive.store,
+                request.url,
+                response.body,
+                engine='scrapy',
+                status=response.status,
+                final_url=response.url,
+                # Streaming early-exit stopped the download - only the start of the page is here
+                truncated='download_stopped' in response.flags,
+            )
+        return response
@@ -1,7 +1,36 @@
 import os
+from datetime import datetime
+from urllib.parse import urlparse
 from supabase import create_client, Client
 
 
+def build_product_row(url, result_data, method):
+    """
+    Map a scrape result onto the `products` cache table columns
+    Shared by /api/scrape/sync and offline re-extraction (reextract.py)
+    """
+    domain = urlparse(url).netloc.replace('www.', '')
+    
+    return {
+        "url": url,
+        "title": result_data.get('title'),
+        "price": str(result_data.get('price', '')) if result_data.get('price') else None,
+        "price_raw": result_data.get('priceRaw') or result_data.get('price'),
+        "image": result_data.get('image'),
+        "description": result_data.get('description'),
+        "domain": domain,
+        "last_scraped": datetime.utcnow().isoformat() + 'Z',
+        "meta": {
+            "scraped_at": datetime.utcnow().isoformat(),
+            "method": method,
+            # ETag / Last-Modified for conditional refreshes (see ProductSpider.start_requests)
+            "validators": result_data.get('validators') or {},
+            # Content fingerprint so unchanged refreshes skip extraction (see fingerprint.py)
+            "fingerprint": result_data.get('fingerprint')
+        }
+    }
+
+
 class SupabasePipeline:
     def open_spider(self, spider):
         url = os.environ.get("SUPABASE_URL")
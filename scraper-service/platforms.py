@@ -0,0 +1,215 @@
+"""
+Platform-API fast path for Shopify and WooCommerce stores
+Many "independent" stores run on one of these platforms, and both expose the
+product as JSON: Shopify at /products/<handle>.js, WooCommerce through the
+Store API (/wp-json/wc/store/v1/products?slug=<slug>). One small JSON request
+gives exact prices and the selected variant instead of HTML heuristics.
+Platforms are detected from cheap signals (headers, meta generator, asset hosts)
+and remembered per shop, so later scrapes of the same shop go straight to JSON.
+"""
+import os
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+from json_ld import decode
+
+SHOPIFY = 'shopify'
+WOOCOMMERCE = 'woocommerce'
+
+PLATFORM_API_ENABLED = os.environ.get('PLATFORM_API_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+PLATFORM_CACHE_TTL = int(os.environ.get('PLATFORM_CACHE_TTL_MINUTES', 15)) * 60
+# How long a shop's detected platform is trusted before we look again
+SHOP_PLATFORM_TTL = 7 * 24 * 3600
+MAX_CACHED_PRODUCTS = 5000
+
+SHOPIFY_HANDLE_RE = re.compile(r'/products/([^/?#.]+)')
+WOOCOMMERCE_SLUG_RE = re.compile(r'/product/([^/?#]+)')
+
+# Header name → value substring ('' = presence is enough)
+PLATFORM_HEADERS = {
+    SHOPIFY: {b'X-ShopId': '', b'X-Shopify-Stage': '', b'Powered-By': 'shopify'},
+    WOOCOMMERCE: {b'X-WC-Store-API-Nonce': '', b'Link': 'wc/store'},
+}
+# Asset hosts / inline markers in the first part of the page
+PLATFORM_BODY_RE = {
+    SHOPIFY: re.compile(rb'cdn\.shopify\.com|Shopify\.shop\s*=|shopify-checkout-api-token'),
+    WOOCOMMERCE: re.compile(rb'wp-content/plugins/woocommerce|woocommerce-page|wc-block-'),
+}
+BODY_SCAN_BYTES = 64 * 1024
+
+_lock = threading.Lock()
+# shop host → (platform, expires_at)
+_shops = {}
+# (platform, shop host, handle) → (payload, expires_at)
+_products = {}
+
+
+def shop_of(url):
+    return (urlparse(url).hostname or '').lower()
+
+
+def detect_platform(response):
+    """Shopify / WooCommerce / None from headers, meta generator and asset hosts"""
+    host = shop_of(response.url)
+    if host.endswith('.myshopify.com'):
+        return SHOPIFY
+
+    for platform, headers in PLATFORM_HEADERS.items():
+        for name, needle in headers.items():
+            value = response.headers.get(name)
+            if value is not None and needle in value.decode('latin-1').lower():
+                return platform
+
+    generator = ' '.join(response.xpath('//meta[@name="generator"]/@content').getall()).lower()
+    if 'woocommerce' in generator:
+        return WOOCOMMERCE
+    if 'shopify' in generator:
+        return SHOPIFY
+
+    head = response.body[:BODY_SCAN_BYTES]
+    for platform, pattern in PLATFORM_BODY_RE.items():
+        if pattern.search(head):
+            return platform
+    return None
+
+
+def remember_platform(url, platform):
+    with _lock:
+        _shops[shop_of(url)] = (platform, time.time() + SHOP_PLATFORM_TTL)
+
+
+def forget_platform(url):
+    """The shop stopped answering like its platform - go back to HTML until it's detected again"""
+    with _lock:
+        _shops.pop(shop_of(url), None)
+
+
+def known_platform(url):
+    """Platform previously detected for this URL's shop, if it can serve this URL"""
+    if not PLATFORM_API_ENABLED:
+        return None
+    host = shop_of(url)
+    if host.endswith('.myshopify.com'):
+        platform = SHOPIFY
+    else:
+        with _lock:
+            platform, expires_at = _shops.get(host, (None, 0))
+        if expires_at < time.time():
+            return None
+    return platform if product_key(url, platform) else None
+
+
+def product_key(url, platform):
+    """The handle/slug the platform API needs, or None if the URL isn't a product page"""
+    pattern = SHOPIFY_HANDLE_RE if platform == SHOPIFY else WOOCOMMERCE_SLUG_RE
+    match = pattern.search(urlparse(url).path)
+    return match.group(1) if match else None
+
+
+def _cached_payload(key):
+    with _lock:
+        payload, expires_at = _products.get(key, (None, 0))
+    return payload if expires_at > time.time() else None
+
+
+def _store_payload(key, payload):
+    with _lock:
+        if len(_products) >= MAX_CACHED_PRODUCTS:
+            now = time.time()
+            for stale in [k for k, (_, expires_at) in _products.items() if expires_at <= now]:
+                del _products[stale]
+            if len(_products) >= MAX_CACHED_PRODUCTS:
+                _products.clear()
+        _products[key] = (payload, time.time() + PLATFORM_CACHE_TTL)
+
+
+def _api_url(url, platform, handle):
+    parsed = urlparse(url)
+    base = f"{parsed.scheme or 'https'}://{parsed.netloc}"
+    if platform == SHOPIFY:
+        return f"{base}/products/{handle}.js"
+    return f"{base}/wp-json/wc/store/v1/products?slug={handle}"
+
+
+def _fetch_payload(client, url, platform, handle):
+    key = (platform, shop_of(url), handle)
+    payload = _cached_payload(key)
+    if payload is not None:
+        return payload
+
+    response = client.get(_api_url(url, platform, handle), headers={'Accept': 'application/json'})
+    if response.status_code != 200:
+        print(f"🧩 {platform} API: HTTP {response.status_code}")
+        return None
+    payload = decode(response.content)
+    if platform == WOOCOMMERCE:
+        payload = payload[0] if isinstance(payload, list) and payload else None
+    if not isinstance(payload, dict):
+        return None
+
+    _store_payload(key, payload)
+    return payload
+
+
+def _image_url(src):
+    if isinstance(src, dict):
+        src = src.get('src') or src.get('url')
+    if not src:
+        return None
+    return 'https:' + src if src.startswith('//') else src
+
+
+def _from_shopify(payload, url):
+    variants = payload.get('variants') or []
+    wanted = parse_qs(urlparse(url).query).get('variant', [None])[0]
+    variant = next((v for v in variants if str(v.get('id')) == wanted), None)
+    if variant is None:
+        variant = next((v for v in variants if v.get('available')), variants[0] if variants else None)
+
+    # Prices in the .js payload are integer cents
+    cents = variant.get('price') if variant else payload.get('price')
+    image = (variant or {}).get('featured_image') or payload.get('featured_image')
+    return {
+        'title': payload.get('title'),
+        'price': cents / 100 if isinstance(cents, (int, float)) else None,
+        'image': _image_url(image),
+        'description': payload.get('description'),
+    }
+
+
+def _from_woocommerce(payload, url):
+    prices = payload.get('prices') or {}
+    minor_unit = int(prices.get('currency_minor_unit', 2))
+    price = prices.get('price')
+    images = payload.get('images') or []
+    return {
+        'title': payload.get('name'),
+        'price': int(price) / 10 ** minor_unit if price and str(price).isdigit() else None,
+        'image': _image_url(images[0]) if images else None,
+        'description': payload.get('short_description') or payload.get('description'),
+    }
+
+
+def fetch_platform_product(client, url, platform):
+    """
+    Product fields straight from the platform API (title, price, image, description)
+    Returns None when the shop doesn't answer like the platform we detected
+    """
+    handle = product_key(url, platform)
+    if not handle:
+        return None
+    try:
+        payload = _fetch_payload(client, url, platform, handle)
+    except Exception as e:
+        print(f"🧩 {platform} API request failed: {type(e).__name__}")
+        return None
+    if payload is None:
+        return None
+
+    product = _from_shopify(payload, url) if platform == SHOPIFY else _from_woocommerce(payload, url)
+    if not product.get('title') or not product.get('price'):
+        return None
+    print(f"🧩 {platform} API: {product['title'][:50]} | ${product['price']:.2f}")
+    return product
@@ -1,15 +1,20 @@
 """
 Enhanced Playwright-based scraper for product extraction
-Supports: Amazon, Etsy, and independent/generic websites
+Supports: Amazon, Etsy, Best Buy, Target, Walmart and independent/generic websites
+(selectors live in extraction_rules.py, shared with the Scrapy spider)
 Uses stealth settings to avoid bot detection
 """
 from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
-import time
 import random
 import json
 import re
 import os
-from urllib.parse import urlparse
+
+from block_detection import SCAN_BYTES, classify
+from domain_throttle import get_throttle
+from extraction_rules import BLOCKED_PAGE, GENERIC, extract_in_browser, rule_for_url
+from html_archive import get_archive
+from retry_policy import FAILURE_BLOCKED, FAILURE_TIMEOUT, get_retry_policy
 
 # Import stealth plugin
 try:
@@ -19,6 +24,14 @@ except ImportError:
     STEALTH_AVAILABLE = False
     print("[Playwright] Warning: playwright-stealth not installed")
 
+# Title + start of the body text - all the block classifier needs (page.content() would serialize the whole DOM)
+PAGE_HEAD_SCRIPT = """
+(limit) => ({
+    title: document.title,
+    text: (document.body ? document.body.textContent : '').slice(0, limit),
+})
+"""
+
 # User agents for rotation
 USER_AGENTS = [
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -39,55 +52,78 @@ def extract_from_blocked_page(page, url, source):
     """
     print(f"   [Playwright] Attempting extraction from blocked {source} page...")
     
-    result = {
-        "title": None,
-        "price": None,
-        "priceRaw": None,
-        "image": None,
-        "description": None,
-        "url": url,
-        "method": f"playwright_{source}_blocked"
-    }
-    
+    result = empty_result(url, f"playwright_{source}_blocked")
     try:
-        # Try OG tags
-        og_title = page.query_selector('meta[property="og:title"]')
-        if og_title:
-            result['title'] = og_title.get_attribute('content')
-            print(f"   [Playwright] Found OG title: {result['title'][:50] if result['title'] else 'None'}...")
-        
-        og_image = page.query_selector('meta[property="og:image"]')
-        if og_image:
-            result['image'] = og_image.get_attribute('content')
-            print(f"   [Playwright] Found OG image")
-        
-        og_desc = page.query_selector('meta[property="og:description"]')
-        if og_desc:
-            result['description'] = og_desc.get_attribute('content')
-        
-        # Try to find price in any meta tag
-        price_meta = page.query_selector('meta[property="product:price:amount"]')
-        if price_meta:
-            price_val = price_meta.get_attribute('content')
-            if price_val:
-                result['price'] = float(price_val)
-                result['priceRaw'] = f"${result['price']:.2f}"
-                print(f"   [Playwright] Found OG price: {result['priceRaw']}")
+        result.update(extract_in_browser(page, BLOCKED_PAGE, url))
+        if result['title']:
+            print(f"   [Playwright] Found OG title: {result['title'][:50]}...")
     except Exception as e:
         print(f"   [Playwright] Error extracting from blocked page: {e}")
     
     return result
 
 
-def scrape_with_playwright(url):
+def watch_document_responses(page):
+    """
+    Response hook: classify each main-frame document response as it arrives
+    (status, challenge headers, redirect target) - no DOM serialization needed
+    Returns a dict whose 'reason' tracks the latest navigation
+    """
+    verdict = {'reason': None}
+    
+    def on_response(response):
+        try:
+            if response.request.resource_type == 'document' and response.frame == page.main_frame:
+                verdict['reason'] = classify(response.status, response.headers, response.url)
+        except Exception:
+            pass
+    
+    page.on('response', on_response)
+    return verdict
+
+
+def page_block_reason(page, verdict):
+    """Block reason from the response hook, else from the title + first KB of body text"""
+    if verdict.get('reason'):
+        return verdict['reason']
+    try:
+        head = page.evaluate(PAGE_HEAD_SCRIPT, SCAN_BYTES)
+    except Exception:
+        return None
+    return classify(title=head.get('title'), body=(head.get('text') or '').encode('utf-8'))
+
+
+def archive_page(page, url):
+    """
+    Save the rendered DOM to the HTML archive (only when HTML_ARCHIVE_DIR is set,
+    so we don't pay for page.content() otherwise)
+    """
+    archive = get_archive()
+    if archive is None:
+        return
+    try:
+        archive.store(url, page.content(), engine='playwright', status=200, final_url=page.url)
+    except Exception as e:
+        print(f"   [Playwright] Could not archive page: {e}")
+
+
+def back_off(page, seconds, cancel=None):
+    """Wait between attempts; a cancelled (hedged) attempt stops waiting at once"""
+    if cancel is not None:
+        cancel.wait(seconds)
+    else:
+        page.wait_for_timeout(seconds * 1000)
+
+
+def scrape_with_playwright(url, cancel=None):
     """
     Main entry point for Playwright scraping.
     Detects site type and uses appropriate extraction strategy.
+    cancel (threading.Event, optional): checked between steps - once set, the
+    browser is closed and None returned (a hedged attempt that lost the race)
     """
     print(f"[Playwright] Scraping: {url}")
     
-    domain = urlparse(url).netloc.lower()
-    
     with sync_playwright() as p:
         # ALWAYS use headless mode on server (no display available)
         browser = p.chromium.launch(
@@ -129,17 +165,34 @@ def scrape_with_playwright(url):
             stealth_sync(page)
             print("   [Playwright] Stealth mode activated")
         
+        verdict = watch_document_responses(page)
+        policy = get_retry_policy()
+        
         try:
-            # Navigate with retry logic
-            for attempt in range(3):
+            # Navigate, retrying timeouts as the shared retry policy allows (jittered
+            # backoff, global retry budget, never sooner than the domain's cooldown)
+            policy.request_started()
+            attempt = 0
+            while True:
                 try:
                     page.goto(url, timeout=45000, wait_until='domcontentloaded')
                     break
                 except PlaywrightTimeout:
-                    if attempt == 2:
+                    policy.failed(url, FAILURE_TIMEOUT)
+                    if cancel is not None and cancel.is_set():
                         raise
-                    print(f"   [Playwright] Timeout, retrying... ({attempt + 1}/3)")
-                    time.sleep(2)
+                    delay = policy.retry_delay(FAILURE_TIMEOUT, attempt)
+                    if delay is None:
+                        raise
+                    delay = max(delay, get_throttle().reserve(url))
+                    attempt += 1
+                    print(f"   [Playwright] Timeout, retrying in {delay:.1f}s... (retry {attempt})")
+                    back_off(page, delay, cancel)
+            
+            if cancel is not None and cancel.is_set():
+                print("   [Playwright] Cancelled, closing browser")
+                browser.close()
+                return None
             
             # Wait for page to settle
             page.wait_for_timeout(2000 + random.randint(0, 1000))
@@ -147,23 +200,28 @@ def scrape_with_playwright(url):
             # Human-like behavior
             page.mouse.move(random.randint(100, 300), random.randint(100, 300))
             
-            # Check for blocks/captchas
-            page_title = page.title().lower()
-            blocked_indicators = ['robot', 'captcha', 'verify', 'security check', 'access denied', 'unusual traffic']
-            
-            if any(indicator in page_title for indicator in blocked_indicators):
-                print(f"   [Playwright] Blocked detected: {page_title}")
-                # Wait and retry once
-                page.wait_for_timeout(5000)
-                page_title = page.title().lower()
-                if any(indicator in page_title for indicator in blocked_indicators):
+            # Check for blocks/captchas (navigation response + title/body head)
+            reason = page_block_reason(page, verdict)
+            if reason:
+                print(f"   [Playwright] Blocked detected: {reason}")
+                # Cool the domain down for every engine, then re-check once
+                # after a jittered wait (JS challenges often clear themselves)
+                policy.failed(url, FAILURE_BLOCKED)
+                # Forget the blocked response: only a navigation during the wait or the DOM may block again
+                verdict['reason'] = None
+                back_off(page, policy.backoff(FAILURE_BLOCKED, 0), cancel)
+                if page_block_reason(page, verdict):
                     browser.close()
                     return None
             
+            if cancel is not None and cancel.is_set():
+                print("   [Playwright] Cancelled, closing browser")
+                browser.close()
+                return None
+            
             # Route to appropriate extractor
-            if 'amazon' in domain:
-                result = extract_amazon(page, url)
-            elif 'etsy' in domain:
+            rule = rule_for_url(url)
+            if rule.key == 'etsy':
                 # Etsy often needs more time to load JavaScript
                 print("   [Playwright] Etsy detected - waiting for network idle...")
                 try:
@@ -174,20 +232,20 @@ def scrape_with_playwright(url):
                 # Also wait a bit more for JS to render
                 page.wait_for_timeout(3000)
                 
-                # Log page HTML length for debugging
-                html = page.content()
-                print(f"   [Playwright] Page HTML length: {len(html)} chars")
-                
-                if len(html) < 5000:
-                    print(f"   [Playwright] WARNING: Page seems blocked, trying OG tags from blocked page...")
+                # Late JS-rendered challenges only show up after the page settles
+                reason = page_block_reason(page, verdict)
+                if reason:
+                    print(f"   [Playwright] WARNING: Page seems blocked ({reason}), trying OG tags from blocked page...")
                     # Even blocked pages sometimes have OG tags - try to extract them
                     result = extract_from_blocked_page(page, url, 'etsy')
                 else:
-                    result = extract_etsy(page, url)
-            elif any(store in domain for store in ['bestbuy', 'target', 'walmart']):
-                result = extract_major_retailer(page, url, domain)
-            else:
+                    result = extract_etsy(page, url, rule)
+            elif rule is GENERIC:
                 result = extract_generic(page, url)
+            else:
+                result = extract_with_rule(page, url, rule)
+            
+            archive_page(page, url)
             
             browser.close()
             return result
@@ -200,156 +258,46 @@ def scrape_with_playwright(url):
             return None
 
 
-def extract_amazon(page, url):
-    """
-    Amazon-specific extraction with multiple fallback selectors.
-    Handles different Amazon page layouts.
-    """
-    print("   [Playwright] Using Amazon extractor")
-    
-    result = {
+def empty_result(url, method):
+    return {
         "title": None,
         "price": None,
         "priceRaw": None,
         "image": None,
         "description": None,
         "url": url,
-        "method": "playwright_amazon"
+        "method": method
     }
+
+
+def extract_with_rule(page, url, rule):
+    """
+    Retailer extraction driven by extraction_rules.py (same selectors as the spider)
+    All fields are read in one page.evaluate() call
+    """
+    print(f"   [Playwright] Using {rule.name} extractor")
     
-    # Wait for key elements
-    try:
-        page.wait_for_selector('#productTitle, #title, .product-title-word-break', timeout=10000)
-    except:
-        pass
-    
-    # === TITLE ===
-    title_selectors = [
-        '#productTitle',
-        '#title span',
-        'h1.product-title-word-break',
-        'h1 span#productTitle',
-    ]
-    for sel in title_selectors:
-        try:
-            el = page.query_selector(sel)
-            if el:
-                text = el.inner_text().strip()
-                if text and len(text) > 5:
-                    result['title'] = text
-                    break
-        except:
-            continue
-    
-    # === PRICE ===
-    # Amazon has many price formats - prioritize "price to pay" (actual current price)
-    # IMPORTANT: Order matters - most reliable first, avoid "was" prices
-    price_selectors = [
-        # Actual price to pay (most accurate)
-        '.priceToPay span.a-offscreen',
-        '#corePrice_desktop .priceToPay span.a-offscreen',
-        # Deal/sale prices
-        '#priceblock_dealprice',
-        '#priceblock_saleprice', 
-        '#priceblock_ourprice',
-        # Desktop price display (avoid "was" prices)
-        '#corePriceDisplay_desktop_feature_div .priceToPay span.a-offscreen',
-        '#corePrice_feature_div .a-price span.a-offscreen',
-        '#apex_desktop .priceToPay span.a-offscreen',
-        # Kindle/Digital
-        '#kindle-price',
-        '#price_inside_buybox',
-        # Fallback - combined whole + fraction
-        '#corePriceDisplay_desktop_feature_div .a-price-whole',
-    ]
-    
-    for sel in price_selectors:
-        try:
-            el = page.query_selector(sel)
-            if el:
-                price_text = el.inner_text().strip()
-                
-                # If we got a-price-whole, we need to also get the fraction
-                if 'a-price-whole' in sel:
-                    fraction_el = page.query_selector('#corePriceDisplay_desktop_feature_div .a-price-fraction')
-                    if fraction_el:
-                        fraction = fraction_el.inner_text().strip()
-                        price_text = f"{price_text}.{fraction}"
-                
-                # Clean and extract price
-                price_match = re.search(r'[\$]?([\d,]+\.?\d*)', price_text)
-                if price_match:
-                    price_str = price_match.group(1).replace(',', '')
-                    price_val = float(price_str)
-                    if price_val > 0:  # Make sure it's a valid price
-                        result['price'] = price_val
-                        result['priceRaw'] = f"${result['price']:.2f}"
-                        print(f"   💵 Found price via '{sel}': ${result['price']:.2f}")
-                        break
-        except Exception as e:
-            print(f"   ⚠️ Price selector '{sel}' failed: {e}")
-            continue
-    
-    # === IMAGE ===
-    image_selectors = [
-        '#landingImage',
-        '#imgBlkFront',
-        '#ebooksImgBlkFront',
-        '#main-image',
-        '.a-dynamic-image',
-        '#imageBlock img',
-    ]
+    result = empty_result(url, f"playwright_{rule.key}")
     
-    for sel in image_selectors:
+    # Wait for key elements
+    if rule.wait_for:
         try:
-            el = page.query_selector(sel)
-            if el:
-                # Try different attributes
-                for attr in ['src', 'data-old-hires', 'data-a-dynamic-image']:
-                    img = el.get_attribute(attr)
-                    if img and img.startswith('http'):
-                        # For data-a-dynamic-image, extract first URL
-                        if attr == 'data-a-dynamic-image':
-                            try:
-                                img_data = json.loads(img)
-                                img = list(img_data.keys())[0] if img_data else None
-                            except:
-                                continue
-                        if img:
-                            result['image'] = img
-                            break
-                if result['image']:
-                    break
+            page.wait_for_selector(rule.wait_for, timeout=10000)
         except:
-            continue
+            pass
     
-    # === DESCRIPTION ===
     try:
-        desc_el = page.query_selector('#productDescription p, #feature-bullets')
-        if desc_el:
-            result['description'] = desc_el.inner_text().strip()[:500]
-    except:
-        pass
+        result.update(extract_in_browser(page, rule, url))
+    except Exception as e:
+        print(f"   [Playwright] Extraction error: {e}")
     
     return result
 
 
-def extract_etsy(page, url):
+def extract_etsy(page, url, rule):
     """
     Etsy-specific extraction with security check handling.
     """
-    print("   [Playwright] Using Etsy extractor")
-    
-    result = {
-        "title": None,
-        "price": None,
-        "priceRaw": None,
-        "image": None,
-        "description": None,
-        "url": url,
-        "method": "playwright_etsy"
-    }
-    
     # Log current page state
     try:
         page_title = page.title()
@@ -378,376 +326,36 @@ def extract_etsy(page, url):
     except Exception as e:
         print(f"   [Playwright] Security check error: {e}")
     
-    # Try JSON-LD first (most reliable for Etsy)
-    try:
-        scripts = page.query_selector_all('script[type="application/ld+json"]')
-        if scripts:
-            for script in scripts:
-                try:
-                    content = script.inner_text()
-                    if not content:
-                        continue
-                    data = json.loads(content)
-                    
-                    # Handle array format
-                    if isinstance(data, list):
-                        for item in data:
-                            if isinstance(item, dict) and item.get('@type') in ['Product', 'IndividualProduct']:
-                                data = item
-                                break
-                    
-                    if isinstance(data, dict) and data.get('@type') in ['Product', 'IndividualProduct']:
-                        result['title'] = data.get('name')
-                        desc = data.get('description')
-                        result['description'] = str(desc)[:500] if desc else ''
-                        
-                        # Image
-                        img = data.get('image')
-                        if isinstance(img, list) and len(img) > 0:
-                            img = img[0]
-                        if isinstance(img, dict):
-                            img = img.get('url') or img.get('contentUrl')
-                        result['image'] = str(img) if img else None
-                        
-                        # Price
-                        offers = data.get('offers')
-                        if isinstance(offers, list) and len(offers) > 0:
-                            offers = offers[0]
-                        if isinstance(offers, dict):
-                            price_val = offers.get('price') or offers.get('lowPrice')
-                            if price_val:
-                                result['price'] = float(price_val)
-                                result['priceRaw'] = f"${result['price']:.2f}"
-                        break
-                except Exception as e:
-                    print(f"   [Playwright] JSON-LD parse error: {e}")
-                    continue
-    except Exception as e:
-        print(f"   [Playwright] JSON-LD extraction error: {e}")
-    
-    # CSS fallback if JSON-LD failed
-    if not result['title']:
-        print("   [Playwright] Trying CSS selectors for title...")
-        title_selectors = [
-            'h1[data-buy-box-listing-title]',
-            'h1.listing-page-title',
-            'h1.wt-text-body-01',
-            'h1[data-listing-page-title]',
-            '[data-testid="listing-title"]',
-            'h1',  # Last resort - any h1
-        ]
-        for sel in title_selectors:
-            try:
-                el = page.query_selector(sel)
-                if el:
-                    text = el.inner_text().strip()
-                    if text and len(text) > 3:
-                        result['title'] = text
-                        print(f"   [Playwright] Found title via '{sel}': {text[:50]}...")
-                        break
-            except Exception as e:
-                print(f"   [Playwright] Title selector '{sel}' failed: {e}")
-                continue
-    
-    if not result['price']:
-        print("   [Playwright] Trying CSS selectors for price...")
-        price_selectors = [
-            'p.wt-text-title-03 .currency-value',
-            '[data-buy-box-region="price"] .currency-value',
-            '.wt-text-title-larger',
-            '[data-testid="listing-price"]',
-            '.wt-text-title-01',
-            '[data-selector="price"]',
-        ]
-        for sel in price_selectors:
-            try:
-                el = page.query_selector(sel)
-                if el:
-                    price_text = el.inner_text().strip()
-                    price_match = re.search(r'([\d,]+\.?\d*)', price_text)
-                    if price_match:
-                        result['price'] = float(price_match.group(1).replace(',', ''))
-                        result['priceRaw'] = f"${result['price']:.2f}"
-                        print(f"   [Playwright] Found price via '{sel}': ${result['price']}")
-                        break
-            except:
-                continue
-    
-    if not result['image']:
-        print("   [Playwright] Trying to find image...")
-        # Try og:image first
-        try:
-            og = page.query_selector('meta[property="og:image"]')
-            if og:
-                result['image'] = og.get_attribute('content')
-                if result['image']:
-                    print(f"   [Playwright] Found image via og:image")
-        except:
-            pass
-        
-        # Fallback to page images
-        if not result['image']:
-            try:
-                img = page.query_selector('img[src*="etsystatic.com"][src*="/il/"]')
-                if img:
-                    result['image'] = img.get_attribute('src')
-                    print(f"   [Playwright] Found image via Etsy image selector")
-            except:
-                pass
-    
+    result = extract_with_rule(page, url, rule)
     print(f"   [Playwright] Etsy extraction result: title={bool(result['title'])}, price={result['price']}, image={bool(result['image'])}")
     return result
 
 
-def extract_major_retailer(page, url, domain):
-    """
-    Extraction for major retailers: Best Buy, Target, Walmart
-    """
-    print(f"   [Playwright] Using major retailer extractor for {domain}")
-    
-    result = {
-        "title": None,
-        "price": None,
-        "priceRaw": None,
-        "image": None,
-        "description": None,
-        "url": url,
-        "method": f"playwright_{domain.split('.')[0]}"
-    }
-    
-    # Site-specific selectors
-    if 'bestbuy' in domain:
-        selectors = {
-            'title': ['h1.heading-5', '[data-testid="product-title"]', 'h1'],
-            'price': ['.priceView-customer-price span', '[data-testid="price"]', '.pricing-price'],
-            'image': ['[data-testid="product-image"] img', '.product-image img', 'img.primary-image'],
-        }
-    elif 'target' in domain:
-        selectors = {
-            'title': ['h1[data-test="product-title"]', 'h1'],
-            'price': ['[data-test="product-price"]', '.pricing-current-price'],
-            'image': ['[data-test="product-image"] img', '.carousel-image img'],
-        }
-    elif 'walmart' in domain:
-        selectors = {
-            'title': ['h1.prod-ProductTitle', '[data-testid="product-title"]', 'h1'],
-            'price': ['[itemprop="price"]', '[data-testid="price"]', '.price-characteristic'],
-            'image': ['[data-testid="product-image"] img', '.prod-hero-image img'],
-        }
-    else:
-        return extract_generic(page, url)
-    
-    # Extract using selectors
-    for sel in selectors.get('title', []):
-        try:
-            el = page.query_selector(sel)
-            if el:
-                result['title'] = el.inner_text().strip()
-                break
-        except:
-            continue
-    
-    for sel in selectors.get('price', []):
-        try:
-            el = page.query_selector(sel)
-            if el:
-                price_text = el.inner_text().strip()
-                price_match = re.search(r'[\$]?([\d,]+\.?\d*)', price_text)
-                if price_match:
-                    result['price'] = float(price_match.group(1).replace(',', ''))
-                    result['priceRaw'] = f"${result['price']:.2f}"
-                    break
-        except:
-            continue
-    
-    for sel in selectors.get('image', []):
-        try:
-            el = page.query_selector(sel)
-            if el:
-                result['image'] = el.get_attribute('src')
-                if result['image']:
-                    break
-        except:
-            continue
-    
-    return result
-
-
 def extract_generic(page, url):
     """
     Generic extraction for independent/unknown websites.
-    Uses JSON-LD → OpenGraph → CSS heuristics
+    Uses JSON-LD → OpenGraph → CSS heuristics (GENERIC rule), then a text search for a price
     """
-    print("   [Playwright] Using generic extractor")
+    result = extract_with_rule(page, url, GENERIC)
     
-    result = {
-        "title": None,
-        "price": None,
-        "priceRaw": None,
-        "image": None,
-        "description": None,
-        "url": url,
-        "method": "playwright_generic"
-    }
-    
-    # === STRATEGY 1: JSON-LD (Most reliable) ===
-    try:
-        scripts = page.query_selector_all('script[type="application/ld+json"]')
-        for script in scripts:
-            try:
-                content = script.inner_text()
-                data = json.loads(content)
-                
-                # Handle arrays
-                items = data if isinstance(data, list) else [data]
-                
-                for item in items:
-                    if isinstance(item, dict) and item.get('@type') in ['Product', 'Offer', 'IndividualProduct']:
-                        if not result['title']:
-                            result['title'] = item.get('name')
-                        if not result['description']:
-                            desc = item.get('description') or ''
-                            result['description'] = desc[:500] if desc else ''
-                        
-                        # Image
-                        if not result['image']:
-                            img = item.get('image')
-                            if isinstance(img, list) and len(img) > 0:
-                                img = img[0]
-                            if isinstance(img, dict):
-                                img = img.get('url') or img.get('contentUrl')
-                            result['image'] = img if img else None
-                        
-                        # Price
-                        if not result['price']:
-                            offers = item.get('offers') or item
-                            if isinstance(offers, list) and len(offers) > 0:
-                                offers = offers[0]
-                            if isinstance(offers, dict):
-                                price_val = offers.get('price') or offers.get('lowPrice')
-                                if price_val:
-                                    result['price'] = float(price_val)
-                                    result['priceRaw'] = f"${result['price']:.2f}"
-            except:
-                continue
-    except:
-        pass
-    
-    # === STRATEGY 2: OpenGraph Meta Tags ===
-    if not result['title']:
-        try:
-            og = page.query_selector('meta[property="og:title"]')
-            if og:
-                result['title'] = og.get_attribute('content')
-        except:
-            pass
-    
-    if not result['image']:
-        try:
-            og = page.query_selector('meta[property="og:image"]')
-            if og:
-                result['image'] = og.get_attribute('content')
-        except:
-            pass
-    
-    if not result['description']:
-        try:
-            og = page.query_selector('meta[property="og:description"]')
-            if og:
-                result['description'] = og.get_attribute('content')
-        except:
-            pass
-    
-    # Price from meta
+    # Last resort: regex search in page text
     if not result['price']:
         try:
-            meta = page.query_selector('meta[property="product:price:amount"], meta[property="og:price:amount"]')
-            if meta:
-                price_val = meta.get_attribute('content')
-                result['price'] = float(price_val)
-                result['priceRaw'] = f"${result['price']:.2f}"
+            body_text = page.inner_text('body')[:5000]
+            price_patterns = [
+                r'\$\s*([\d,]+\.\d{2})',
+                r'USD\s*([\d,]+\.\d{2})',
+                r'Price[:\s]*([\d,]+\.\d{2})',
+            ]
+            for pattern in price_patterns:
+                match = re.search(pattern, body_text)
+                if match:
+                    result['price'] = float(match.group(1).replace(',', ''))
+                    result['priceRaw'] = f"${result['price']:.2f}"
+                    break
         except:
             pass
     
-    # === STRATEGY 3: CSS Heuristics ===
-    if not result['title']:
-        title_selectors = ['h1', '.product-title', '.product-name', '[itemprop="name"]', 'title']
-        for sel in title_selectors:
-            try:
-                el = page.query_selector(sel)
-                if el:
-                    text = el.inner_text().strip() if sel != 'title' else page.title()
-                    if text and len(text) > 3 and len(text) < 300:
-                        result['title'] = text
-                        break
-            except:
-                continue
-    
-    if not result['price']:
-        # Common price selectors
-        price_selectors = [
-            '[itemprop="price"]',
-            '.price',
-            '.product-price',
-            '.current-price',
-            '[data-price]',
-            '.amount',
-        ]
-        for sel in price_selectors:
-            try:
-                el = page.query_selector(sel)
-                if el:
-                    price_text = el.inner_text().strip()
-                    # Also try data-price attribute
-                    if not price_text:
-                        price_text = el.get_attribute('content') or el.get_attribute('data-price') or ''
-                    
-                    price_match = re.search(r'[\$€£]?\s*([\d,]+\.?\d*)', price_text)
-                    if price_match:
-                        result['price'] = float(price_match.group(1).replace(',', ''))
-                        result['priceRaw'] = f"${result['price']:.2f}"
-                        break
-            except:
-                continue
-        
-        # Last resort: regex search in page text
-        if not result['price']:
-            try:
-                body_text = page.inner_text('body')[:5000]
-                price_patterns = [
-                    r'\$\s*([\d,]+\.\d{2})',
-                    r'USD\s*([\d,]+\.\d{2})',
-                    r'Price[:\s]*([\d,]+\.\d{2})',
-                ]
-                for pattern in price_patterns:
-                    match = re.search(pattern, body_text)
-                    if match:
-                        result['price'] = float(match.group(1).replace(',', ''))
-                        result['priceRaw'] = f"${result['price']:.2f}"
-                        break
-            except:
-                pass
-    
-    if not result['image']:
-        image_selectors = [
-            '[itemprop="image"]',
-            '.product-image img',
-            '.gallery img',
-            '#product-image',
-            'img[src*="product"]',
-            'main img',
-        ]
-        for sel in image_selectors:
-            try:
-                el = page.query_selector(sel)
-                if el:
-                    img = el.get_attribute('src') or el.get_attribute('data-src')
-                    if img and img.startswith('http'):
-                        result['image'] = img
-                        break
-            except:
-                continue
-    
     return result
 
 
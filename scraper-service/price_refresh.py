@@ -0,0 +1,483 @@
+"""
+Native price-refresh scheduler for wishlist `items`
+The Vercel cron (app/api/cron/check-prices/route.ts) checks at most 56 items
+per invocation, so price coverage was capped by serverless time limits rather
+than by what the crawler can do. This runs inside the service instead:
+- a priority queue of items ordered by when they come due - the owner's tier
+  cooldown (6/12/24 h) after the last check, or sooner for products whose price
+  changes often (price_volatility.py), + 12 h per consecutive failure as in the
+  cron - most overdue first
+- due items are fed to the shared job queue continuously on the background lane,
+  never more than the domain's concurrency cap (domain_throttle.py) at once, so
+  one big retailer can't crowd out the rest and its rate limit still applies
+- refresh jobs carry the cached page's ETag/Last-Modified and fingerprint
+  (`products.meta`), so an unchanged page costs a 304 / skipped extraction
+- results are written back in bulk: one `items` update for the unchanged, one
+  call (bulk_update_item_prices) for every new price, one insert each for
+  `price_history` and notifications, one upsert of the refreshed `products`
+  rows; a write that fails is retried on a later tick, never dropped
+The cron stands down while PRICE_REFRESH_ENABLED is set, and both read the same
+cooldowns (price_check_cooldowns.json). Only one scheduler runs per box (file
+lock); enable it on one box only.
+"""
+import heapq
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+from domain_throttle import limits_for
+from extraction_rules import parse_price
+from job_store import STATUS_COMPLETED, FINISHED_STATUSES
+from pipelines import build_product_row
+from price_volatility import VOLATILITY_ENABLED, get_price_model, min_interval_hours
+from priority_lanes import PRIORITY_BACKGROUND
+from url_utils import registrable_domain
+from user_fairness import TIER_FREE, TIER_WEIGHTS
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+PRICE_REFRESH_ENABLED = os.environ.get('PRICE_REFRESH_ENABLED', 'false').lower() == 'true'
+# Refresh jobs queued or running at once (the background lane budget decides how many actually crawl)
+PRICE_REFRESH_MAX_IN_FLIGHT = int(os.environ.get('PRICE_REFRESH_MAX_IN_FLIGHT', 16))
+# How often due items are reloaded from Supabase, in seconds
+PRICE_REFRESH_RELOAD_SECONDS = float(os.environ.get('PRICE_REFRESH_RELOAD_SECONDS', 600))
+# Results are written once this many are waiting, or after PRICE_REFRESH_FLUSH_SECONDS
+PRICE_REFRESH_FLUSH_SIZE = int(os.environ.get('PRICE_REFRESH_FLUSH_SIZE', 50))
+PRICE_REFRESH_FLUSH_SECONDS = float(os.environ.get('PRICE_REFRESH_FLUSH_SECONDS', 30))
+
+# Cooldowns shared with the cron (app/api/cron/check-prices): higher tiers are checked more
+# often, everyone at least daily; each consecutive failed check pushes the next one back
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'price_check_cooldowns.json')) as _f:
+    _cooldowns = json.load(_f)
+TIER_COOLDOWN_HOURS = _cooldowns['tier_cooldown_hours']
+FAILURE_BACKOFF_HOURS = _cooldowns['failure_backoff_hours']
+
+# Prices closer than this are "unchanged" (as in the cron)
+PRICE_EPSILON = 0.01
+
+ITEM_COLUMNS = 'id, user_id, title, url, current_price, last_price_check, price_check_failures, out_of_stock'
+# Rows per Supabase request when loading due items
+PAGE_SIZE = 1000
+# URLs per request when looking up cached pages
+LOOKUP_BATCH_SIZE = 100
+# First wait before retrying a failed write, doubled per failure up to the max
+WRITE_RETRY_SECONDS = 5
+MAX_WRITE_RETRY_SECONDS = 300
+# PostgREST's "function not found" - bulk_update_item_prices not deployed yet
+PGRST_FUNCTION_NOT_FOUND = 'PGRST202'
+LOCK_PATH = os.path.join(tempfile.gettempdir(), 'wist-price-refresh.lock')
+
+
+def parse_timestamp(value):
+    """Epoch seconds for a Supabase timestamptz string, None if empty"""
+    if not value:
+        return None
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+
+
+def iso_timestamp(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def tier_cooldown_hours(tier):
+    return TIER_COOLDOWN_HOURS.get(tier, TIER_COOLDOWN_HOURS[TIER_FREE])
+
+
+def refresh_due_at(item, model=None):
+    """When an item next needs a price check (0 = never checked, due now)"""
+    last_check = parse_timestamp(item.get('last_price_check'))
+    if last_check is None:
+        return 0.0
+    cooldown = tier_cooldown_hours(item.get('tier'))
+    hours = model.interval_hours(item['url'], item.get('tier'), cooldown) if model else None
+    if hours is None:
+        hours = cooldown
+    hours += (item.get('price_check_failures') or 0) * FAILURE_BACKOFF_HOURS
+    return last_check + hours * 3600
+
+
+class PriceRefreshScheduler:
+    """
+    Keeps due items flowing through the job queue and writes their results back
+    One background thread: reload due items, collect finished jobs, flush writes,
+    dispatch more - all on a one-second tick
+    """
+
+    def __init__(self, supabase, jobs):
+        self.supabase = supabase
+        self.jobs = jobs
+        self.model = get_price_model()
+        # (due_at, tier rank, seq, item) - tier breaks ties in favour of higher tiers
+        self._queue = []
+        self._seq = itertools.count()
+        # job_id → item, and running jobs per domain
+        self._in_flight = {}
+        self._domains = Counter()
+        # (item, price or None, products row or None) waiting to be written
+        self._results = []
+        self._oldest_result = None
+        # (description, write, item ids) planned but not written yet - the first one failed last time
+        self._writes = []
+        self._write_failures = 0
+        self._retry_at = 0.0
+        # False once bulk_update_item_prices turned out to be missing
+        self._bulk_prices = True
+        self._next_reload = 0.0
+        self.checked = 0
+        self.updated = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        print("⏰ Price refresh scheduler started")
+        while True:
+            try:
+                self._tick()
+            except Exception as e:
+                print(f"⚠️  Price refresh error: {e}")
+            time.sleep(1)
+
+    def _tick(self):
+        self._collect()
+        if self._results and (len(self._results) >= PRICE_REFRESH_FLUSH_SIZE or
+                              time.time() - self._oldest_result >= PRICE_REFRESH_FLUSH_SECONDS):
+            self._flush()
+        elif self._writes and time.time() >= self._retry_at:
+            self._flush()
+        if time.time() >= self._next_reload:
+            # Write pending results first so just-checked items don't look due again
+            self._flush()
+            self._reload()
+            self._next_reload = time.time() + PRICE_REFRESH_RELOAD_SECONDS
+        self._dispatch()
+
+    # --- Loading due items -------------------------------------------------
+
+    def _fetch_page(self, cutoff, start, with_tier):
+        columns = ITEM_COLUMNS + (', profiles!items_user_id_fkey(subscription_tier)' if with_tier else '')
+        response = (
+            self.supabase.table('items')
+            .select(columns)
+            .not_.is_('url', 'null')
+            .eq('status', 'active')
+            .or_(f'last_price_check.is.null,last_price_check.lt.{iso_timestamp(cutoff)}')
+            .order('last_price_check', nullsfirst=True)
+            .range(start, start + PAGE_SIZE - 1)
+            .execute()
+        )
+        return response.data or []
+
+    def _load_due_items(self):
+        """Every active item that may come due before the next reload, with its owner's tier"""
+        # Nothing checked more recently than the shortest interval can be due
+        shortest = min(TIER_COOLDOWN_HOURS.values())
+        if VOLATILITY_ENABLED:
+            shortest = min(shortest, min_interval_hours())
+        cutoff = time.time() + PRICE_REFRESH_RELOAD_SECONDS - shortest * 3600
+        with_tier = True
+        items = []
+        start = 0
+        while True:
+            try:
+                rows = self._fetch_page(cutoff, start, with_tier)
+            except Exception as e:
+                if not with_tier:
+                    raise
+                # Same fallback as the cron: no profiles join, everyone on the free cooldown
+                print(f"⚠️  Price refresh: tier join failed ({e}), loading items without tiers")
+                with_tier = False
+                continue
+            for row in rows:
+                profile = row.pop('profiles', None)
+                if isinstance(profile, list):
+                    profile = profile[0] if profile else None
+                row['tier'] = (profile or {}).get('subscription_tier') or TIER_FREE
+                items.append(row)
+            if len(rows) < PAGE_SIZE:
+                return items
+            start += PAGE_SIZE
+
+    def _reload(self):
+        if VOLATILITY_ENABLED:
+            try:
+                self.model.load(self.supabase)
+            except Exception as e:
+                # Intervals fall back to what the model already knows (or tier cooldowns)
+                print(f"⚠️  Price refresh: loading price history failed: {e}")
+        items = self._load_due_items()
+        with self._lock:
+            # Checked but not written yet: Supabase still has the old last_price_check
+            busy = {item['id'] for item in self._in_flight.values()}
+            busy.update(item_id for _, _, item_ids in self._writes for item_id in item_ids)
+            self._queue = [
+                (refresh_due_at(item, self.model), -TIER_WEIGHTS.get(item['tier'], 1), next(self._seq), item)
+                for item in items if item['id'] not in busy
+            ]
+            heapq.heapify(self._queue)
+        print(f"⏰ Price refresh: {len(self._queue)} items queued, {self.due_count()} due now")
+
+    def due_count(self):
+        now = time.time()
+        with self._lock:
+            return sum(1 for entry in self._queue if entry[0] <= now)
+
+    # --- Feeding the crawler -----------------------------------------------
+
+    def _dispatch(self):
+        """Queue due items up to the in-flight cap, skipping domains already at their concurrency cap"""
+        now = time.time()
+        skipped = []
+        picked = []
+        with self._lock:
+            while self._queue and len(self._in_flight) + len(picked) < PRICE_REFRESH_MAX_IN_FLIGHT and \
+                    self._queue[0][0] <= now:
+                entry = heapq.heappop(self._queue)
+                domain = registrable_domain(entry[3]['url'])
+                if self._domains[domain] >= int(limits_for(domain)['concurrency']):
+                    skipped.append(entry)
+                    continue
+                picked.append(entry[3])
+                self._domains[domain] += 1
+            for entry in skipped:
+                heapq.heappush(self._queue, entry)
+        if not picked:
+            return
+
+        pages = self._cached_pages([item['url'] for item in picked])
+        for index, item in enumerate(picked):
+            page = pages.get(item['url']) or {}
+            meta = page.get('meta') or {}
+            job_id = str(uuid.uuid4())
+            try:
+                # Revalidate against the cached page: a 304 / same fingerprint skips the fetch or the extraction
+                self.jobs.enqueue(job_id, item['url'], priority=PRIORITY_BACKGROUND, tier=item['tier'],
+                                  item_id=item['id'], validators=meta.get('validators'),
+                                  fingerprint=meta.get('fingerprint'))
+            except Exception:
+                # This and the rest are still due - back in line for the next tick
+                with self._lock:
+                    for unsent in picked[index:]:
+                        self._domains[registrable_domain(unsent['url'])] -= 1
+                        heapq.heappush(self._queue,
+                                       (now, -TIER_WEIGHTS.get(unsent['tier'], 1), next(self._seq), unsent))
+                raise
+            with self._lock:
+                self._in_flight[job_id] = dict(item, cached_price=page.get('price'))
+
+    def _cached_pages(self, urls):
+        """url → `products` row (price, meta) of the last scrape; best effort, {} if unavailable"""
+        pages = {}
+        unique = list(dict.fromkeys(urls))
+        for i in range(0, len(unique), LOOKUP_BATCH_SIZE):
+            try:
+                rows = (
+                    self.supabase.table('products')
+                    .select('url, price, meta')
+                    .in_('url', unique[i:i + LOOKUP_BATCH_SIZE])
+                    .execute()
+                ).data or []
+            except Exception as e:
+                print(f"⚠️  Price refresh: cached page lookup failed ({e}), refreshing without validators")
+                return pages
+            pages.update((row['url'], row) for row in rows)
+        return pages
+
+    def _collect(self):
+        """Pick up finished refresh jobs"""
+        with self._lock:
+            in_flight = list(self._in_flight.items())
+        for job_id, item in in_flight:
+            job = self.jobs.get(job_id)
+            if job is not None and job['status'] not in FINISHED_STATUSES:
+                continue
+            price = None
+            page = None
+            if job is not None and job['status'] == STATUS_COMPLETED:
+                if job.get('not_modified'):
+                    # Page unchanged since the cached scrape - so is its price
+                    price = parse_price(item.get('cached_price') or '') or item.get('current_price')
+                elif job.get('data'):
+                    price = parse_price(job['data'].get('price') or '')
+                    # Fresh validators/fingerprint for the next refresh of this page
+                    page = build_product_row(item['url'], job['data'], 'price_refresh')
+            with self._lock:
+                del self._in_flight[job_id]
+                self._domains[registrable_domain(item['url'])] -= 1
+                if not self._results:
+                    self._oldest_result = time.time()
+                self._results.append((item, price, page))
+
+    # --- Writing results ---------------------------------------------------
+
+    def _flush(self):
+        """Plan the waiting results as bulk writes and send every write still pending"""
+        with self._lock:
+            results, self._results = self._results, []
+        if results:
+            writes = self._plan_writes(results)
+            with self._lock:
+                self._writes.extend(writes)
+        while self._writes:
+            description, write, _ = self._writes[0]
+            try:
+                write()
+            except Exception as e:
+                # Kept (with its items held back from dispatch) and retried - never dropped
+                delay = min(MAX_WRITE_RETRY_SECONDS, WRITE_RETRY_SECONDS * 2 ** self._write_failures)
+                self._write_failures += 1
+                self._retry_at = time.time() + delay
+                print(f"⚠️  Price refresh: writing {description} failed, retrying in {delay:.0f}s: {e}")
+                return
+            with self._lock:
+                self._writes.pop(0)
+            self._write_failures = 0
+
+    def _plan_writes(self, results):
+        """The cron's writes for a batch of results, in as few requests as possible"""
+        now = iso_timestamp(time.time())
+        unchanged = []
+        failures = {}
+        changed = []
+        pages = {}
+        history = []
+        notifications = []
+
+        for item, price, page in results:
+            if page:
+                pages[page['url']] = page
+            if not price:
+                count = (item.get('price_check_failures') or 0) + 1
+                failures.setdefault(count, []).append(item['id'])
+                continue
+            old_price = float(item.get('current_price') or 0)
+            history.append({'item_id': item['id'], 'price': price})
+            if item.get('out_of_stock') and item.get('user_id'):
+                notifications.append(notification(item, 'back_in_stock', 0, price))
+            if abs(price - old_price) <= PRICE_EPSILON and not item.get('out_of_stock'):
+                unchanged.append(item['id'])
+                continue
+            changed.append((item['id'], price))
+            if old_price > 0 and abs(price - old_price) > PRICE_EPSILON and item.get('user_id'):
+                kind = 'price_drop' if price < old_price else 'price_increase'
+                notifications.append(notification(item, kind, old_price, price))
+
+        checked = {'last_price_check': now, 'updated_at': now, 'price_check_failures': 0}
+        table = self.supabase.table
+        writes = []
+        if unchanged:
+            writes.append((f"{len(unchanged)} unchanged items", lambda: (
+                table('items').update(checked).in_('id', unchanged).execute()), unchanged))
+        if changed:
+            writes.append((f"{len(changed)} new prices", lambda: self._update_prices(changed, checked),
+                           [item_id for item_id, _ in changed]))
+        for count, ids in failures.items():
+            writes.append((f"{len(ids)} failed checks", lambda count=count, ids=ids: (
+                table('items').update({'last_price_check': now, 'price_check_failures': count})
+                .in_('id', ids).execute()), ids))
+        if history:
+            writes.append((f"{len(history)} price_history rows", lambda: (
+                table('price_history').insert(history).execute()), []))
+        if notifications:
+            writes.append((f"{len(notifications)} notifications", lambda: (
+                table('notification_queue').insert(notifications).execute()), []))
+        if pages:
+            writes.append((f"{len(pages)} products rows", lambda: (
+                table('products').upsert(list(pages.values()), on_conflict='url').execute()), []))
+
+        failed = sum(len(ids) for ids in failures.values())
+        self.checked += len(results)
+        self.updated += len(changed)
+        self.failed += failed
+        print(f"💾 Price refresh: writing {len(results)} checks ({len(changed)} price changes, "
+              f"{failed} failures, {len(notifications)} notifications)")
+        return writes
+
+    def _update_prices(self, changed, checked):
+        """New prices for many items in one call; one update per distinct price until the function exists"""
+        if self._bulk_prices:
+            try:
+                self.supabase.rpc('bulk_update_item_prices', {
+                    '_updates': [{'id': item_id, 'price': price} for item_id, price in changed],
+                    '_checked_at': checked['last_price_check'],
+                }).execute()
+                return
+            except Exception as e:
+                if getattr(e, 'code', None) != PGRST_FUNCTION_NOT_FOUND:
+                    raise
+                print("⚠️  Price refresh: bulk_update_item_prices is missing (apply "
+                      "supabase/migrations/20261019_bulk_update_item_prices.sql), updating per price")
+                self._bulk_prices = False
+        by_price = {}
+        for item_id, price in changed:
+            by_price.setdefault(price, []).append(item_id)
+        for price, ids in by_price.items():
+            # Also clears out_of_stock - a price means it's back, notify once
+            self.supabase.table('items').update(dict(checked, current_price=price, out_of_stock=False)) \
+                .in_('id', ids).execute()
+
+    def snapshot(self):
+        with self._lock:
+            queued = len(self._queue)
+            in_flight = len(self._in_flight)
+            pending_writes = len(self._results)
+            retrying_writes = len(self._writes)
+        return {'queued': queued, 'due': self.due_count(), 'in_flight': in_flight,
+                'pending_writes': pending_writes, 'retrying_writes': retrying_writes, 'checked': self.checked,
+                'updated': self.updated, 'failed': self.failed, 'volatility': self.model.snapshot()}
+
+
+def notification(item, kind, old_price, new_price):
+    """notification_queue row, as lib/notifications/queue-helpers.ts writes them"""
+    change = (new_price - old_price) / old_price * 100 if old_price else 0
+    return {
+        'user_id': item['user_id'],
+        'item_id': item['id'],
+        'notification_type': kind,
+        'old_price': old_price,
+        'new_price': new_price,
+        'price_change_percent': change,
+        'sent': False,
+    }
+
+
+_scheduler = None
+_lock_file = None
+
+
+def start_price_refresh(supabase, jobs):
+    """
+    Start this box's scheduler if PRICE_REFRESH_ENABLED - returns it, or None when
+    disabled, Supabase isn't configured or another worker on the box holds the lock
+    """
+    global _scheduler, _lock_file
+    if not PRICE_REFRESH_ENABLED or supabase is None or _scheduler is not None:
+        return _scheduler
+    if FCNTL_AVAILABLE:
+        lock = open(LOCK_PATH, 'w')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return None
+        # Held for the life of the process
+        _lock_file = lock
+    _scheduler = PriceRefreshScheduler(supabase, jobs)
+    _scheduler.start()
+    return _scheduler
+
+
+def get_price_refresh():
+    return _scheduler
@@ -0,0 +1,261 @@
+"""
+Volatility-aware refresh intervals from `price_history`
+Every item of a tier used to be re-checked on the same fixed cooldown, whether
+its price hadn't moved in months or changed daily. This estimates how often
+each product's price changes and spaces its checks accordingly:
+- every stored check is an observation; consecutive checks of an item give an
+  interval and whether the price changed during it
+- per canonical product (shared by every user tracking it) the share of
+  intervals with a change and their length are decayed averages, recent
+  behaviour counting most, smoothed towards the product's whole domain so
+  products with little history still get a reasonable guess
+- changes per day follow from those as a Poisson rate, which also accounts for
+  several changes hiding between two checks
+- the next check is due once TARGET_CHANGES changes are expected, between the
+  tier's shortest interval and its cooldown: volatile products are checked more
+  often, none less often than before; products without history of their own
+  keep the tier cooldown
+History is loaded incrementally: the first load reads the decayed per-item
+totals of HISTORY_DAYS, aggregated in the database (price_change_stats), later
+ones only rows added since - only totals per item/product/domain are kept.
+"""
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from url_utils import canonicalize_url, registrable_domain
+
+VOLATILITY_ENABLED = os.environ.get('VOLATILITY_ENABLED', 'true').lower() == 'true'
+# Changes this old count half as much as today's
+VOLATILITY_HALF_LIFE_DAYS = float(os.environ.get('VOLATILITY_HALF_LIFE_DAYS', 30))
+# History read on the first load
+HISTORY_DAYS = 90
+# Check again once this many price changes are expected since the last check
+TARGET_CHANGES = 0.5
+# Weight of the domain's behaviour in a product's estimate, in checks
+PRIOR_CHECKS = 5
+# A change seen at every check only bounds the rate from below - cap the share so it stays finite
+MAX_CHANGE_SHARE = 0.95
+# Same threshold the refresh uses for "price changed"
+CHANGE_EPSILON = 0.01
+
+# Shortest interval between checks per tier, in hours (the longest is the tier cooldown);
+# VOLATILITY_MIN_HOURS (JSON) overrides
+DEFAULT_TIER_MIN_HOURS = {'creator': 2, 'enterprise': 2, 'pro_plus': 4, 'pro': 4, 'free': 12}
+TIER_MIN_HOURS = dict(DEFAULT_TIER_MIN_HOURS, **json.loads(os.environ.get('VOLATILITY_MIN_HOURS') or '{}'))
+
+# Rows per Supabase request when loading history
+PAGE_SIZE = 1000
+# PostgREST's "function not found" - price_change_stats not deployed yet
+PGRST_FUNCTION_NOT_FOUND = 'PGRST202'
+
+
+def product_key(url):
+    return canonicalize_url(url)
+
+
+def poisson_rate(changes, checks, days):
+    """Changes per day given the intervals seen, how many of them had a change and how long they were"""
+    share = min(changes / checks, MAX_CHANGE_SHARE)
+    return -math.log(1 - share) * checks / days
+
+
+class DecayedRate:
+    """Intervals between checks, those with a price change and their days, decayed with VOLATILITY_HALF_LIFE_DAYS"""
+
+    __slots__ = ('changes', 'checks', 'days', 'updated_at')
+
+    def __init__(self):
+        self.changes = 0.0
+        self.checks = 0.0
+        self.days = 0.0
+        self.updated_at = None
+
+    def _decay(self, now):
+        if self.updated_at is None or now <= self.updated_at:
+            return 1.0
+        return 0.5 ** ((now - self.updated_at) / 86400 / VOLATILITY_HALF_LIFE_DAYS)
+
+    def add(self, at, days, changed):
+        self.merge(at, 1 if changed else 0, 1, days)
+
+    def merge(self, at, changes, checks, days):
+        """Add totals already decayed to time `at`"""
+        factor = self._decay(at)
+        self.changes = self.changes * factor + changes
+        self.checks = self.checks * factor + checks
+        self.days = self.days * factor + days
+        self.updated_at = max(at, self.updated_at or at)
+
+    def totals(self, now):
+        factor = self._decay(now)
+        return self.changes * factor, self.checks * factor, self.days * factor
+
+
+class PriceModel:
+    """Change-rate estimates per canonical product and per domain (thread-safe)"""
+
+    def __init__(self):
+        # item_id → (price, time) of its latest check
+        self._last = {}
+        self._products = {}
+        self._domains = {}
+        # created_at of the newest history row read so far
+        self._watermark = None
+        self._lock = threading.Lock()
+
+    def observe(self, item_id, url, price, at):
+        """One stored check of an item"""
+        with self._lock:
+            last = self._last.get(item_id)
+            if last is not None and at < last[1]:
+                return
+            self._last[item_id] = (price, at)
+            if last is None or at == last[1]:
+                return
+            days = (at - last[1]) / 86400
+            changed = abs(price - last[0]) > CHANGE_EPSILON
+            for rate in self._rates(url):
+                rate.add(at, days, changed)
+
+    def observe_totals(self, item_id, url, totals, last_price, last_at, at):
+        """An item's history as decayed totals (changes, checks, days) as of `at`, plus its latest check"""
+        with self._lock:
+            self._last[item_id] = (last_price, last_at)
+            if totals[1] <= 0:
+                return
+            for rate in self._rates(url):
+                rate.merge(at, *totals)
+
+    def _rates(self, url):
+        """The product's and the domain's DecayedRate (caller holds the lock)"""
+        for table, key in ((self._products, product_key(url)), (self._domains, registrable_domain(url))):
+            rate = table.get(key)
+            if rate is None:
+                rate = table[key] = DecayedRate()
+            yield rate
+
+    def load(self, supabase):
+        """
+        Bring the model up to date: the first load takes HISTORY_DAYS as per-item
+        totals, later ones read the price_history rows added since; returns rows read
+        """
+        if self._watermark is None:
+            since = (datetime.now(timezone.utc) - timedelta(days=HISTORY_DAYS)).isoformat()
+            try:
+                return self._load_totals(supabase, since)
+            except Exception as e:
+                if getattr(e, 'code', None) != PGRST_FUNCTION_NOT_FOUND:
+                    raise
+                print("⚠️  Volatility: price_change_stats is missing (apply "
+                      "supabase/migrations/20261019_price_change_stats.sql), reading raw history")
+            return self._load_rows(supabase, since)
+        return self._load_rows(supabase, self._watermark)
+
+    def _load_totals(self, supabase, since):
+        """Decayed per-item totals since `since`, aggregated in the database"""
+        now = time.time()
+        start = 0
+        loaded = 0
+        watermark = None
+        while True:
+            rows = (
+                supabase.rpc('price_change_stats', {
+                    '_since': since,
+                    '_half_life_days': VOLATILITY_HALF_LIFE_DAYS,
+                    '_epsilon': CHANGE_EPSILON,
+                })
+                .order('item_id')
+                .range(start, start + PAGE_SIZE - 1)
+                .execute()
+            ).data or []
+            for row in rows:
+                if not row.get('url') or row.get('last_price') is None:
+                    continue
+                last_at = datetime.fromisoformat(row['last_checked_at'].replace('Z', '+00:00')).timestamp()
+                totals = (float(row['changes']), float(row['checks']), float(row['days']))
+                self.observe_totals(row['item_id'], row['url'], totals, float(row['last_price']), last_at, now)
+                if watermark is None or row['last_checked_at'] > watermark:
+                    watermark = row['last_checked_at']
+            loaded += len(rows)
+            if len(rows) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+        self._watermark = watermark or datetime.fromtimestamp(now, timezone.utc).isoformat()
+        return loaded
+
+    def _load_rows(self, supabase, since):
+        """Read price_history rows added after `since` one by one"""
+        start = 0
+        loaded = 0
+        while True:
+            rows = (
+                supabase.table('price_history')
+                .select('item_id, price, created_at, items(url)')
+                .gt('created_at', since)
+                .order('created_at')
+                .range(start, start + PAGE_SIZE - 1)
+                .execute()
+            ).data or []
+            for row in rows:
+                item = row.get('items')
+                if isinstance(item, list):
+                    item = item[0] if item else None
+                if item and item.get('url') and row.get('price') is not None:
+                    at = datetime.fromisoformat(row['created_at'].replace('Z', '+00:00')).timestamp()
+                    self.observe(row['item_id'], item['url'], float(row['price']), at)
+                self._watermark = row['created_at']
+            loaded += len(rows)
+            if len(rows) < PAGE_SIZE:
+                return loaded
+            start += PAGE_SIZE
+
+    def change_rate(self, url, now=None):
+        """Estimated price changes per day for a product URL, None without history of the product itself"""
+        now = now or time.time()
+        with self._lock:
+            product = self._products.get(product_key(url))
+            if product is None:
+                return None
+            changes, checks, days = product.totals(now)
+            domain_changes, domain_checks, domain_days = self._domains[registrable_domain(url)].totals(now)
+        if days <= 0:
+            return None
+        # The domain's average counts as PRIOR_CHECKS extra intervals
+        weight = PRIOR_CHECKS / domain_checks
+        return poisson_rate(changes + domain_changes * weight, checks + PRIOR_CHECKS, days + domain_days * weight)
+
+    def interval_hours(self, url, tier, cooldown_hours, now=None):
+        """
+        Hours between checks for this product on this tier - never more than the
+        tier's cooldown - or None if there's no history of the product to go on
+        """
+        if not VOLATILITY_ENABLED:
+            return None
+        rate = self.change_rate(url, now)
+        if rate is None:
+            return None
+        if rate <= 0:
+            return cooldown_hours
+        low = TIER_MIN_HOURS.get(tier, TIER_MIN_HOURS['free'])
+        return min(cooldown_hours, max(low, TARGET_CHANGES / rate * 24))
+
+    def snapshot(self):
+        with self._lock:
+            return {'enabled': VOLATILITY_ENABLED, 'items': len(self._last),
+                    'products': len(self._products), 'domains': len(self._domains)}
+
+
+def min_interval_hours():
+    """Shortest interval any item can get (for deciding which items may be due soon)"""
+    return min(TIER_MIN_HOURS.values())
+
+
+_price_model = PriceModel()
+
+
+def get_price_model():
+    return _price_model
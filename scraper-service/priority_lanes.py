@@ -0,0 +1,104 @@
+"""
+Priority lanes: interactive scrapes vs imports vs background refreshes
+Callers tag each request with a priority class. Every class has its own
+concurrency budget per worker, so a cron refreshing hundreds of prices can
+only ever occupy the background lane's slots - an "add item" scrape never
+queues behind it. Scheduling is preemption-free: running jobs are never
+interrupted; each lane has its own queue workers and slots. Inside the
+crawler the scheduler picks the least busy domain first (DownloaderAwarePriorityQueue)
+and only then the most urgent request of that domain, so lanes are ordered per
+domain, not globally - a background refresh of an idle shop can still start
+before an interactive scrape of a busy retailer.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_BATCH = 'batch'
+PRIORITY_BACKGROUND = 'background'
+
+# Highest priority first
+LANES = (PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_BACKGROUND)
+
+# Jobs each lane may run at once per worker; LANE_BUDGETS (JSON) overrides, e.g. {"background": 4}
+DEFAULT_LANE_BUDGETS = {PRIORITY_INTERACTIVE: 8, PRIORITY_BATCH: 3, PRIORITY_BACKGROUND: 2}
+LANE_BUDGETS = dict(DEFAULT_LANE_BUDGETS, **json.loads(os.environ.get('LANE_BUDGETS') or '{}'))
+
+# Scrapy Request.priority per lane - among one domain's requests the crawler dequeues higher values first
+SCRAPY_PRIORITY = {PRIORITY_INTERACTIVE: 100, PRIORITY_BATCH: 10, PRIORITY_BACKGROUND: 0}
+
+
+def parse_priority(value, default=PRIORITY_INTERACTIVE):
+    """Lane for a caller-supplied priority tag; ValueError for unknown tags"""
+    if value is None or value == '':
+        return default
+    lane = str(value).strip().lower()
+    if lane not in LANES:
+        raise ValueError(f"priority must be one of: {', '.join(LANES)}")
+    return lane
+
+
+def lane_rank(lane):
+    """0 for the most urgent lane - used to order queue claims"""
+    return LANES.index(lane) if lane in LANES else len(LANES)
+
+
+class LaneBudgets:
+    """Per-process in-flight counters with a separate cap per lane (thread-safe)"""
+
+    def __init__(self, budgets):
+        self.budgets = budgets
+        self._in_flight = {lane: 0 for lane in LANES}
+        self._freed = threading.Condition()
+
+    def try_acquire(self, lane):
+        with self._freed:
+            if self._in_flight[lane] >= self.budgets[lane]:
+                return False
+            self._in_flight[lane] += 1
+            return True
+
+    def release(self, lane):
+        with self._freed:
+            self._in_flight[lane] -= 1
+            self._freed.notify_all()
+
+    def acquire(self, lane, timeout):
+        """Wait up to timeout for a slot in this lane; True if one was taken"""
+        deadline = time.time() + timeout
+        with self._freed:
+            while self._in_flight[lane] >= self.budgets[lane]:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._freed.wait(remaining)
+            self._in_flight[lane] += 1
+            return True
+
+    @contextmanager
+    def slot(self, lane, timeout):
+        """Hold a slot of this lane for the body; yields False if none freed up in time"""
+        if not self.acquire(lane, timeout):
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            self.release(lane)
+
+    def total(self):
+        return sum(self.budgets[lane] for lane in LANES)
+
+    def snapshot(self):
+        with self._freed:
+            return {lane: {'in_flight': self._in_flight[lane], 'budget': self.budgets[lane]} for lane in LANES}
+
+
+_lane_budgets = LaneBudgets(LANE_BUDGETS)
+
+
+def get_lane_budgets():
+    return _lane_budgets
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Offline re-extraction over the HTML archive
+Re-runs the current ProductSpider extractors over archived page bodies on every
+core (no network), then bulk-upserts the products whose data changed.
+Use after fixing selectors instead of waiting for live re-scrapes.
+
+Usage:
+    python reextract.py [--domain amazon.com] [--since-hours 72] [--workers 8] [--dry-run]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+from html_archive import get_archive
+from pipelines import build_product_row
+
+# Columns compared against the current cache row to decide if a product changed
+COMPARED_COLUMNS = ['title', 'price', 'price_raw', 'image', 'description']
+
+UPSERT_BATCH_SIZE = 500
+LOOKUP_BATCH_SIZE = 100
+# Failed pages listed in the summary (all of them are counted)
+MAX_REPORTED_FAILURES = 20
+
+
+def _init_worker(verbose):
+    # The extractors print per page - keep tens of thousands of pages quiet
+    # (failures come back to the parent, see reextract_entry)
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+
+
+def reextract_entry(entry):
+    """
+    Worker: load one archived body and run the extractors over it
+    Returns (url, item, error) - item is None when nothing could be extracted,
+    error says why the page failed (None if it simply had no product data)
+    """
+    from scrapy.http import HtmlResponse, Request
+    from spiders.product_spider import ProductSpider
+
+    archive = get_archive()
+    body = archive.load(entry['sha256']) if archive else None
+    if not body:
+        return entry['url'], None, "archived body missing"
+
+    try:
+        spider = ProductSpider(url=entry['url'])
+        response = HtmlResponse(
+            url=entry['final_url'] or entry['url'],
+            body=body,
+            encoding='utf-8',
+            request=Request(entry['url']),
+        )
+        return entry['url'], spider.extract_product(response), None
+    except Exception as e:
+        return entry['url'], None, f"{type(e).__name__}: {e}"
+
+
+def get_supabase():
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_KEY") or os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not key:
+        return None
+    from supabase import create_client
+    return create_client(url, key)
+
+
+def _load_current_rows(supabase, urls):
+    current = {}
+    for i in range(0, len(urls), LOOKUP_BATCH_SIZE):
+        batch = urls[i:i + LOOKUP_BATCH_SIZE]
+        columns = ['url', 'meta'] + COMPARED_COLUMNS
+        response = supabase.table('products').select(','.join(columns)).in_('url', batch).execute()
+        for row in response.data or []:
+            current[row['url']] = row
+    return current
+
+
+def snapshot_row(url, item, fetched_at):
+    """
+    products row for an item re-extracted from a snapshot: as fresh as the
+    snapshot, not the re-extraction, so the cache doesn't serve an old price as new
+    """
+    row = build_product_row(url, item, "reextract")
+    fetched = datetime.fromtimestamp(fetched_at, timezone.utc)
+    row['last_scraped'] = fetched.isoformat().replace('+00:00', 'Z')
+    row['meta']['scraped_at'] = fetched.replace(tzinfo=None).isoformat()
+    return row
+
+
+def merge_meta(row, current):
+    """
+    Keep the stored meta (validators and fingerprint of the last live fetch drive
+    conditional refreshes) - an archived body carries neither
+    """
+    if current and current.get('meta'):
+        row['meta'] = dict(current['meta'], reextracted_at=datetime.utcnow().isoformat())
+    return row
+
+
+def _changed(row, current):
+    if not current:
+        return True
+    return any(str(row.get(col) or '') != str(current.get(col) or '') for col in COMPARED_COLUMNS)
+
+
+def run_reextraction(domain=None, since=None, workers=None, dry_run=False, limit=None, verbose=False, output=None):
+    """
+    Re-extract the latest archived snapshot of every product and upsert the changes
+    Snapshots cut short by the streaming early-exit are skipped (see html_archive.py)
+    Returns a summary dict (scanned / skipped_truncated / extracted / changed / upserted / seconds)
+    """
+    archive = get_archive()
+    if archive is None:
+        raise RuntimeError("HTML_ARCHIVE_DIR is not set - nothing to re-extract")
+
+    started = time.time()
+    entries = list(archive.iter_latest(domain=domain, since=since))
+    # Products only ever fetched with the streaming early-exit: a partial page would blank
+    # fields that live further down, so they're left alone
+    complete = {entry['canonical_url'] for entry in entries}
+    truncated_only = sum(
+        1 for entry in archive.iter_latest(domain=domain, since=since, include_truncated=True)
+        if entry['canonical_url'] not in complete
+    )
+    if truncated_only:
+        print(f"⏭️  Skipping {truncated_only} products with only truncated snapshots")
+    if limit:
+        entries = entries[:limit]
+
+    workers = workers or os.cpu_count() or 1
+    print(f"🔁 Re-extracting {len(entries)} archived pages on {workers} workers...")
+
+    rows = []
+    failures = []
+    # spawn: the Flask process has live reactor threads, forking those is unsafe
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(verbose,)) as pool:
+        chunksize = max(1, len(entries) // (workers * 8))
+        results = pool.map(reextract_entry, entries, chunksize=chunksize)
+        for entry, (url, item, error) in zip(entries, results):
+            if item:
+                rows.append(snapshot_row(url, item, entry['fetched_at']))
+            elif error:
+                print(f"❌ Re-extraction failed for {url}: {error}")
+                failures.append({"url": url, "error": error})
+
+    print(f"✅ Extracted {len(rows)}/{len(entries)} pages, comparing against the cache...")
+
+    supabase = get_supabase()
+    if supabase:
+        current = _load_current_rows(supabase, [row['url'] for row in rows])
+        changed = [merge_meta(row, current.get(row['url'])) for row in rows if _changed(row, current.get(row['url']))]
+    else:
+        print("⚠️  Supabase not configured - treating every extracted page as changed")
+        changed = rows
+
+    if output:
+        with open(output, 'w') as f:
+            for row in changed:
+                f.write(json.dumps(row) + '\n')
+
+    upserted = 0
+    if supabase and not dry_run:
+        for i in range(0, len(changed), UPSERT_BATCH_SIZE):
+            batch = changed[i:i + UPSERT_BATCH_SIZE]
+            try:
+                supabase.table('products').upsert(batch, on_conflict='url').execute()
+                upserted += len(batch)
+            except Exception as e:
+                print(f"❌ Bulk upsert failed for batch {i // UPSERT_BATCH_SIZE}: {e}")
+
+    summary = {
+        "scanned": len(entries),
+        "skipped_truncated": truncated_only,
+        "extracted": len(rows),
+        "failed": len(failures),
+        "failures": failures[:MAX_REPORTED_FAILURES],
+        "changed": len(changed),
+        "upserted": upserted,
+        "dry_run": dry_run,
+        "seconds": round(time.time() - started, 1),
+    }
+    print(f"📦 Re-extraction done: {summary}")
+    return summary
+
+
+if __name__ == '__main__':
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Re-run the extractors over archived HTML")
+    parser.add_argument('--domain', help="Only pages whose canonical URL contains this domain")
+    parser.add_argument('--since-hours', type=float, help="Only snapshots fetched in the last N hours")
+    parser.add_argument('--workers', type=int, help="Process pool size (default: all cores)")
+    parser.add_argument('--limit', type=int, help="Stop after N pages")
+    parser.add_argument('--dry-run', action='store_true', help="Compute changes but don't write to Supabase")
+    parser.add_argument('--output', help="Also write changed rows to this JSONL file")
+    parser.add_argument('--verbose', action='store_true', help="Show per-page extractor logs")
+    args = parser.parse_args()
+
+    since = time.time() - args.since_hours * 3600 if args.since_hours else None
+    run_reextraction(
+        domain=args.domain,
+        since=since,
+        workers=args.workers,
+        dry_run=args.dry_run,
+        limit=args.limit,
+        verbose=args.verbose,
+        output=args.output,
+    )
@@ -0,0 +1,182 @@
+"""
+Shared retry policy: classified failures, jittered backoff, a global retry budget
+Retries used to be ad hoc - Playwright slept a fixed 2 s between page.goto
+attempts, Scrapy retried immediately with its defaults and captcha pages got no
+backoff at all - so during a retailer incident every engine kept hammering it.
+Every engine now asks one policy:
+- failures are classified (timeout, 5xx, 429, block page, parse miss) and each
+  class has its own retry count and jittered exponential backoff
+- a failing domain is paused for every engine (its token bucket, see
+  domain_throttle.py), longer with each failure in a row
+- retries are paid from a global budget that only refills as first attempts are
+  made, so retries stay a bounded share of traffic however bad things get
+Scrapy retries wait in the reactor (DomainThrottleMiddleware), never on a thread.
+"""
+import json
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from domain_throttle import get_throttle
+from url_utils import registrable_domain
+
+FAILURE_TIMEOUT = 'timeout'
+FAILURE_SERVER_ERROR = 'server_error'
+FAILURE_RATE_LIMITED = 'rate_limited'
+FAILURE_BLOCKED = 'blocked'
+FAILURE_PARSE_MISS = 'parse_miss'
+
+# retries = same-engine retries, base/cap = backoff seconds before a retry,
+# cooldown = seconds the whole domain is paused (doubles with each failure in a row, up to cap)
+# Block pages and parse misses aren't retried on the same engine - escalating to the next one is the retry
+# RETRY_POLICY (JSON) overrides per class, e.g. {"timeout": {"retries": 1}}
+DEFAULT_RETRY_CLASSES = {
+    FAILURE_TIMEOUT: {'retries': 2, 'base': 1, 'cap': 10, 'cooldown': 0},
+    FAILURE_SERVER_ERROR: {'retries': 2, 'base': 2, 'cap': 30, 'cooldown': 2},
+    FAILURE_RATE_LIMITED: {'retries': 1, 'base': 10, 'cap': 60, 'cooldown': 10},
+    FAILURE_BLOCKED: {'retries': 0, 'base': 8, 'cap': 60, 'cooldown': 15},
+    FAILURE_PARSE_MISS: {'retries': 0, 'base': 1, 'cap': 10, 'cooldown': 0},
+}
+_class_overrides = json.loads(os.environ.get('RETRY_POLICY') or '{}')
+RETRY_CLASSES = {
+    name: dict(limits, **_class_overrides.get(name, {})) for name, limits in DEFAULT_RETRY_CLASSES.items()
+}
+
+# Retries allowed per first attempt across all engines (token bucket refilled by every first attempt)
+RETRY_BUDGET_RATIO = float(os.environ.get('RETRY_BUDGET_RATIO', 0.2))
+# Unused retries saved up for a short burst of failures
+RETRY_BUDGET_BURST = 10
+
+# Failures of a domain further apart than this don't count as "in a row"
+FAILURE_STREAK_WINDOW = 300
+
+
+def classify_status(status):
+    """Failure class of an HTTP status, None if it isn't a retryable failure"""
+    if status == 429:
+        return FAILURE_RATE_LIMITED
+    if status == 408:
+        return FAILURE_TIMEOUT
+    if 500 <= status < 600:
+        return FAILURE_SERVER_ERROR
+    return None
+
+
+def classify_exception(exception):
+    """Timeouts by name (Twisted, httpx, Playwright all call them that); other network errors count as 5xx"""
+    if isinstance(exception, TimeoutError) or 'Timeout' in type(exception).__name__ or \
+            'TimedOut' in type(exception).__name__:
+        return FAILURE_TIMEOUT
+    return FAILURE_SERVER_ERROR
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (delta-seconds or HTTP date), None if absent/invalid"""
+    if not value:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode('latin-1')
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def jittered(base, cap, attempt):
+    """Exponential backoff with equal jitter: half fixed, half random, so waits never collapse to zero"""
+    delay = min(cap, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class RetryPolicy:
+    """Failure classes, per-domain cooldowns and the global retry budget (thread-safe)"""
+
+    def __init__(self, classes, budget_ratio, budget_burst):
+        self.classes = classes
+        self.budget_ratio = budget_ratio
+        self.budget_burst = budget_burst
+        self.tokens = float(budget_burst)
+        self.requests = 0
+        self.retries = {name: 0 for name in classes}
+        self.failures = {name: 0 for name in classes}
+        self.denied = 0
+        # domain → (failures in a row, time of the last one)
+        self._streaks = {}
+        self._lock = threading.Lock()
+
+    def request_started(self):
+        """A first attempt (not a retry) - earns the budget a fraction of a retry"""
+        with self._lock:
+            self.requests += 1
+            self.tokens = min(self.budget_burst, self.tokens + self.budget_ratio)
+
+    def backoff(self, failure, attempt):
+        limits = self.classes[failure]
+        return jittered(limits['base'], limits['cap'], attempt)
+
+    def retry_delay(self, failure, attempt, retry_after=None):
+        """
+        Seconds to wait before retry number attempt + 1 of a request that failed
+        with this class, or None if it shouldn't be retried (class exhausted or
+        the global budget spent) - takes one retry from the budget
+        """
+        limits = self.classes.get(failure)
+        if limits is None or attempt >= limits['retries']:
+            return None
+        with self._lock:
+            if self.tokens < 1:
+                self.denied += 1
+                return None
+            self.tokens -= 1
+            self.retries[failure] += 1
+        delay = self.backoff(failure, attempt)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, limits['cap']))
+        return delay
+
+    def failed(self, url, failure, retry_after=None):
+        """
+        Record a failure against the URL's domain and pause the domain for every
+        engine if this class calls for it; returns the pause in seconds
+        """
+        limits = self.classes.get(failure)
+        if limits is None:
+            return 0.0
+        domain = registrable_domain(url)
+        now = time.time()
+        with self._lock:
+            self.failures[failure] += 1
+            streak, last = self._streaks.get(domain, (0, 0.0))
+            streak = streak + 1 if now - last < FAILURE_STREAK_WINDOW else 1
+            self._streaks[domain] = (streak, now)
+        if not limits['cooldown'] and retry_after is None:
+            return 0.0
+        pause = jittered(limits['cooldown'], limits['cap'], streak - 1) if limits['cooldown'] else 0.0
+        if retry_after is not None:
+            pause = max(pause, min(retry_after, limits['cap']))
+        get_throttle().pause(url, pause)
+        print(f"⏸️  {domain}: {failure} #{streak}, pausing the domain for {pause:.1f}s")
+        return pause
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'budget_tokens': round(self.tokens, 2),
+                'requests': self.requests,
+                'retries': dict(self.retries),
+                'failures': dict(self.failures),
+                'denied_by_budget': self.denied,
+            }
+
+
+_retry_policy = RetryPolicy(RETRY_CLASSES, RETRY_BUDGET_RATIO, RETRY_BUDGET_BURST)
+
+
+def get_retry_policy():
+    return _retry_policy
@@ -11,8 +11,10 @@ NEWSPIDER_MODULE = 'spiders'
 # 1. Ignore robots.txt (Amazon explicitly blocks bots here)
 ROBOTSTXT_OBEY = False
 
-# 2. Slow down to human speed
-DOWNLOAD_DELAY = 2  # Wait 2 seconds between requests
+# 2. Slow down to human speed - per domain, not globally
+# Pacing is a token bucket per registrable domain (domain_throttle.py,
+# DomainThrottleMiddleware below), so Amazon's limits don't slow down other shops
+DOWNLOAD_DELAY = 0
 RANDOMIZE_DOWNLOAD_DELAY = True
 
 # 3. Disable Cookies (prevents tracking session IDs that get flagged)
@@ -23,6 +25,15 @@ COOKIES_ENABLED = False
 DOWNLOADER_MIDDLEWARES = {
     'scrapy.downloadermiddlewares.useragent.UserAgentMiddleware': None,
     'scrapy_user_agents.middlewares.RandomUserAgentMiddleware': 400,
+    # Per-domain token bucket + download slot (runs before the request reaches its slot)
+    'middlewares.DomainThrottleMiddleware': 50,
+    # Abandon captcha/challenge pages at response time (before archive + retry)
+    'middlewares.BlockDetectionMiddleware': 585,
+    # Raw HTML archive (no-op unless HTML_ARCHIVE_DIR is set)
+    'middlewares.HtmlArchiveMiddleware': 580,
+    # Classified, budgeted, jittered retries (retry_policy.py) instead of the stock RetryMiddleware
+    'scrapy.downloadermiddlewares.retry.RetryMiddleware': None,
+    'middlewares.RetryPolicyMiddleware': 550,
 }
 
 # 5. Mimic a Real Browser's Headers
@@ -40,13 +51,20 @@ DEFAULT_REQUEST_HEADERS = {
     'Sec-Fetch-User': '?1',
 }
 
-# 6. Concurrency Limiting (Don't hammer the server)
-CONCURRENT_REQUESTS = 1
-CONCURRENT_REQUESTS_PER_DOMAIN = 1
+# 6. Concurrency Limiting (Don't hammer any one server)
+# Global concurrency is high; each domain gets its own cap - DOWNLOAD_SLOTS holds
+# the per-retailer ones, CONCURRENT_REQUESTS_PER_DOMAIN applies to everything else
+from domain_throttle import DEFAULT_LIMITS, download_slots
 
-# 7. AutoThrottle (Adaptive delays)
+CONCURRENT_REQUESTS = 32
+CONCURRENT_REQUESTS_PER_DOMAIN = DEFAULT_LIMITS['concurrency']
+DOWNLOAD_SLOTS = download_slots()
+# Dequeue from the least busy domain so one retailer's backlog can't fill every global slot
+SCHEDULER_PRIORITY_QUEUE = 'scrapy.pqueues.DownloaderAwarePriorityQueue'
+
+# 7. AutoThrottle (Adaptive delays, per download slot = per domain)
 AUTOTHROTTLE_ENABLED = True
-AUTOTHROTTLE_START_DELAY = 2
+AUTOTHROTTLE_START_DELAY = 1
 AUTOTHROTTLE_MAX_DELAY = 10
 AUTOTHROTTLE_TARGET_CONCURRENCY = 1.0
 AUTOTHROTTLE_DEBUG = False
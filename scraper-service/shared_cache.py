@@ -0,0 +1,184 @@
+"""
+Cross-process result cache shared by every gunicorn worker on one box
+Backed by a local SQLite file in WAL mode with a memory-mapped read path:
+readers never block each other or the writer, so all workers share one warm cache
+without an external Redis
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from url_utils import canonicalize_url
+
+# Fast JSON encoder (optional) - falls back to the stdlib with compact separators
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    import json
+    ORJSON_AVAILABLE = False
+
+# Only refresh an entry's LRU timestamp this often, so hot reads stay read-only
+TOUCH_INTERVAL_SECONDS = 60
+
+# Run expiry/LRU eviction every N writes instead of on every write
+EVICT_EVERY_WRITES = 200
+
+
+def _dumps(value):
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def _loads(blob):
+    if ORJSON_AVAILABLE:
+        return orjson.loads(blob)
+    return json.loads(blob)
+
+
+class SharedResultCache:
+    """
+    Scrape results keyed by canonical URL, with TTL expiry and approximate LRU eviction
+    Safe to use from many threads and many processes at once
+    """
+
+    def __init__(self, path, ttl_seconds=6 * 3600, max_entries=50000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self._init_schema()
+
+    def _connect(self):
+        # sqlite connections must not cross threads or a gunicorn fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA mmap_size=268435456')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._connect().execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._connect().execute('CREATE INDEX IF NOT EXISTS results_accessed_idx ON results(accessed_at)')
+
+    def get(self, url):
+        """Return the cached result for a URL, or None if missing/expired"""
+        key = canonicalize_url(url)
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                'SELECT value, expires_at, accessed_at FROM results WHERE key = ?', (key,)
+            ).fetchone()
+            if not row:
+                return None
+
+            value, expires_at, accessed_at = row
+            if expires_at <= now:
+                return None
+
+            if now - accessed_at > TOUCH_INTERVAL_SECONDS:
+                try:
+                    conn.execute('UPDATE results SET accessed_at = ? WHERE key = ?', (now, key))
+                except sqlite3.OperationalError:
+                    pass  # Busy writer - LRU position is best-effort
+
+            return _loads(value)
+        except sqlite3.Error as e:
+            print(f"⚠️  Shared cache read error: {e}")
+            return None
+
+    def set(self, url, result, ttl_seconds=None):
+        """Store a result for a URL (overwrites any previous entry)"""
+        if not result:
+            return
+
+        key = canonicalize_url(url)
+        now = time.time()
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl <= 0:
+            return
+
+        try:
+            self._connect().execute(
+                'INSERT OR REPLACE INTO results (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, _dumps(result), now + ttl, now)
+            )
+        except sqlite3.Error as e:
+            print(f"⚠️  Shared cache write error: {e}")
+            return
+
+        self._writes += 1
+        if self._writes % EVICT_EVERY_WRITES == 0:
+            self.evict()
+
+    def delete(self, url):
+        try:
+            self._connect().execute('DELETE FROM results WHERE key = ?', (canonicalize_url(url),))
+        except sqlite3.Error as e:
+            print(f"⚠️  Shared cache delete error: {e}")
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones beyond max_entries"""
+        try:
+            conn = self._connect()
+            conn.execute('DELETE FROM results WHERE expires_at <= ?', (time.time(),))
+            conn.execute(
+                """
+                DELETE FROM results WHERE key IN (
+                    SELECT key FROM results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,)
+            )
+        except sqlite3.Error as e:
+            print(f"⚠️  Shared cache eviction error: {e}")
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """
+    Return the process-wide cache, or None when SHARED_CACHE_PATH is not set
+    Every worker pointing at the same path shares the same entries
+    """
+    global _shared_cache
+    path = os.environ.get('SHARED_CACHE_PATH')
+    if not path:
+        return None
+
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            try:
+                _shared_cache = SharedResultCache(
+                    path,
+                    ttl_seconds=float(os.environ.get('SHARED_CACHE_TTL_HOURS', 6)) * 3600,
+                    max_entries=int(os.environ.get('SHARED_CACHE_MAX_ENTRIES', 50000)),
+                )
+                print(f"✅ Shared result cache at {path}")
+            except Exception as e:
+                print(f"⚠️  Shared cache initialization failed: {e}")
+                return None
+    return _shared_cache
@@ -1,362 +1,239 @@
 """
 Enhanced ProductSpider for Scrapy
 Supports: Amazon, Etsy, Best Buy, Target, Walmart, and generic sites
+(selectors live in extraction_rules.py)
 Uses callback mechanism to pass data back to Flask
 """
-import json
-import re
 from urllib.parse import urlparse
-from scrapy import Request, Spider
+from scrapy import Request, Spider, signals
+from scrapy.exceptions import DontCloseSpider, IgnoreRequest, StopDownload
+
+from extraction_rules import GENERIC, extract_from_response, rule_for_url
+from fingerprint import compute_fingerprint
+from platforms import detect_platform, remember_platform
+from priority_lanes import SCRAPY_PRIORITY
+from streaming import StreamScanner, STREAM_EARLY_EXIT, STREAMABLE_ENCODINGS
+from url_utils import registrable_domain
+
+
+class JobCancelled(IgnoreRequest):
+    """The job's result is no longer wanted (e.g. a hedged Playwright attempt won)"""
 
 
 class ProductSpider(Spider):
     name = 'product_spider'
     
-    def __init__(self, url=None, on_item_scraped=None, user_id=None, *args, **kwargs):
+    def __init__(self, url=None, on_item_scraped=None, user_id=None, validators=None,
+                 fingerprint=None, on_not_modified=None, persistent=False, jobs=None, *args, **kwargs):
         super(ProductSpider, self).__init__(*args, **kwargs)
         self.url = url
         self.start_urls = [url] if url else []
         self.on_item_scraped = on_item_scraped
         self.user_id = user_id
-        
+        # ETag / Last-Modified from the cached copy (refresh scrapes only)
+        self.validators = validators or {}
+        # Content fingerprint stored with the cached copy (see fingerprint.py)
+        self.fingerprint = fingerprint
+        # Called instead of on_item_scraped when the page is unchanged (304 or same fingerprint)
+        self.on_not_modified = on_not_modified
+        # Long-running mode: stay open when idle and take jobs via add_job() (see crawler_service.py)
+        self.persistent = persistent
+        # Bulk mode: list/iterator of URLs or job dicts ({'url', 'job_id', 'user_id', callbacks...})
+        self.jobs = jobs
+        
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(ProductSpider, cls).from_crawler(crawler, *args, **kwargs)
+        if STREAM_EARLY_EXIT:
+            crawler.signals.connect(spider.on_headers_received, signal=signals.headers_received)
+        if STREAM_EARLY_EXIT or spider.persistent:
+            # Also where cancelled jobs stop downloading
+            crawler.signals.connect(spider.on_bytes_received, signal=signals.bytes_received)
+        if spider.persistent:
+            crawler.signals.connect(spider.on_idle, signal=signals.spider_idle)
+            crawler.signals.connect(spider.on_request_dropped, signal=signals.request_dropped)
+        return spider
+    
     def start_requests(self):
         """Start request with stealth headers"""
-        yield Request(
-            url=self.url,
+        if self.jobs is not None:
+            # Consumed lazily - Scrapy pulls more as per-domain slots free up,
+            # and each item goes to its own job's callback as soon as it's parsed
+            for job in self.jobs:
+                if isinstance(job, str):
+                    job = {'url': job, 'user_id': self.user_id, 'on_item_scraped': self.on_item_scraped}
+                yield self.make_job_request(job)
+        
+        if self.url:
+            yield self.make_job_request({
+                'url': self.url,
+                'user_id': self.user_id,
+                'validators': self.validators,
+                'fingerprint': self.fingerprint,
+                'on_item_scraped': self.on_item_scraped,
+                'on_not_modified': self.on_not_modified,
+            })
+    
+    def make_job_request(self, job):
+        """
+        Build the request for one scrape job
+        Per-job state (url, user, validators, callbacks) rides in request.meta['wist_job'],
+        so one spider can serve many jobs at once
+        """
+        headers = {
+            'Referer': 'https://www.google.com/',
+            'Sec-Fetch-User': '?1',
+        }
+        # One download slot per registrable domain - per-retailer concurrency lives in DOWNLOAD_SLOTS
+        meta = {'dont_redirect': True, 'wist_job': job, 'download_slot': registrable_domain(job['url'])}
+        
+        if STREAM_EARLY_EXIT:
+            # Streaming early-exit needs a body we can inflate chunk by chunk (no brotli)
+            headers['Accept-Encoding'] = STREAMABLE_ENCODINGS
+            meta['stream_early_exit'] = True
+        
+        # Conditional revalidation: an unchanged page comes back as a tiny 304
+        validators = job.get('validators') or {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        if 'If-None-Match' in headers or 'If-Modified-Since' in headers:
+            meta['handle_httpstatus_list'] = [304]
+        
+        return Request(
+            url=job['url'],
             callback=self.parse,
-            headers={
-                'Referer': 'https://www.google.com/',
-                'Sec-Fetch-User': '?1',
-            },
+            errback=self.on_request_error,
+            headers=headers,
             dont_filter=True,
-            meta={'dont_redirect': True}
+            meta=meta,
+            # Interactive scrapes are dequeued before imports and background refreshes
+            priority=SCRAPY_PRIORITY.get(job.get('priority'), 0)
         )
     
+    def add_job(self, job):
+        """Schedule another job on the running crawl (reactor thread only)"""
+        self.crawler.engine.crawl(self.make_job_request(job))
+    
+    def finish_job(self, job, failure=None):
+        """Tell the job's owner its request is done (exactly once)"""
+        on_done = job.pop('on_done', None)
+        if on_done:
+            on_done(failure)
+    
+    def on_idle(self, spider):
+        """Persistent mode: an empty queue is not a reason to close"""
+        if spider is self:
+            raise DontCloseSpider
+    
+    def on_request_dropped(self, request, spider):
+        job = request.meta.get('wist_job')
+        if spider is self and job:
+            self.finish_job(job)
+    
+    def on_request_error(self, failure):
+        job = failure.request.meta.get('wist_job') if hasattr(failure, 'request') else None
+        print(f"❌ SPIDER: Request failed: {failure.value!r}")
+        if job:
+            self.finish_job(job, failure)
+    
+    def on_headers_received(self, headers, body_length, request, spider):
+        """Start a stream scanner for each product page download"""
+        if spider is self and request.meta.get('stream_early_exit'):
+            request.meta['stream_scanner'] = StreamScanner(headers.get('Content-Encoding'))
+    
+    def on_bytes_received(self, data, request, spider):
+        """Stop the download once title + price are in hand (or the byte budget is spent)"""
+        if spider is self and (request.meta.get('wist_job') or {}).get('cancelled'):
+            print(f"✂️  SPIDER: job cancelled, stopping download of {request.url}")
+            raise StopDownload(fail=True)
+        scanner = request.meta.get('stream_scanner')
+        if spider is self and scanner and scanner.feed(data):
+            print(f"✂️  SPIDER: stopping download after {scanner.bytes_seen // 1024} KB ({scanner.stop_reason})")
+            raise StopDownload(fail=False)
+    
     def parse(self, response):
         print(f"👀 SPIDER: Received response from {response.url}")
+        job = response.meta.get('wist_job') or {'url': self.url, 'user_id': self.user_id}
+        if job.get('job_id'):
+            print(f"   (job {job['job_id']})")
+        if job.get('cancelled'):
+            return
         
-        domain = urlparse(self.url).netloc.lower()
-        final_product = {}
-        
-        # Route to appropriate extractor
-        if 'amazon' in domain:
-            print("🛒 Detected Amazon")
-            final_product = self.extract_amazon(response)
-        elif 'etsy' in domain:
-            print("🎨 Detected Etsy")
-            final_product = self.extract_etsy(response)
-        elif 'bestbuy' in domain:
-            print("🛍️ Detected Best Buy")
-            final_product = self.extract_bestbuy(response)
-        elif 'target' in domain:
-            print("🎯 Detected Target")
-            final_product = self.extract_target(response)
-        elif 'walmart' in domain:
-            print("🏪 Detected Walmart")
-            final_product = self.extract_walmart(response)
-        else:
+        try:
+            if response.status == 304:
+                print("♻️  SPIDER: 304 Not Modified - cached copy is still current")
+                if job.get('on_not_modified'):
+                    job['on_not_modified']()
+                return
+            
+            # Same product regions as last time → skip extraction and the DB write
+            fingerprint = compute_fingerprint(response, truncated='download_stopped' in response.flags)
+            if fingerprint and fingerprint == job.get('fingerprint'):
+                print("♻️  SPIDER: Content fingerprint unchanged - skipping extraction")
+                if job.get('on_not_modified'):
+                    job['on_not_modified']()
+                return
+            
+            item = self.extract_product(response, url=job['url'], user_id=job.get('user_id'))
+            
+            # Yield result
+            if item:
+                item['validators'] = self.extract_validators(response)
+                item['fingerprint'] = fingerprint
+                
+                if job.get('on_item_scraped'):
+                    job['on_item_scraped'](item)
+                
+                print(f"📦 RESULT: {item['title'][:50]}... | ${item.get('price', 'N/A')}")
+                yield item
+            else:
+                print("❌ FAILED: Could not extract product data")
+        finally:
+            self.finish_job(job)
+    
+    def extract_product(self, response, url=None, user_id=None):
+        """
+        Run the extractors over a response and build the item (no side effects)
+        Also used offline by reextract.py over archived page bodies
+        """
+        url = url or self.url
+        user_id = user_id if user_id is not None else self.user_id
+        domain = urlparse(url).netloc.lower()
+        
+        rule = rule_for_url(url)
+        if rule is GENERIC:
             print("🌐 Using generic extractor")
-            final_product = self.extract_generic(response)
-        
-        # Fallback to JSON-LD if extraction incomplete
-        if not final_product.get('price') or not final_product.get('title'):
-            print("⚠️ Trying JSON-LD fallback...")
-            json_ld = self.extract_json_ld(response)
-            if json_ld:
-                normalized = self.normalize_json_ld(json_ld, response.url)
-                # Merge - keep existing data, fill gaps from JSON-LD
-                for key, value in normalized.items():
-                    if not final_product.get(key) and value:
-                        final_product[key] = value
+            # Shopify/WooCommerce shops get their next scrape from the platform API (fast tier)
+            platform = detect_platform(response)
+            if platform:
+                print(f"🧩 Detected {platform} store")
+                remember_platform(url, platform)
+        else:
+            print(f"{rule.icon} Detected {rule.name}")
+        final_product = extract_from_response(response, rule)
         
-        # Yield result
         if final_product and final_product.get('title'):
-            item = {
-                'title': final_product.get('title', ''),
+            return {
+                'title': final_product['title'],
                 'price': final_product.get('price'),
                 'priceRaw': final_product.get('priceRaw'),
-                'image': final_product.get('image', ''),
-                'description': final_product.get('description', ''),
-                'url': final_product.get('url', self.url),
-                'user_id': self.user_id,
+                'image': final_product.get('image') or '',
+                'description': final_product.get('description') or '',
+                'url': final_product.get('url') or url,
+                'user_id': user_id,
                 'domain': domain.replace('www.', '')
             }
-            
-            if self.on_item_scraped:
-                self.on_item_scraped(item)
-            
-            print(f"📦 RESULT: {item['title'][:50]}... | ${item.get('price', 'N/A')}")
-            yield item
-        else:
-            print("❌ FAILED: Could not extract product data")
-    
-    def extract_amazon(self, response):
-        """Amazon extraction with multiple fallbacks"""
-        product = {'url': response.url}
-        
-        # Title
-        title_selectors = [
-            '#productTitle::text',
-            '#title span::text',
-            'h1.product-title-word-break::text',
-        ]
-        for sel in title_selectors:
-            title = response.css(sel).get()
-            if title and title.strip():
-                product['title'] = title.strip()
-                break
-        
-        # Price - prioritize "price to pay" selectors (actual current price)
-        # IMPORTANT: Order matters - put most reliable first
-        price_selectors = [
-            # Actual price to pay (most accurate)
-            '.priceToPay span.a-offscreen::text',
-            '#corePrice_desktop .priceToPay span.a-offscreen::text',
-            # Deal/sale prices
-            '#priceblock_dealprice::text',
-            '#priceblock_saleprice::text',
-            '#priceblock_ourprice::text',
-            # Desktop price display (avoid "was" prices by being specific)
-            '#corePriceDisplay_desktop_feature_div .priceToPay span.a-offscreen::text',
-            '#corePriceDisplay_desktop_feature_div .a-price:not(.a-text-price) span.a-offscreen::text',
-            # Mobile/alternative layouts
-            '#corePrice_feature_div .a-price span.a-offscreen::text',
-            '#apex_desktop .priceToPay span.a-offscreen::text',
-            # Kindle/Digital
-            '#kindle-price::text',
-            '#price_inside_buybox::text',
-            # Fallback - first non-struck price (less accurate)
-            '.a-price:not(.a-text-price) span.a-offscreen::text',
-        ]
-        for sel in price_selectors:
-            price_text = response.css(sel).get()
-            if price_text:
-                price = self.clean_price(price_text)
-                if price and price > 0:  # Make sure it's a valid price
-                    product['price'] = price
-                    product['priceRaw'] = f"${price:.2f}"
-                    print(f"   💵 Found price via '{sel}': ${price:.2f}")
-                    break
-        
-        # Image
-        img = response.css('#landingImage::attr(src)').get()
-        if not img:
-            img = response.css('#imgBlkFront::attr(src)').get()
-        if not img:
-            img = response.css('#ebooksImgBlkFront::attr(src)').get()
-        product['image'] = img
-        
-        # Description
-        desc = response.css('#productDescription p::text').get()
-        if desc:
-            product['description'] = desc.strip()[:500]
-        
-        return product
-    
-    def extract_etsy(self, response):
-        """Etsy extraction"""
-        product = {'url': response.url}
-        
-        # Try JSON-LD first (most reliable for Etsy)
-        json_ld = self.extract_json_ld(response)
-        if json_ld:
-            product = self.normalize_json_ld(json_ld, response.url)
-            if product.get('title'):
-                return product
-        
-        # CSS fallback
-        title_selectors = [
-            'h1[data-buy-box-listing-title]::text',
-            'h1.listing-page-title::text',
-            'h1.wt-text-body-01::text',
-        ]
-        for sel in title_selectors:
-            title = response.css(sel).get()
-            if title and title.strip():
-                product['title'] = title.strip()
-                break
-        
-        # Price
-        price_selectors = [
-            'p.wt-text-title-03 .currency-value::text',
-            '[data-buy-box-region="price"] .currency-value::text',
-        ]
-        for sel in price_selectors:
-            price_text = response.css(sel).get()
-            if price_text:
-                price = self.clean_price(price_text)
-                if price:
-                    product['price'] = price
-                    product['priceRaw'] = f"${price:.2f}"
-                    break
-        
-        # Image - try og:image
-        img = response.css('meta[property="og:image"]::attr(content)').get()
-        product['image'] = img
-        
-        return product
-    
-    def extract_bestbuy(self, response):
-        """Best Buy extraction"""
-        product = {'url': response.url}
-        
-        title = response.css('h1.heading-5::text').get()
-        if not title:
-            title = response.css('[data-testid="product-title"]::text').get()
-        product['title'] = title.strip() if title else ''
-        
-        price = response.css('.priceView-customer-price span::text').get()
-        if price:
-            product['price'] = self.clean_price(price)
-            product['priceRaw'] = price.strip()
-        
-        image = response.css('[data-testid="product-image"] img::attr(src)').get()
-        product['image'] = image
-        
-        return product
-    
-    def extract_target(self, response):
-        """Target extraction"""
-        product = {'url': response.url}
-        
-        title = response.css('h1[data-test="product-title"]::text').get()
-        product['title'] = title.strip() if title else ''
-        
-        price = response.css('[data-test="product-price"]::text').get()
-        if price:
-            product['price'] = self.clean_price(price)
-            product['priceRaw'] = price.strip()
-        
-        image = response.css('[data-test="product-image"] img::attr(src)').get()
-        product['image'] = image
-        
-        return product
-    
-    def extract_walmart(self, response):
-        """Walmart extraction"""
-        product = {'url': response.url}
-        
-        title = response.css('h1.prod-ProductTitle::text').get()
-        if not title:
-            title = response.css('[data-testid="product-title"]::text').get()
-        product['title'] = title.strip() if title else ''
-        
-        price = response.css('[itemprop="price"]::attr(content)').get()
-        if not price:
-            price = response.css('[data-testid="price"]::text').get()
-        if price:
-            product['price'] = self.clean_price(price)
-            product['priceRaw'] = f"${product['price']:.2f}" if product['price'] else None
-        
-        image = response.css('[data-testid="product-image"] img::attr(src)').get()
-        product['image'] = image
-        
-        return product
-    
-    def extract_generic(self, response):
-        """Generic extraction for independent websites"""
-        product = {'url': response.url}
-        
-        # Title - try multiple sources
-        title = (
-            response.css('meta[property="og:title"]::attr(content)').get() or
-            response.css('[itemprop="name"]::text').get() or
-            response.css('h1::text').get() or
-            response.css('title::text').get()
-        )
-        product['title'] = title.strip() if title else ''
-        
-        # Price - try multiple sources
-        price = (
-            response.css('[itemprop="price"]::attr(content)').get() or
-            response.css('meta[property="product:price:amount"]::attr(content)').get() or
-            response.css('.price::text').get() or
-            response.css('.product-price::text').get()
-        )
-        if price:
-            product['price'] = self.clean_price(price)
-            product['priceRaw'] = price.strip()
-        
-        # Image
-        image = (
-            response.css('meta[property="og:image"]::attr(content)').get() or
-            response.css('[itemprop="image"]::attr(src)').get() or
-            response.css('.product-image img::attr(src)').get()
-        )
-        product['image'] = image
-        
-        # Description
-        desc = (
-            response.css('meta[property="og:description"]::attr(content)').get() or
-            response.css('meta[name="description"]::attr(content)').get() or
-            response.css('[itemprop="description"]::text').get()
-        )
-        product['description'] = desc.strip()[:500] if desc else ''
-        
-        return product
-    
-    def extract_json_ld(self, response):
-        """Extract JSON-LD structured data"""
-        try:
-            scripts = response.xpath('//script[@type="application/ld+json"]/text()').getall()
-            for script in scripts:
-                try:
-                    data = json.loads(script)
-                    # Handle arrays
-                    if isinstance(data, list):
-                        for item in data:
-                            if item.get('@type') in ['Product', 'IndividualProduct', 'Offer']:
-                                return item
-                    # Handle single object
-                    if data.get('@type') in ['Product', 'IndividualProduct', 'Offer']:
-                        return data
-                except json.JSONDecodeError:
-                    continue
-        except Exception:
-            pass
         return None
     
-    def normalize_json_ld(self, data, url):
-        """Normalize JSON-LD data to product format"""
-        result = {'url': url}
-        
-        result['title'] = data.get('name') or data.get('title', '')
-        result['description'] = data.get('description', '')[:500]
-        
-        # Image
-        image = data.get('image', '')
-        if isinstance(image, list):
-            image = image[0] if image else ''
-        if isinstance(image, dict):
-            image = image.get('url') or image.get('contentUrl', '')
-        result['image'] = image
-        
-        # Price
-        offers = data.get('offers', {})
-        if isinstance(offers, list):
-            offers = offers[0] if offers else {}
-        
-        price = offers.get('price') or offers.get('lowPrice') or data.get('price')
-        if price:
-            try:
-                result['price'] = float(price)
-                currency = offers.get('priceCurrency', 'USD')
-                result['priceRaw'] = f"${result['price']:.2f}"
-            except (ValueError, TypeError):
-                pass
-        
-        return result
-    
-    def clean_price(self, price_str):
-        """Extract numeric price value"""
-        if not price_str:
-            return None
-        
-        # Remove currency symbols and extract numbers
-        price_clean = re.sub(r'[^\d.,]', '', str(price_str))
-        price_clean = price_clean.replace(',', '')
-        
-        try:
-            return float(price_clean)
-        except ValueError:
-            return None
+    def extract_validators(self, response):
+        """Pull ETag / Last-Modified so the next refresh can revalidate instead of re-download"""
+        validators = {}
+        etag = response.headers.get('ETag')
+        if etag:
+            validators['etag'] = etag.decode('latin-1')
+        last_modified = response.headers.get('Last-Modified')
+        if last_modified:
+            validators['last_modified'] = last_modified.decode('latin-1')
+        return validators
@@ -0,0 +1,107 @@
+"""
+Streaming early-exit for product page downloads
+JSON-LD and OG/product meta usually sit in <head> or early in <body>, so we feed
+chunks into an incremental lxml parser as they arrive and stop the download once
+the required fields (title + price) have been seen or a byte budget is spent.
+Used by the fast tier (httpx stream) and by ProductSpider (bytes_received signal).
+"""
+import os
+import zlib
+
+from lxml import etree
+
+from json_ld import decode, is_product, iter_nodes
+
+STREAM_EARLY_EXIT = os.environ.get('STREAM_EARLY_EXIT', 'true').lower() not in ('0', 'false', 'no')
+STREAM_BYTE_BUDGET = int(float(os.environ.get('STREAM_BYTE_BUDGET_KB', 3072)) * 1024)
+
+# Encodings we can decode incrementally (Scrapy hands us the raw wire bytes)
+STREAMABLE_ENCODINGS = 'gzip, deflate'
+
+TITLE_META = ('og:title',)
+PRICE_META = ('product:price:amount', 'og:price:amount')
+
+
+class StreamScanner:
+    """
+    Watches a download chunk by chunk; feed() returns True once it's safe to stop
+    `stop_reason` says why ('fields' or 'budget')
+    """
+
+    def __init__(self, content_encoding=None, byte_budget=STREAM_BYTE_BUDGET):
+        self.byte_budget = byte_budget
+        self.bytes_seen = 0
+        self.found = set()
+        self.stop_reason = None
+        self._parser = etree.HTMLPullParser(events=('end',), tag=('meta', 'script'))
+        self._decoder = None
+
+        encoding = (content_encoding or b'').lower()
+        if isinstance(encoding, bytes):
+            encoding = encoding.decode('latin-1')
+        if encoding == 'gzip':
+            self._decoder = zlib.decompressobj(zlib.MAX_WBITS | 32)
+        elif encoding == 'deflate':
+            self._decoder = zlib.decompressobj()
+        elif encoding not in ('', 'identity'):
+            # Can't peek inside (e.g. br) - just enforce the budget
+            self._parser = None
+
+    def feed(self, chunk):
+        if self.stop_reason:
+            return True
+
+        self.bytes_seen += len(chunk)
+        if self._parser is not None:
+            try:
+                if self._decoder is not None:
+                    chunk = self._decoder.decompress(chunk)
+                self._parser.feed(chunk)
+                self._read_events()
+            except (zlib.error, etree.LxmlError):
+                self._parser = None
+
+        if 'title' in self.found and 'price' in self.found:
+            self.stop_reason = 'fields'
+        elif self.bytes_seen >= self.byte_budget:
+            self.stop_reason = 'budget'
+        return self.stop_reason is not None
+
+    def _read_events(self):
+        for _, element in self._parser.read_events():
+            self.found |= fields_in(element)
+            element.clear()
+
+
+def fields_in(element):
+    """Required fields ('title', 'price') a <meta> or JSON-LD <script> element provides"""
+    found = set()
+    if element.tag == 'meta':
+        prop = element.get('property') or element.get('name') or ''
+        if element.get('content'):
+            if prop in TITLE_META:
+                found.add('title')
+            elif prop in PRICE_META:
+                found.add('price')
+        if element.get('itemprop') == 'price' and element.get('content'):
+            found.add('price')
+    elif element.tag == 'script' and element.get('type') == 'application/ld+json':
+        found |= _json_ld_fields(element.text)
+    return found
+
+
+def _json_ld_fields(text):
+    found = set()
+    if not text:
+        return found
+    for node in iter_nodes(decode(text)):
+        if not is_product(node):
+            continue
+        if node.get('name'):
+            found.add('title')
+        offers = node.get('offers') or node
+        if isinstance(offers, list):
+            offers = offers[0] if offers else {}
+        if isinstance(offers, dict) and (offers.get('price') or offers.get('lowPrice')):
+            found.add('price')
+    return found
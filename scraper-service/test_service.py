@@ -21,6 +21,9 @@ try:
     from spiders.product_spider import ProductSpider
     print("✅ Spider import OK")
     
+    from crawler_service import get_crawler_service
+    print("✅ Crawler service import OK")
+    
     from playwright_scraper import scrape_with_playwright
     print("✅ Playwright import OK")
     
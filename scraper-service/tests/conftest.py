@@ -0,0 +1,18 @@
+import os
+import sys
+
+import fakeredis
+import pytest
+
+# Service modules are flat files next to app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_store import RedisJobStore, SqliteJobStore
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def store(request, tmp_path):
+    """Each job store backend: SQLite in a temp dir, Redis on fakeredis"""
+    if request.param == 'sqlite':
+        return SqliteJobStore(str(tmp_path / 'jobs.sqlite3'))
+    return RedisJobStore(fakeredis.FakeStrictRedis())
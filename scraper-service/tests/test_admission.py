@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+
+from admission import (ADMISSION_MAX_IN_FLIGHT_CRAWLS, ADMISSION_MAX_QUEUE_DEPTH, AdmissionController,
+                       BrowserPool, max_admissible)
+from priority_lanes import PRIORITY_BACKGROUND, PRIORITY_BATCH, PRIORITY_INTERACTIVE
+
+
+def controller(depth=0, pool=None):
+    return AdmissionController(lambda: depth, pool or BrowserPool(2))
+
+
+def test_less_urgent_lanes_are_refused_first():
+    admission = controller(depth=int(ADMISSION_MAX_QUEUE_DEPTH * 0.6))
+
+    assert not admission.check(PRIORITY_BACKGROUND)
+    assert admission.check(PRIORITY_BATCH)
+    assert admission.check(PRIORITY_INTERACTIVE)
+
+
+def test_refusal_carries_retry_after_from_the_drain_rate():
+    depth = max_admissible(PRIORITY_BACKGROUND) + 10
+    decision = controller(depth=depth).check(PRIORITY_BACKGROUND)
+
+    assert not decision
+    assert decision.reason == f"queue depth {depth}"
+    # Nothing drained yet: both rates sit at their 0.1/s floor
+    assert decision.retry_after == 55
+
+
+def test_burst_is_counted_before_the_store_is_read_again():
+    admission = controller(depth=0)
+    limit = max_admissible(PRIORITY_BACKGROUND)
+
+    admitted = sum(1 for _ in range(limit + 5) if admission.check(PRIORITY_BACKGROUND))
+
+    assert admitted == limit
+
+
+def test_batch_larger_than_the_lane_can_hold_is_refused():
+    admission = controller(depth=0)
+
+    assert admission.check(PRIORITY_BATCH, count=max_admissible(PRIORITY_BATCH))
+    assert not controller(depth=0).check(PRIORITY_BATCH, count=max_admissible(PRIORITY_BATCH) + 1)
+
+
+def test_unreadable_queue_depth_keeps_the_last_value():
+    def failing():
+        raise ConnectionError("store down")
+
+    admission = AdmissionController(failing, BrowserPool(2))
+
+    assert admission.check(PRIORITY_INTERACTIVE)
+
+
+def test_in_flight_crawls_limit_their_own_lane():
+    admission = controller()
+    for _ in range(int(ADMISSION_MAX_IN_FLIGHT_CRAWLS * 0.5)):
+        admission.crawl_started(PRIORITY_BACKGROUND)
+
+    decision = admission.check(PRIORITY_BACKGROUND)
+    assert not decision
+    assert 'background crawls in flight' in decision.reason
+    assert admission.check(PRIORITY_INTERACTIVE)
+
+    admission.crawl_finished(PRIORITY_BACKGROUND)
+    assert admission.check(PRIORITY_BACKGROUND)
+
+
+def test_saturated_browser_pool_refuses_new_work():
+    pool = BrowserPool(1)
+    pool.in_use = 1
+    pool.waiters = 6
+    decision = controller(pool=pool).check(PRIORITY_INTERACTIVE)
+
+    assert not decision
+    assert decision.reason == "browser pool saturated"
+    assert decision.retry_after == pytest.approx(7 * pool.run_seconds, abs=1)
+
+
+def test_browser_slot_gives_up_after_its_timeout():
+    pool = BrowserPool(1)
+    with pool.slot() as first:
+        assert first
+        with pool.slot(timeout=0.05) as second:
+            assert not second
+    assert pool.snapshot()['in_use'] == 0
+
+
+def test_browser_slot_is_handed_to_a_waiter():
+    pool = BrowserPool(1)
+    got = []
+
+    def waiter():
+        with pool.slot(timeout=5) as acquired:
+            got.append(acquired)
+
+    with pool.slot():
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        while pool.snapshot()['waiting'] == 0:
+            pass
+    thread.join(5)
+
+    assert got == [True]
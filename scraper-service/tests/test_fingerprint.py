@@ -0,0 +1,97 @@
+from scrapy.http import HtmlResponse
+
+from fingerprint import compute_fingerprint
+from streaming import StreamScanner
+
+AMAZON_PAGE = """
+<html><body>
+  <span id="productTitle">Espresso Machine</span>
+  <div id="corePrice_desktop"><span class="priceToPay"><span class="a-offscreen">{price}</span></span></div>
+  <div id="recommendations">{recommendation}</div>
+</body></html>
+"""
+
+GENERIC_PAGE = """
+<html><body>
+  <h1>Ceramic Mug</h1>
+  <span class="price">{price}</span>
+  <aside>{recommendation}</aside>
+</body></html>
+"""
+
+HEAD_PAGE = """
+<html><head>
+  <meta property="og:title" content="Ceramic Mug">
+  <meta property="product:price:amount" content="{price}">
+  <script type="application/ld+json">{{"@type": "Product", "name": "Ceramic Mug"}}</script>
+</head><body>
+  <h1>Ceramic Mug</h1>
+  <aside>{recommendation}</aside>
+  <p>{filler}</p>
+</body></html>
+"""
+
+
+def response(url, template, price='$199.99', recommendation='You may also like: a grinder'):
+    body = template.format(price=price, recommendation=recommendation)
+    return HtmlResponse(url=url, body=body.encode('utf-8'), encoding='utf-8')
+
+
+def test_price_only_change_changes_the_fingerprint():
+    url = 'https://www.amazon.com/dp/B000000001'
+    before = compute_fingerprint(response(url, AMAZON_PAGE))
+    after = compute_fingerprint(response(url, AMAZON_PAGE, price='$179.99'))
+    assert before and after
+    assert before != after
+
+
+def test_price_only_change_on_a_generic_store_changes_the_fingerprint():
+    url = 'https://shop.example.com/products/mug'
+    before = compute_fingerprint(response(url, GENERIC_PAGE, price='$12.00'))
+    after = compute_fingerprint(response(url, GENERIC_PAGE, price='$10.00'))
+    assert before != after
+
+
+def test_unrelated_regions_do_not_change_the_fingerprint():
+    url = 'https://www.amazon.com/dp/B000000001'
+    before = compute_fingerprint(response(url, AMAZON_PAGE))
+    after = compute_fingerprint(response(url, AMAZON_PAGE, recommendation='Customers also bought: a kettle'))
+    assert before == after
+
+
+def test_page_without_product_regions_has_no_fingerprint():
+    page = HtmlResponse(url='https://www.amazon.com/dp/B000000001', body=b'<html><body><p>hi</p></body></html>')
+    assert compute_fingerprint(page) is None
+
+
+def streamed(url, price='12.00', chunk_size=64):
+    """The body as far as the streaming early-exit reads it, as the spider/fast tier would see it"""
+    body = HEAD_PAGE.format(price=price, recommendation='', filler='x' * 20000).encode('utf-8')
+    scanner = StreamScanner()
+    for end in range(chunk_size, len(body), chunk_size):
+        if scanner.feed(body[end - chunk_size:end]):
+            return HtmlResponse(url=url, body=body[:end], encoding='utf-8'), body
+    raise AssertionError("the scanner never stopped")
+
+
+def test_truncated_page_matches_its_stored_fingerprint():
+    url = 'https://shop.example.com/products/mug'
+    truncated, full_body = streamed(url)
+    stored = compute_fingerprint(HtmlResponse(url=url, body=full_body, encoding='utf-8'))
+
+    assert len(truncated.body) < len(full_body)
+    assert compute_fingerprint(truncated, truncated=True) == stored
+    # Wherever the download stopped
+    assert compute_fingerprint(streamed(url, chunk_size=97)[0], truncated=True) == stored
+
+
+def test_truncated_page_with_a_new_price_does_not_match():
+    url = 'https://shop.example.com/products/mug'
+    stored = compute_fingerprint(streamed(url)[0], truncated=True)
+    assert compute_fingerprint(streamed(url, price='10.00')[0], truncated=True) != stored
+
+
+def test_page_cut_before_title_and_price_has_no_fingerprint():
+    url = 'https://shop.example.com/products/mug'
+    body = GENERIC_PAGE.format(price='$12.00', recommendation='').encode('utf-8')
+    assert compute_fingerprint(HtmlResponse(url=url, body=body[:40], encoding='utf-8'), truncated=True) is None
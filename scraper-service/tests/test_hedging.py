@@ -0,0 +1,71 @@
+from hedging import ATTEMPT_FAILED, ATTEMPT_RUNNING, HedgeBudget, Race
+
+ENGINE_SCRAPY = 'scrapy'
+ENGINE_PLAYWRIGHT = 'playwright'
+
+
+def test_first_claim_wins_and_cancels_the_other_attempt():
+    race = Race()
+    assert race.claim(ENGINE_PLAYWRIGHT)
+    assert race.cancelled.is_set()
+    assert not race.claim(ENGINE_SCRAPY)
+    assert race.winner == ENGINE_PLAYWRIGHT
+
+
+def test_primary_fails_then_hedge_skipped_hands_the_job_back():
+    race = Race()
+    assert race.hedge_started()
+    # Scrapy gives up while the hedge is (about to be) running - it counts on the hedge
+    assert race.primary_failed() == ATTEMPT_RUNNING
+    # ...but the hedge finds no free browser: it has to settle the job itself
+    assert race.hedge_skipped()
+
+
+def test_hedge_skipped_while_primary_running_leaves_the_fallback_to_scrapy():
+    race = Race()
+    assert race.hedge_started()
+    assert not race.hedge_skipped()
+    # Scrapy then sees no hedge and falls back on its own
+    assert race.primary_failed() is None
+
+
+def test_hedge_skipped_after_a_win_does_nothing():
+    race = Race()
+    race.hedge_started()
+    race.claim(ENGINE_SCRAPY)
+    race.primary = ATTEMPT_FAILED
+    assert not race.hedge_skipped()
+
+
+def test_last_attempt_standing_fails_the_job():
+    race = Race()
+    race.hedge_started()
+    assert not race.hedge_failed()
+    assert race.primary_failed() == ATTEMPT_FAILED
+
+    race = Race()
+    race.hedge_started()
+    race.primary_failed()
+    assert race.hedge_failed()
+
+
+def test_no_hedge_after_the_primary_settled():
+    race = Race()
+    race.primary_failed()
+    assert not race.hedge_started()
+
+
+def test_budget_limits_share_and_concurrency():
+    budget = HedgeBudget(ratio=0.5, burst=2, max_in_flight=1)
+    assert budget.try_start()
+    # Concurrency cap
+    assert not budget.try_start()
+    budget.finished(won=True)
+    assert budget.try_start()
+    budget.finished(won=False)
+    # Burst spent - only crawls refill it
+    assert not budget.try_start()
+    budget.crawl_started()
+    budget.crawl_started()
+    assert budget.try_start()
+    assert budget.snapshot()['won'] == 1
@@ -0,0 +1,151 @@
+import threading
+import time
+
+import job_store
+from job_store import MAX_CLAIMS, STATUS_COMPLETED, STATUS_FAILED, STATUS_PENDING, STATUS_PROCESSING
+from priority_lanes import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+
+
+def test_enqueue_then_claim_marks_the_job_processing(store):
+    store.enqueue('a', 'https://example.com/a', user_id='u1')
+    assert store.get('a')['status'] == STATUS_PENDING
+    assert store.pending_count() == 1
+
+    job = store.claim(timeout=0)
+    assert job['id'] == 'a'
+    assert store.get('a')['status'] == STATUS_PROCESSING
+    assert store.pending_count() == 0
+
+
+def test_claim_serves_the_most_urgent_lane_first(store):
+    store.enqueue('refresh', 'https://example.com/r', priority=PRIORITY_BACKGROUND)
+    store.enqueue('user', 'https://example.com/u', priority=PRIORITY_INTERACTIVE)
+    assert store.claim(timeout=0)['id'] == 'user'
+    assert store.claim(timeout=0)['id'] == 'refresh'
+
+
+def test_claim_only_takes_the_requested_lanes(store):
+    store.enqueue('refresh', 'https://example.com/r', priority=PRIORITY_BACKGROUND)
+    assert store.claim(lanes=(PRIORITY_INTERACTIVE,), timeout=0) is None
+    assert store.claim(lanes=(PRIORITY_BACKGROUND,), timeout=0)['id'] == 'refresh'
+
+
+def test_complete_wakes_waiters(store):
+    store.enqueue('a', 'https://example.com/a')
+    store.claim(timeout=0)
+    threading.Timer(0.1, store.complete, args=('a', {'title': 'Mug'})).start()
+    job = store.wait('a', timeout=5)
+    assert job['status'] == STATUS_COMPLETED
+    assert job['data'] == {'title': 'Mug'}
+
+
+def test_expired_lease_requeues_the_job_then_gives_up(store, monkeypatch):
+    monkeypatch.setattr(job_store, 'JOB_LEASE_SECONDS', -1)
+    store.enqueue('a', 'https://example.com/a')
+
+    for _ in range(MAX_CLAIMS):
+        assert store.claim(timeout=0)['id'] == 'a'
+    # Both claimants vanished: the job is failed rather than handed out forever
+    assert store.claim(timeout=0) is None
+    job = store.get('a')
+    assert job['status'] == STATUS_FAILED
+    assert 'Worker stopped' in job['error']
+
+
+def test_job_finished_before_the_lease_ran_out_is_not_requeued(store, monkeypatch):
+    monkeypatch.setattr(job_store, 'JOB_LEASE_SECONDS', -1)
+    store.enqueue('a', 'https://example.com/a')
+    store.claim(timeout=0)
+    store.complete('a', {'title': 'Mug'})
+    assert store.claim(timeout=0) is None
+    assert store.get('a')['status'] == STATUS_COMPLETED
+
+
+def other_worker(store):
+    """A second store on the same backend, standing in for another worker process"""
+    if store.backend == 'sqlite':
+        return type(store)(store.path)
+    return type(store)(store.client)
+
+
+def test_renewed_lease_keeps_the_job_from_being_requeued(store, monkeypatch):
+    monkeypatch.setattr(job_store, 'JOB_LEASE_SECONDS', -1)
+    store.enqueue('a', 'https://example.com/a')
+    job = store.claim(timeout=0)
+
+    monkeypatch.setattr(job_store, 'JOB_LEASE_SECONDS', 60)
+    assert store.renew('a', job['claim'])
+    assert store.claim(timeout=0) is None
+    store.complete('a', {'title': 'Mug'})
+    assert not store.renew('a', job['claim'])
+
+
+def test_leased_renews_while_the_job_runs(store, monkeypatch):
+    monkeypatch.setattr(job_store, 'JOB_LEASE_SECONDS', -1)
+    monkeypatch.setattr(job_store, 'LEASE_RENEW_SECONDS', 0.01)
+    store.enqueue('a', 'https://example.com/a')
+    job = store.claim(timeout=0)
+
+    monkeypatch.setattr(job_store, 'JOB_LEASE_SECONDS', 60)
+    with store.leased(job):
+        time.sleep(0.2)
+    assert store.claim(timeout=0) is None
+    assert store.get('a')['status'] == STATUS_PROCESSING
+
+
+def test_worker_whose_job_was_reclaimed_cannot_finish_it(store, monkeypatch):
+    monkeypatch.setattr(job_store, 'JOB_LEASE_SECONDS', -1)
+    store.enqueue('a', 'https://example.com/a')
+    stale = store.claim(timeout=0)
+    other = other_worker(store)
+    fresh = other.claim(timeout=0)
+    assert fresh['claim'] != stale['claim']
+
+    assert store.complete('a', {'title': 'Stale'}) is None
+    assert not store.renew('a', stale['claim'])
+    assert store.get('a')['status'] == STATUS_PROCESSING
+    other.complete('a', {'title': 'Fresh'})
+    assert store.get('a')['data'] == {'title': 'Fresh'}
+
+
+def test_first_completion_wins(store):
+    store.enqueue('a', 'https://example.com/a')
+    store.claim(timeout=0)
+    store.complete('a', {'title': 'Mug'})
+
+    assert store.fail('a', 'Timed out') is None
+    assert store.get('a')['status'] == STATUS_COMPLETED
+
+
+def test_job_cancelled_while_queued_is_never_claimed(store):
+    store.enqueue('a', 'https://example.com/a')
+    store.enqueue('b', 'https://example.com/b')
+    store.fail('a', 'Cancelled')
+
+    claimed = [store.claim(timeout=0), store.claim(timeout=0)]
+    assert [job['id'] for job in claimed if job] == ['b']
+    assert store.get('a')['status'] == STATUS_FAILED
+
+
+def test_concurrent_updates_keep_every_field(store, monkeypatch):
+    store.enqueue('a', 'https://example.com/a')
+    # Widen the read-modify-write window so unsynchronised updates would overwrite each other
+    loads = job_store._loads
+
+    def slow_loads(blob):
+        time.sleep(0.005)
+        return loads(blob)
+
+    monkeypatch.setattr(job_store, '_loads', slow_loads)
+    fields = [f'field{i}' for i in range(20)]
+    workers = [threading.Thread(target=store.update, args=('a',), kwargs={name: True}) for name in fields]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    job = store.get('a')
+    assert all(job.get(name) for name in fields)
+
+
+def test_update_of_an_unknown_job_returns_none(store):
+    assert store.update('missing', status=STATUS_COMPLETED) is None
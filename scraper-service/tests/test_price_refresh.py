@@ -0,0 +1,117 @@
+import time
+
+from postgrest.exceptions import APIError
+
+import price_refresh
+from price_refresh import PriceRefreshScheduler, refresh_due_at, iso_timestamp
+
+
+class FakeQuery:
+    def __init__(self, supabase, name):
+        self.supabase = supabase
+        self.call = [name]
+
+    def __getattr__(self, method):
+        def record(*args, **kwargs):
+            self.call.append((method, args))
+            return self
+        return record
+
+    def execute(self):
+        self.supabase.executed.append(self.call)
+        failure = self.supabase.failures.pop(self.call[0], None)
+        if failure:
+            raise failure
+        return type('Response', (), {'data': []})()
+
+
+class FakeSupabase:
+    """Records every executed request; `failures` maps a table/function to an exception raised once"""
+
+    def __init__(self):
+        self.executed = []
+        self.failures = {}
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        query = FakeQuery(self, name)
+        query.call.append(('rpc', (params,)))
+        return query
+
+
+def item(item_id, price, **fields):
+    return dict({'id': item_id, 'url': f'https://shop.example.com/{item_id}', 'user_id': 'u1',
+                 'current_price': price, 'tier': 'free'}, **fields)
+
+
+def requests_to(supabase, name):
+    return [call for call in supabase.executed if call[0] == name]
+
+
+def test_new_prices_go_out_in_one_bulk_call():
+    supabase = FakeSupabase()
+    scheduler = PriceRefreshScheduler(supabase, jobs=None)
+    scheduler._results = [(item('a', 10.0), 8.0, None), (item('b', 20.0), 25.0, None), (item('c', 5.0), 5.0, None)]
+    scheduler._flush()
+
+    assert len(requests_to(supabase, 'bulk_update_item_prices')) == 1
+    # The unchanged item gets the one plain items update
+    assert len(requests_to(supabase, 'items')) == 1
+    assert len(requests_to(supabase, 'price_history')) == 1
+    assert scheduler.updated == 2
+
+
+def test_missing_bulk_function_falls_back_to_one_update_per_price():
+    supabase = FakeSupabase()
+    supabase.failures['bulk_update_item_prices'] = APIError({'code': 'PGRST202', 'message': 'not found'})
+    scheduler = PriceRefreshScheduler(supabase, jobs=None)
+    scheduler._results = [(item('a', 10.0), 8.0, None), (item('b', 12.0), 8.0, None), (item('c', 20.0), 25.0, None)]
+    scheduler._flush()
+
+    # Two distinct new prices
+    assert len(requests_to(supabase, 'items')) == 2
+    assert not scheduler._bulk_prices
+    assert not scheduler._writes
+
+
+def test_failed_write_is_retried_not_dropped():
+    supabase = FakeSupabase()
+    supabase.failures['price_history'] = RuntimeError('connection reset')
+    scheduler = PriceRefreshScheduler(supabase, jobs=None)
+    scheduler._results = [(item('a', 10.0), 8.0, None)]
+    scheduler._flush()
+
+    assert scheduler._writes
+    assert scheduler._retry_at > time.time()
+    assert len(requests_to(supabase, 'bulk_update_item_prices')) == 1
+
+    scheduler._retry_at = 0
+    scheduler._flush()
+    assert not scheduler._writes
+    assert len(requests_to(supabase, 'price_history')) == 2
+    # Writes that already went through aren't repeated
+    assert len(requests_to(supabase, 'bulk_update_item_prices')) == 1
+
+
+def test_items_with_unwritten_results_are_not_reloaded_as_due(monkeypatch):
+    supabase = FakeSupabase()
+    supabase.failures['bulk_update_item_prices'] = RuntimeError('timeout')
+    scheduler = PriceRefreshScheduler(supabase, jobs=None)
+    scheduler._results = [(item('a', 10.0), 8.0, None)]
+    scheduler._flush()
+
+    scheduler._load_due_items = lambda: [item('a', 10.0), item('b', 10.0)]
+    monkeypatch.setattr(price_refresh, 'VOLATILITY_ENABLED', False)
+    scheduler._reload()
+    assert [entry[3]['id'] for entry in scheduler._queue] == ['b']
+
+
+def test_due_time_uses_the_shared_tier_cooldowns():
+    checked = time.time() - 3600
+    pro = item('a', 10.0, tier='pro', last_price_check=iso_timestamp(checked))
+    legacy = item('b', 10.0, tier='pro_plus', last_price_check=iso_timestamp(checked), price_check_failures=1)
+    assert abs(refresh_due_at(pro) - (checked + 12 * 3600)) < 1
+    assert abs(refresh_due_at(legacy) - (checked + (12 + 12) * 3600)) < 1
+    assert refresh_due_at(item('c', 10.0)) == 0.0
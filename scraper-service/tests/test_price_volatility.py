@@ -0,0 +1,111 @@
+import math
+
+import pytest
+
+import price_volatility
+from price_volatility import DecayedRate, PriceModel, TIER_MIN_HOURS, min_interval_hours, poisson_rate
+
+DAY = 86400
+NOW = 1_800_000_000.0
+COOLDOWN = 24
+
+
+def history(model, item_id, url, prices, every_days=1.0, end=NOW):
+    """One check per `every_days`, the last one at `end`"""
+    start = end - (len(prices) - 1) * every_days * DAY
+    for i, price in enumerate(prices):
+        model.observe(item_id, url, price, start + i * every_days * DAY)
+
+
+@pytest.fixture(autouse=True)
+def enabled(monkeypatch):
+    monkeypatch.setattr(price_volatility, 'VOLATILITY_ENABLED', True)
+
+
+def test_poisson_rate_counts_changes_hidden_between_checks():
+    # Half the daily intervals saw a change: more than 0.5 changes a day really happened
+    assert poisson_rate(5, 10, 10) == pytest.approx(math.log(2))
+    # A change at every check only bounds the rate from below - it stays finite
+    assert math.isfinite(poisson_rate(10, 10, 10))
+
+
+def test_decayed_rate_halves_per_half_life(monkeypatch):
+    monkeypatch.setattr(price_volatility, 'VOLATILITY_HALF_LIFE_DAYS', 30)
+    rate = DecayedRate()
+    rate.add(NOW, 1.0, True)
+    changes, checks, days = rate.totals(NOW + 30 * DAY)
+    assert (changes, checks, days) == pytest.approx((0.5, 0.5, 0.5))
+
+
+def test_product_without_history_keeps_the_tier_cooldown():
+    model = PriceModel()
+    # The domain is volatile...
+    history(model, 'other', 'https://shop.example.com/p/other', [10, 11, 12, 13, 14, 15])
+    # ...but this product has a single check, so no interval of its own
+    model.observe('new', 'https://shop.example.com/p/new', 10, NOW)
+    assert model.change_rate('https://shop.example.com/p/new', NOW) is None
+    assert model.interval_hours('https://shop.example.com/p/new', 'free', COOLDOWN, NOW) is None
+
+
+def test_volatile_product_is_checked_more_often_than_a_stable_one():
+    model = PriceModel()
+    history(model, 'volatile', 'https://shop.example.com/p/volatile', [10, 11, 10, 12, 11, 13, 12, 14])
+    history(model, 'stable', 'https://shop.example.com/p/stable', [20] * 8)
+
+    volatile = model.interval_hours('https://shop.example.com/p/volatile', 'free', COOLDOWN, NOW)
+    stable = model.interval_hours('https://shop.example.com/p/stable', 'free', COOLDOWN, NOW)
+    assert volatile < stable
+
+
+def test_interval_never_exceeds_the_tier_cooldown():
+    model = PriceModel()
+    history(model, 'stable', 'https://shop.example.com/p/stable', [20] * 30)
+    assert model.interval_hours('https://shop.example.com/p/stable', 'free', COOLDOWN, NOW) == COOLDOWN
+    assert model.interval_hours('https://shop.example.com/p/stable', 'pro', 12, NOW) == 12
+
+
+def test_interval_never_drops_below_the_tier_minimum():
+    model = PriceModel()
+    # Changes at every hourly check
+    history(model, 'hot', 'https://shop.example.com/p/hot', list(range(10, 40)), every_days=1 / 24)
+    assert model.interval_hours('https://shop.example.com/p/hot', 'free', COOLDOWN, NOW) == TIER_MIN_HOURS['free']
+    assert min_interval_hours() == min(TIER_MIN_HOURS.values())
+
+
+def test_disabled_model_leaves_every_item_on_its_cooldown(monkeypatch):
+    model = PriceModel()
+    history(model, 'volatile', 'https://shop.example.com/p/volatile', [10, 11, 12, 13])
+    monkeypatch.setattr(price_volatility, 'VOLATILITY_ENABLED', False)
+    assert model.interval_hours('https://shop.example.com/p/volatile', 'free', COOLDOWN, NOW) is None
+
+
+def test_out_of_order_and_duplicate_checks_are_ignored():
+    model = PriceModel()
+    model.observe('a', 'https://shop.example.com/p/a', 10, NOW)
+    model.observe('a', 'https://shop.example.com/p/a', 99, NOW - DAY)
+    model.observe('a', 'https://shop.example.com/p/a', 10, NOW)
+    assert model.change_rate('https://shop.example.com/p/a', NOW) is None
+
+
+def test_loading_totals_matches_observing_every_check(monkeypatch):
+    monkeypatch.setattr(price_volatility, 'VOLATILITY_HALF_LIFE_DAYS', 30)
+    url = 'https://shop.example.com/p/a'
+    prices = [10, 10, 12, 12, 11, 11, 11, 13]
+    observed = PriceModel()
+    history(observed, 'a', url, prices, every_days=3)
+
+    # What price_change_stats computes: every interval weighted by its age at load time
+    changes = checks = days = 0.0
+    for i in range(1, len(prices)):
+        weight = 0.5 ** ((len(prices) - 1 - i) * 3 / 30)
+        checks += weight
+        days += weight * 3
+        changes += weight * (prices[i] != prices[i - 1])
+    loaded = PriceModel()
+    loaded.observe_totals('a', url, (changes, checks, days), prices[-1], NOW, NOW)
+
+    assert loaded.change_rate(url, NOW) == pytest.approx(observed.change_rate(url, NOW))
+    # Later rows continue from the loaded latest check
+    for model in (observed, loaded):
+        model.observe('a', url, 20, NOW + DAY)
+    assert loaded.change_rate(url, NOW + DAY) == pytest.approx(observed.change_rate(url, NOW + DAY))
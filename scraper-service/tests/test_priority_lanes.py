@@ -0,0 +1,42 @@
+import pytest
+
+from priority_lanes import (LANES, PRIORITY_BACKGROUND, PRIORITY_BATCH, PRIORITY_INTERACTIVE, LaneBudgets,
+                            lane_rank, parse_priority)
+
+
+@pytest.mark.parametrize('value, lane', [
+    (None, PRIORITY_INTERACTIVE), ('', PRIORITY_INTERACTIVE), (' Background ', PRIORITY_BACKGROUND),
+    ('batch', PRIORITY_BATCH),
+])
+def test_parse_priority(value, lane):
+    assert parse_priority(value) == lane
+
+
+def test_unknown_priority_is_rejected():
+    with pytest.raises(ValueError):
+        parse_priority('urgent')
+
+
+def test_lanes_rank_most_urgent_first():
+    assert sorted(LANES, key=lane_rank) == [PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_BACKGROUND]
+    assert lane_rank('unknown') == len(LANES)
+
+
+def test_a_full_lane_does_not_block_the_others():
+    budgets = LaneBudgets({PRIORITY_INTERACTIVE: 1, PRIORITY_BATCH: 1, PRIORITY_BACKGROUND: 1})
+
+    assert budgets.try_acquire(PRIORITY_BACKGROUND)
+    assert not budgets.try_acquire(PRIORITY_BACKGROUND)
+    with budgets.slot(PRIORITY_INTERACTIVE, timeout=0) as acquired:
+        assert acquired
+
+    budgets.release(PRIORITY_BACKGROUND)
+    assert budgets.snapshot()[PRIORITY_BACKGROUND]['in_flight'] == 0
+
+
+def test_slot_gives_up_after_its_timeout():
+    budgets = LaneBudgets({PRIORITY_INTERACTIVE: 1, PRIORITY_BATCH: 0, PRIORITY_BACKGROUND: 0})
+
+    with budgets.slot(PRIORITY_BATCH, timeout=0.05) as acquired:
+        assert not acquired
+    assert budgets.snapshot()[PRIORITY_BATCH]['in_flight'] == 0
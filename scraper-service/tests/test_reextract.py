@@ -0,0 +1,29 @@
+from datetime import datetime, timezone
+
+from reextract import merge_meta, snapshot_row
+
+ITEM = {'title': 'Kettle', 'price': 24.99, 'priceRaw': '$24.99'}
+FETCHED_AT = datetime(2026, 9, 1, 8, 30, tzinfo=timezone.utc).timestamp()
+
+
+def test_row_is_as_fresh_as_the_snapshot():
+    row = snapshot_row('https://example.com/kettle', ITEM, FETCHED_AT)
+
+    assert row['last_scraped'] == '2026-09-01T08:30:00Z'
+    assert row['price'] == '24.99'
+
+
+def test_stored_validators_and_fingerprint_are_kept():
+    stored = {'method': 'fast', 'validators': {'etag': '"abc"'}, 'fingerprint': 'f00d'}
+    row = merge_meta(snapshot_row('https://example.com/kettle', ITEM, FETCHED_AT), {'meta': stored})
+
+    assert row['meta']['validators'] == {'etag': '"abc"'}
+    assert row['meta']['fingerprint'] == 'f00d'
+    assert 'reextracted_at' in row['meta']
+
+
+def test_new_products_get_the_snapshot_meta():
+    row = merge_meta(snapshot_row('https://example.com/kettle', ITEM, FETCHED_AT), None)
+
+    assert row['meta']['method'] == 'reextract'
+    assert row['meta']['scraped_at'] == '2026-09-01T08:30:00'
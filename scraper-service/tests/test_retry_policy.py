@@ -0,0 +1,116 @@
+from email.utils import formatdate
+import time
+
+import pytest
+
+import domain_throttle
+from retry_policy import (FAILURE_BLOCKED, FAILURE_PARSE_MISS, FAILURE_RATE_LIMITED, FAILURE_SERVER_ERROR,
+                          FAILURE_TIMEOUT, RETRY_CLASSES, RetryPolicy, classify_exception, classify_status,
+                          jittered, parse_retry_after)
+
+
+class RecordingThrottle:
+    def __init__(self):
+        self.pauses = []
+
+    def pause(self, url, seconds):
+        self.pauses.append((url, seconds))
+
+
+@pytest.fixture
+def throttle(monkeypatch):
+    recorder = RecordingThrottle()
+    monkeypatch.setattr(domain_throttle, '_throttle', recorder)
+    return recorder
+
+
+def policy(budget_burst=10, budget_ratio=0.2):
+    return RetryPolicy(RETRY_CLASSES, budget_ratio, budget_burst)
+
+
+class TCPTimedOutError(Exception):
+    pass
+
+
+@pytest.mark.parametrize('status, failure', [
+    (429, FAILURE_RATE_LIMITED), (408, FAILURE_TIMEOUT), (503, FAILURE_SERVER_ERROR), (404, None), (200, None),
+])
+def test_classify_status(status, failure):
+    assert classify_status(status) == failure
+
+
+@pytest.mark.parametrize('exception, failure', [
+    (TimeoutError(), FAILURE_TIMEOUT), (TCPTimedOutError(), FAILURE_TIMEOUT),
+    (ConnectionResetError(), FAILURE_SERVER_ERROR),
+])
+def test_classify_exception(exception, failure):
+    assert classify_exception(exception) == failure
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('120') == 120
+    assert parse_retry_after(b'5') == 5
+    assert parse_retry_after(formatdate(time.time() + 60, usegmt=True)) == pytest.approx(60, abs=2)
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+
+
+def test_jitter_stays_between_half_and_the_full_delay():
+    for attempt in range(6):
+        delay = min(30, 2 * 2 ** attempt)
+        assert delay / 2 <= jittered(2, 30, attempt) <= delay
+
+
+def test_each_class_has_its_own_retry_count():
+    retries = policy()
+
+    assert retries.retry_delay(FAILURE_TIMEOUT, 0) is not None
+    assert retries.retry_delay(FAILURE_TIMEOUT, RETRY_CLASSES[FAILURE_TIMEOUT]['retries']) is None
+    # Escalating to the next engine is the retry for these
+    assert retries.retry_delay(FAILURE_BLOCKED, 0) is None
+    assert retries.retry_delay(FAILURE_PARSE_MISS, 0) is None
+
+
+def test_retries_stop_once_the_budget_is_spent():
+    retries = policy(budget_burst=2, budget_ratio=0.5)
+
+    assert retries.retry_delay(FAILURE_SERVER_ERROR, 0) is not None
+    assert retries.retry_delay(FAILURE_SERVER_ERROR, 0) is not None
+    assert retries.retry_delay(FAILURE_SERVER_ERROR, 0) is None
+    assert retries.snapshot()['denied_by_budget'] == 1
+
+    # Two first attempts earn one retry back
+    retries.request_started()
+    retries.request_started()
+    assert retries.retry_delay(FAILURE_SERVER_ERROR, 0) is not None
+
+
+def test_retry_after_is_honoured_up_to_the_class_cap():
+    retries = policy()
+    cap = RETRY_CLASSES[FAILURE_RATE_LIMITED]['cap']
+
+    assert retries.retry_delay(FAILURE_RATE_LIMITED, 0, retry_after=cap - 1) >= cap - 1
+    assert retries.retry_delay(FAILURE_SERVER_ERROR, 0, retry_after=10_000) <= RETRY_CLASSES[FAILURE_SERVER_ERROR]['cap']
+
+
+def test_failures_in_a_row_pause_the_domain_longer(throttle):
+    retries = policy()
+    url = 'https://www.bestbuy.com/site/tv/123.p'
+    cooldown = RETRY_CLASSES[FAILURE_SERVER_ERROR]['cooldown']
+
+    first = retries.failed(url, FAILURE_SERVER_ERROR)
+    second = retries.failed('https://bestbuy.com/site/lamp/456.p', FAILURE_SERVER_ERROR)
+
+    assert cooldown / 2 <= first <= cooldown
+    assert cooldown <= second <= 2 * cooldown
+    assert [seconds for _, seconds in throttle.pauses] == [first, second]
+
+
+def test_failures_without_a_cooldown_do_not_pause(throttle):
+    assert policy().failed('https://example.com/item', FAILURE_TIMEOUT) == 0.0
+    assert throttle.pauses == []
+
+
+def test_retry_after_pauses_even_without_a_cooldown(throttle):
+    assert policy().failed('https://example.com/item', FAILURE_TIMEOUT, retry_after=4) == 4
+    assert throttle.pauses == [('https://example.com/item', 4)]
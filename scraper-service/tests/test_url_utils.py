@@ -0,0 +1,59 @@
+import pytest
+
+from extraction_rules import GENERIC, rule_for_url
+from url_utils import canonicalize_url, registrable_domain
+
+
+@pytest.mark.parametrize('url, domain', [
+    ('https://www.amazon.com/dp/B0TEST', 'amazon.com'),
+    ('https://www.amazon.co.uk/dp/B0TEST', 'amazon.co.uk'),
+    ('https://shop.example.com:8443/item', 'example.com'),
+    ('www.etsy.com', 'etsy.com'),
+    ('http://127.0.0.1:5000/product', '127.0.0.1'),
+    ('localhost', 'localhost'),
+    ('', ''),
+])
+def test_registrable_domain(url, domain):
+    assert registrable_domain(url) == domain
+
+
+def test_canonicalize_drops_tracking_params_everywhere():
+    url = 'https://www.shop.example/item?id=7&utm_source=mail&gclid=abc'
+    assert canonicalize_url(url) == 'https://shop.example/item?id=7'
+
+
+def test_retailer_tracking_params_only_apply_to_that_retailer():
+    amazon = 'https://www.amazon.com/s?k=kettle&tag=wist-20&ref=nb_sb_noss&th=1'
+    assert canonicalize_url(amazon) == 'https://amazon.com/s?k=kettle'
+    # On other sites these pick the variant or the product
+    other = 'https://shop.example/products/shirt?tag=blue&th=2&keywords=linen'
+    assert canonicalize_url(other) == 'https://shop.example/products/shirt?keywords=linen&tag=blue&th=2'
+
+
+@pytest.mark.parametrize('url, canonical', [
+    # Only a listed storefront gets a retailer's rewrites, not a host that merely contains its name
+    ('https://www.betsy.com/listing/123/foo?color=red', 'https://betsy.com/listing/123/foo?color=red'),
+    ('https://notamazon.com/p/1?tag=blue&ref=x', 'https://notamazon.com/p/1?ref=x&tag=blue'),
+    ('https://amazon.example.org/gp/product/B0TESTTEST1', 'https://amazon.example.org/gp/product/B0TESTTEST1'),
+    ('https://www.etsy.com/listing/123/foo?ref=shop_home', 'https://etsy.com/listing/123'),
+    ('https://smile.amazon.co.uk/gp/product/B0TESTTEST?psc=1', 'https://smile.amazon.co.uk/dp/B0TESTTEST'),
+])
+def test_retailer_rewrites_only_apply_to_listed_domains(url, canonical):
+    assert canonicalize_url(url) == canonical
+
+
+def test_private_suffix_shops_are_separate_domains():
+    first = registrable_domain('https://cool-mugs.myshopify.com/products/mug')
+    second = registrable_domain('https://other-store.myshopify.com/products/lamp')
+    assert first == 'cool-mugs.myshopify.com'
+    assert second == 'other-store.myshopify.com'
+
+
+@pytest.mark.parametrize('url, key', [
+    ('https://www.amazon.se/dp/B0TEST', 'amazon'),
+    ('https://www.target.com/p/-/A-123', 'target'),
+    ('https://www.target.com.au/p/lamp/123', GENERIC.key),
+    ('https://amazon.example.org/deals', GENERIC.key),
+])
+def test_rule_for_url_only_matches_listed_storefronts(url, key):
+    assert rule_for_url(url).key == key
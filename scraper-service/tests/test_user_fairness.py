@@ -0,0 +1,137 @@
+from types import SimpleNamespace
+
+from priority_lanes import PRIORITY_BATCH
+from user_fairness import (TIER_ANONYMOUS, TIER_FREE, TIER_PRO, TIER_RATE_LIMITS, TierLookup, UserQuotas,
+                           quota_key)
+
+
+def claim_users(store, count):
+    return [store.claim(timeout=0)['user_id'] for _ in range(count)]
+
+
+def test_heavy_user_cannot_starve_a_light_one(store):
+    for i in range(50):
+        store.enqueue(f'heavy-{i}', f'https://example.com/{i}', priority=PRIORITY_BATCH, user_id='heavy')
+    # Queued long after the heavy user's import
+    store.enqueue('light-0', 'https://example.com/mine', priority=PRIORITY_BATCH, user_id='light')
+
+    assert 'light' in claim_users(store, 2)
+
+
+def test_users_with_backlogs_are_served_round_robin(store):
+    for i in range(10):
+        store.enqueue(f'a-{i}', f'https://example.com/a/{i}', priority=PRIORITY_BATCH, user_id='a')
+    for i in range(10):
+        store.enqueue(f'b-{i}', f'https://example.com/b/{i}', priority=PRIORITY_BATCH, user_id='b')
+
+    served = claim_users(store, 10)
+    assert served.count('a') == served.count('b') == 5
+
+
+def test_higher_tier_gets_a_larger_share(store):
+    for i in range(30):
+        store.enqueue(f'free-{i}', f'https://example.com/f/{i}', priority=PRIORITY_BATCH,
+                      user_id='free-user', tier=TIER_FREE)
+        store.enqueue(f'pro-{i}', f'https://example.com/p/{i}', priority=PRIORITY_BATCH,
+                      user_id='pro-user', tier=TIER_PRO)
+
+    served = claim_users(store, 30)
+    # Weights 1 : 2
+    assert served.count('pro-user') == 20
+    assert served.count('free-user') == 10
+
+
+def test_tier_rate_limit_refuses_past_the_burst():
+    quotas = UserQuotas({TIER_FREE: {'rate': 0.1, 'burst': 3}, TIER_PRO: {'rate': 1, 'burst': 10}})
+    for _ in range(3):
+        assert quotas.check('u1', TIER_FREE)
+
+    decision = quotas.check('u1', TIER_FREE)
+    assert not decision
+    assert decision.rate_limited
+    # One token every 10 s on this tier
+    assert 9 <= decision.retry_after <= 10
+    # Another user (and another tier) has an allowance of its own
+    assert quotas.check('u2', TIER_FREE)
+    assert quotas.check('u1', TIER_PRO, count=10)
+
+
+def test_bulk_is_taken_whole_or_not_at_all():
+    quotas = UserQuotas({TIER_FREE: {'rate': 0.1, 'burst': 5}})
+    assert not quotas.check('u1', TIER_FREE, count=6)
+    # The refused batch took nothing
+    assert quotas.check('u1', TIER_FREE, count=5)
+
+
+def test_refund_gives_the_allowance_back():
+    quotas = UserQuotas({TIER_FREE: {'rate': 0.1, 'burst': 2}})
+    assert quotas.check('u1', TIER_FREE, count=2)
+    quotas.refund('u1', TIER_FREE, count=2)
+    assert quotas.check('u1', TIER_FREE, count=2)
+
+
+def test_anonymous_callers_are_limited_per_ip():
+    quotas = UserQuotas({TIER_FREE: {'rate': 0.1, 'burst': 30}, TIER_ANONYMOUS: {'rate': 0.1, 'burst': 2}})
+    assert quotas.check(quota_key(None, '203.0.113.7'), TIER_ANONYMOUS, count=2)
+    decision = quotas.check(quota_key(None, '203.0.113.7'), TIER_ANONYMOUS)
+    assert not decision and decision.reason == "anonymous rate limit"
+    assert quotas.check(quota_key(None, '198.51.100.1'), TIER_ANONYMOUS)
+
+
+def test_default_limits_grow_with_the_tier():
+    quotas = UserQuotas(TIER_RATE_LIMITS)
+    assert quotas.burst(TIER_FREE) < quotas.burst(TIER_PRO)
+    # Unknown tiers in stored limits fall back to free
+    assert quotas.burst('legacy') == quotas.burst(TIER_FREE)
+
+
+class FakeProfiles:
+    """Just enough of the Supabase client for profiles lookups"""
+
+    def __init__(self, tiers):
+        self.tiers = tiers
+        self.reads = 0
+        self.down = False
+
+    def table(self, name):
+        assert name == 'profiles'
+        return self
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.user_id = value
+        return self
+
+    def limit(self, count):
+        return self
+
+    def execute(self):
+        self.reads += 1
+        if self.down:
+            raise ConnectionError("supabase down")
+        tier = self.tiers.get(self.user_id)
+        return SimpleNamespace(data=[{'subscription_tier': tier}] if self.user_id in self.tiers else [])
+
+
+def test_tier_comes_from_the_profile_and_is_cached():
+    profiles = FakeProfiles({'u1': 'pro', 'u2': 'platinum'})
+    lookup = TierLookup(profiles, ttl=60)
+
+    assert lookup.tier('u1') == TIER_PRO
+    assert lookup.tier('u1') == TIER_PRO
+    assert profiles.reads == 1
+    # Unknown tiers and users without a profile are free
+    assert lookup.tier('u2') == TIER_FREE
+    assert lookup.tier('nobody') == TIER_FREE
+
+
+def test_tier_lookup_failure_keeps_the_last_known_tier():
+    profiles = FakeProfiles({'u1': 'enterprise'})
+    lookup = TierLookup(profiles, ttl=0)
+    assert lookup.tier('u1') == 'enterprise'
+
+    profiles.down = True
+    assert lookup.tier('u1') == 'enterprise'
+    assert lookup.tier('u2') == TIER_FREE
@@ -0,0 +1,119 @@
+"""
+URL helpers shared by the caches, archive and crawler
+Canonical URLs let different links to the same product share one cache entry
+"""
+from functools import lru_cache
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+import re
+
+import tldextract
+
+# Query parameters that never change which product a page shows, on any site
+TRACKING_PARAMS = {
+    'gclid', 'gclsrc', 'dclid', 'fbclid', 'msclkid', 'igshid', 'yclid',
+    'mc_cid', 'mc_eid', 'clickid', 'irgwc', 'affid', 'adid', 'afid',
+}
+TRACKING_PREFIXES = ('utm_',)
+
+# Retailer-specific ones (extraction_rules key → params, prefixes), only on that retailer's
+# listed domains - elsewhere a 'tag', 'th' or 'keywords' parameter may well pick the product
+RETAILER_TRACKING = {
+    'amazon': (
+        {'ref', 'ref_', 'tag', 'psc', 'th', 'smid', 'qid', 'sr', 'keywords', 'crid',
+         'sprefix', 'linkcode', 'linkid', 'camp', 'creative', 'creativeasin'},
+        ('pd_rd_', 'pf_rd_', '_encoding', 'ref_'),
+    ),
+    'etsy': ({'ref', 'click_key', 'click_sum', 'frs', 'sts', 'plkey'}, ('ga_',)),
+    'walmart': ({'wmlspartner', 'sourceid', 'athbdg'}, ('athcpid',)),
+}
+
+AMAZON_ASIN_RE = re.compile(r'/(?:dp|gp/product|gp/aw/d|exec/obidos/asin)/([A-Z0-9]{10})', re.IGNORECASE)
+ETSY_LISTING_RE = re.compile(r'/listing/(\d+)')
+
+
+def canonicalize_url(url):
+    """
+    Reduce a product URL to a stable cache key
+    Drops tracking params, fragments, default ports and 'www.',
+    and collapses Amazon/Etsy links down to their product id
+    """
+    if not url:
+        return url
+
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        return url
+
+    scheme = (parsed.scheme or 'https').lower()
+    if scheme == 'http':
+        scheme = 'https'
+
+    host = (parsed.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if parsed.port and parsed.port not in (80, 443):
+        host = f"{host}:{parsed.port}"
+
+    path = parsed.path or '/'
+    retailer = retailer_key(parsed.hostname or '')
+
+    # Amazon: every variant of a product link boils down to /dp/<ASIN>
+    if retailer == 'amazon':
+        match = AMAZON_ASIN_RE.search(path)
+        if match:
+            return f"https://{host}/dp/{match.group(1).upper()}"
+
+    # Etsy: the slug after the listing id is cosmetic
+    if retailer == 'etsy':
+        match = ETSY_LISTING_RE.search(path)
+        if match:
+            return f"https://{host}/listing/{match.group(1)}"
+
+    params, prefixes = TRACKING_PARAMS, TRACKING_PREFIXES
+    if retailer in RETAILER_TRACKING:
+        retailer_params, retailer_prefixes = RETAILER_TRACKING[retailer]
+        params, prefixes = params | retailer_params, prefixes + retailer_prefixes
+    query = [
+        (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if key.lower() not in params
+        and not key.lower().startswith(prefixes)
+    ]
+    query.sort()
+
+    if len(path) > 1:
+        path = path.rstrip('/')
+
+    return urlunparse((scheme, host, path, '', urlencode(query), ''))
+
+
+def retailer_key(url_or_host):
+    """Key of the retailer rule listing this URL's registrable domain, None for any other site"""
+    # extraction_rules imports this module - look the index up at call time
+    from extraction_rules import DOMAIN_INDEX
+    rule = DOMAIN_INDEX.get(registrable_domain(url_or_host))
+    return rule.key if rule is not None else None
+
+
+# Public suffix list incl. private suffixes (myshopify.com, github.io) - every shop on
+# them is its own site; the snapshot bundled with tldextract, never fetched at runtime
+_extract_domain = tldextract.TLDExtract(suffix_list_urls=(), include_psl_private_domains=True, cache_dir=None)
+
+
+def registrable_domain(url_or_host):
+    """
+    'https://www.amazon.co.uk/dp/...' → 'amazon.co.uk', 'shop.example.com' → 'example.com',
+    'foo.myshopify.com' → 'foo.myshopify.com' (public suffix list, private suffixes included)
+    """
+    if not url_or_host:
+        return ''
+    host = url_or_host
+    if '//' in host:
+        host = urlparse(host).hostname or ''
+    return _registrable_host(host.split(':')[0].lower().strip('.'))
+
+
+@lru_cache(maxsize=65536)
+def _registrable_host(host):
+    # IPs, localhost and unknown suffixes have no registrable part - the host stands for itself
+    return _extract_domain(host).top_domain_under_public_suffix or host
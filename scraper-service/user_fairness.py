@@ -0,0 +1,170 @@
+"""
+Per-user fairness: weighted fair queuing and per-tier rate limits
+Jobs used to be served strictly in arrival order within a lane, so one user
+importing a 2,000-line spreadsheet could fill the queue and every other user's
+"add item" waited behind it. Two mechanisms, both keyed on user_id:
+- Weighted fair queuing (start-time fair queuing) in the shared job queue: every
+  user is a flow, each queued job gets a virtual start tag and claims take the
+  lowest tag, so users with work queued are served round-robin, weighted by
+  subscription tier, no matter how much one of them has queued
+- Token-bucket rate limits per user, sized by tier, so a single user can't flood
+  the service in the first place; over the limit the caller gets 429 + Retry-After
+The tier is never taken from the request: it's looked up by user_id in
+profiles.subscription_tier (cached). Requests without a user_id share one
+"anonymous" flow and are rate limited per client IP on the anonymous limits.
+"""
+import json
+import os
+import threading
+import time
+
+from admission import Decision, clamp_retry_after
+from domain_throttle import TokenBucket
+
+TIER_FREE = 'free'
+TIER_PRO = 'pro'
+TIER_PRO_PLUS = 'pro_plus'
+TIER_CREATOR = 'creator'
+TIER_ENTERPRISE = 'enterprise'
+TIERS = (TIER_FREE, TIER_PRO, TIER_PRO_PLUS, TIER_CREATOR, TIER_ENTERPRISE)
+
+ANONYMOUS_FLOW = 'anonymous'
+# Rate limits of callers without a user_id, one bucket per client IP
+TIER_ANONYMOUS = ANONYMOUS_FLOW
+
+# Share of a lane's throughput a user gets while others have work queued; TIER_WEIGHTS (JSON) overrides
+DEFAULT_TIER_WEIGHTS = {TIER_FREE: 1, TIER_PRO: 2, TIER_PRO_PLUS: 3, TIER_CREATOR: 4, TIER_ENTERPRISE: 4}
+TIER_WEIGHTS = dict(DEFAULT_TIER_WEIGHTS, **json.loads(os.environ.get('TIER_WEIGHTS') or '{}'))
+
+# Scrapes per user (anonymous: per client IP) per worker: rate = URLs/second, burst = URLs allowed back to back
+# (also the largest bulk call). TIER_RATE_LIMITS (JSON) overrides, e.g. {"free": {"rate": 0.2}}
+DEFAULT_TIER_RATE_LIMITS = {
+    TIER_FREE: {'rate': 0.1, 'burst': 30},
+    TIER_PRO: {'rate': 0.5, 'burst': 500},
+    TIER_PRO_PLUS: {'rate': 1, 'burst': 500},
+    TIER_CREATOR: {'rate': 1, 'burst': 1000},
+    TIER_ENTERPRISE: {'rate': 2, 'burst': 2000},
+    TIER_ANONYMOUS: {'rate': 0.2, 'burst': 30},
+}
+_rate_overrides = json.loads(os.environ.get('TIER_RATE_LIMITS') or '{}')
+TIER_RATE_LIMITS = {
+    tier: dict(limits, **_rate_overrides.get(tier, {})) for tier, limits in DEFAULT_TIER_RATE_LIMITS.items()
+}
+
+# Full (idle) buckets are dropped once this many users have one
+MAX_TRACKED_USERS = 10000
+
+# How long a user's looked-up tier is trusted before profiles is read again
+TIER_CACHE_SECONDS = float(os.environ.get('TIER_CACHE_SECONDS', 300))
+
+
+class TierLookup:
+    """user_id → subscription tier from profiles, cached (thread-safe); unknown users are free"""
+
+    def __init__(self, supabase, ttl=TIER_CACHE_SECONDS):
+        self.supabase = supabase
+        self.ttl = ttl
+        # user_id → (tier, looked up at)
+        self._tiers = {}
+        self._lock = threading.Lock()
+
+    def tier(self, user_id):
+        if not user_id or self.supabase is None:
+            return TIER_FREE
+        user_id = str(user_id)
+        now = time.time()
+        with self._lock:
+            cached = self._tiers.get(user_id)
+        if cached and now - cached[1] < self.ttl:
+            return cached[0]
+        try:
+            rows = (
+                self.supabase.table('profiles').select('subscription_tier').eq('id', user_id).limit(1).execute()
+            ).data or []
+        except Exception as e:
+            print(f"⚠️  Tier lookup failed for {user_id}: {e}")
+            # Keep the last known tier; a user never seen counts as free until the next try
+            return cached[0] if cached else TIER_FREE
+        tier = str((rows[0] if rows else {}).get('subscription_tier') or TIER_FREE).lower()
+        if tier not in TIERS:
+            tier = TIER_FREE
+        with self._lock:
+            if len(self._tiers) >= MAX_TRACKED_USERS:
+                self._tiers = {key: value for key, value in self._tiers.items() if now - value[1] < self.ttl}
+            self._tiers[user_id] = (tier, now)
+        return tier
+
+
+def fair_flow(job):
+    """(flow, virtual cost) of a queued job - heavier tiers advance their flow's clock slower"""
+    flow = str(job.get('user_id') or ANONYMOUS_FLOW)
+    return flow, 1.0 / TIER_WEIGHTS.get(job.get('tier') or TIER_FREE, 1)
+
+
+class UserQuotas:
+    """Per-user token buckets sized by tier (thread-safe, per process)"""
+
+    def __init__(self, limits):
+        self.limits = limits
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def burst(self, tier):
+        return int(self.limits.get(tier, self.limits[TIER_FREE])['burst'])
+
+    def _bucket(self, user_id, tier):
+        key = (str(user_id), tier)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_USERS:
+                self._prune()
+            limits = self.limits.get(tier, self.limits[TIER_FREE])
+            bucket = self._buckets[key] = TokenBucket(limits['rate'], limits['burst'])
+        return bucket
+
+    def _prune(self):
+        for key, bucket in list(self._buckets.items()):
+            if bucket.is_full():
+                del self._buckets[key]
+
+    def check(self, user_id, tier=TIER_FREE, count=1):
+        """
+        Take `count` scrapes from the caller's allowance, or refuse with a Retry-After
+        user_id is any caller key - anonymous callers pass their client IP (see quota_key)
+        """
+        with self._lock:
+            wait = self._bucket(user_id, tier).take(count)
+        if wait:
+            limit = "anonymous rate limit" if tier == TIER_ANONYMOUS else f"rate limit of the {tier} plan"
+            return Decision(False, limit, clamp_retry_after(wait), rate_limited=True)
+        return Decision(True)
+
+    def refund(self, user_id, tier=TIER_FREE, count=1):
+        """Give back scrapes that were taken but not run (e.g. refused further down)"""
+        with self._lock:
+            self._bucket(user_id, tier).cancel(count)
+
+
+def quota_key(user_id, client_ip):
+    """Bucket key of a caller: its user_id, else its IP (anonymous callers don't share one bucket)"""
+    return str(user_id) if user_id else f"ip:{client_ip}"
+
+
+_user_quotas = UserQuotas(TIER_RATE_LIMITS)
+
+
+def get_user_quotas():
+    return _user_quotas
+
+
+_tier_lookup = None
+_tier_lookup_lock = threading.Lock()
+
+
+def get_tier_lookup(supabase):
+    """Process-wide tier cache over this Supabase client"""
+    global _tier_lookup
+    with _tier_lookup_lock:
+        if _tier_lookup is None:
+            _tier_lookup = TierLookup(supabase)
+    return _tier_lookup
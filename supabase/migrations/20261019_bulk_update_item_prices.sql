@@ -0,0 +1,26 @@
+-- New prices for many wishlist items in one call (scraper-service/price_refresh.py).
+-- PostgREST can only apply one set of values per UPDATE, so without this every
+-- changed price is its own request. Same columns the cron writes on a price change;
+-- setting a price also clears out_of_stock.
+
+CREATE OR REPLACE FUNCTION public.bulk_update_item_prices(_updates jsonb, _checked_at timestamptz)
+RETURNS integer
+LANGUAGE sql
+SET search_path = public
+AS $$
+  WITH updated AS (
+    UPDATE items AS i
+    SET current_price = u.price,
+        out_of_stock = false,
+        last_price_check = _checked_at,
+        updated_at = _checked_at,
+        price_check_failures = 0
+    FROM jsonb_to_recordset(_updates) AS u(id uuid, price numeric)
+    WHERE i.id = u.id
+    RETURNING 1
+  )
+  SELECT count(*)::integer FROM updated;
+$$;
+
+REVOKE ALL ON FUNCTION public.bulk_update_item_prices(jsonb, timestamptz) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.bulk_update_item_prices(jsonb, timestamptz) TO service_role;
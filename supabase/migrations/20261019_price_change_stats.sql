@@ -0,0 +1,59 @@
+-- Per-item price volatility totals for the scraper service's refresh scheduler
+-- (scraper-service/price_volatility.py). Every pair of consecutive checks of an item
+-- is one interval: did the price change during it, and how many days did it last.
+-- Each interval is weighted by 0.5 ^ (age in days / _half_life_days), so the service
+-- can start from one row per item instead of reading the raw history.
+
+CREATE OR REPLACE FUNCTION public.price_change_stats(
+  _since timestamptz,
+  _half_life_days double precision,
+  _epsilon numeric DEFAULT 0.01
+)
+RETURNS TABLE (
+  item_id uuid,
+  url text,
+  changes double precision,
+  checks double precision,
+  days double precision,
+  last_price numeric,
+  last_checked_at timestamptz
+)
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+  WITH history AS (
+    SELECT
+      ph.item_id,
+      ph.price,
+      ph.created_at,
+      lag(ph.price) OVER w AS prev_price,
+      lag(ph.created_at) OVER w AS prev_at,
+      row_number() OVER (PARTITION BY ph.item_id ORDER BY ph.created_at DESC) AS newest
+    FROM price_history ph
+    WHERE ph.created_at > _since
+    WINDOW w AS (PARTITION BY ph.item_id ORDER BY ph.created_at)
+  ),
+  weighted AS (
+    SELECT
+      c.*,
+      c.prev_at IS NOT NULL AND c.created_at > c.prev_at AS is_interval,
+      power(0.5, extract(epoch FROM now() - c.created_at) / 86400 / _half_life_days) AS weight
+    FROM history c
+  )
+  SELECT
+    w.item_id,
+    i.url,
+    COALESCE(SUM(w.weight * (abs(w.price - w.prev_price) > _epsilon)::int) FILTER (WHERE w.is_interval), 0),
+    COALESCE(SUM(w.weight) FILTER (WHERE w.is_interval), 0),
+    COALESCE(SUM(w.weight * extract(epoch FROM w.created_at - w.prev_at) / 86400) FILTER (WHERE w.is_interval), 0),
+    MAX(w.price) FILTER (WHERE w.newest = 1),
+    MAX(w.created_at)
+  FROM weighted w
+  JOIN items i ON i.id = w.item_id
+  WHERE i.url IS NOT NULL
+  GROUP BY w.item_id, i.url;
+$$;
+
+REVOKE ALL ON FUNCTION public.price_change_stats(timestamptz, double precision, numeric) FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION public.price_change_stats(timestamptz, double precision, numeric) TO service_role;